@@ -195,9 +195,24 @@ class AmplitudeSyncScheduleAdmin(admin.ModelAdmin):
 
 @admin.register(BigDataVisit)
 class BigDataVisitAdmin(admin.ModelAdmin):
-    list_display = ('time_create', 'bigdata_visit_id', 'guest_phone_normalized', 'guest_phone_raw', 'updated_at')
-    list_filter = ('time_create',)
+    list_display = (
+        'time_create',
+        'bigdata_visit_id',
+        'guest_phone_normalized',
+        'guest_phone_raw',
+        'park',
+        'city',
+        'payload_format',
+        'updated_at',
+    )
+    list_filter = ('time_create', 'payload_format')
     search_fields = ('bigdata_visit_id', 'guest_phone_raw', 'guest_phone_normalized')
+    exclude = ('payload', 'payload_compressed')
+    readonly_fields = ('payload_format', 'payload_hash', 'decoded_payload')
+
+    @admin.display(description='Ответ BigData')
+    def decoded_payload(self, obj):
+        return obj.get_payload()
 
 
 @admin.register(BigDataPhoneDaySyncState)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AmplitudeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'amplitude'
+
+    def ready(self):
+        from amplitude import signals  # noqa: F401
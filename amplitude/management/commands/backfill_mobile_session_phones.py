@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from amplitude.models import MobileSession
+
+
+class Command(BaseCommand):
+    help = 'Заполнить нормализованный телефон у сохраненных мобильных сессий пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки (по умолчанию 5000)')
+        parser.add_argument('--limit', type=int, default=None, help='Максимум строк за запуск')
+        parser.add_argument('--start-id', type=int, default=0, help='Начать с id больше указанного')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        limit = options['limit']
+        if batch_size <= 0:
+            raise CommandError('--batch-size должен быть > 0')
+        if limit is not None and limit <= 0:
+            raise CommandError('--limit должен быть > 0')
+
+        queryset = MobileSession.objects.filter(phone_normalized='').exclude(phone_number='')
+        self.stdout.write(self.style.NOTICE(f'Заполнение телефонов мобильных сессий: batch_size={batch_size}'))
+
+        scanned = 0
+        updated = 0
+        last_id = options['start_id']
+        while limit is None or scanned < limit:
+            size = batch_size if limit is None else min(batch_size, limit - scanned)
+            # The id cursor keeps moving past phones that do not normalize, so they are read once per run.
+            batch = list(queryset.filter(id__gt=last_id).order_by('id').only('id', 'phone_number')[:size])
+            if not batch:
+                break
+
+            last_id = batch[-1].id
+            scanned += len(batch)
+            changed = []
+            for session in batch:
+                session.fill_phone_normalized()
+                if session.phone_normalized:
+                    changed.append(session)
+            if changed:
+                with transaction.atomic():
+                    MobileSession.objects.bulk_update(changed, ['phone_normalized'], batch_size=1000)
+                updated += len(changed)
+            self.stdout.write(f'  просмотрено={scanned}, обновлено={updated}, last_id={last_id}')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово: scanned={scanned}, updated={updated}, last_id={last_id}'))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from amplitude.services.bigdata_visit_service import BigDataVisitSyncService
+
+
+class Command(BaseCommand):
+    help = 'Перевести сохраненные визиты BigData в компактный формат хранения пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки (по умолчанию 1000)')
+        parser.add_argument('--limit', type=int, default=None, help='Максимум строк за запуск')
+        parser.add_argument(
+            '--format',
+            choices=('zlib', 'dropped'),
+            default=None,
+            help='Формат хранения (по умолчанию BIGDATA_VISIT_PAYLOAD_FORMAT)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size должен быть > 0')
+        if options['limit'] is not None and options['limit'] <= 0:
+            raise CommandError('--limit должен быть > 0')
+
+        try:
+            service = BigDataVisitSyncService(payload_format=options['format'])
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        self.stdout.write(self.style.NOTICE(f'Компактизация визитов BigData: format={service.payload_format}'))
+
+        def on_batch_done(progress: dict) -> None:
+            self.stdout.write(f"  обработано={progress['converted']}, last_id={progress['last_id']}")
+
+        try:
+            result = service.compact_stored_payloads(
+                batch_size=options['batch_size'],
+                limit=options['limit'],
+                progress_callback=on_batch_done,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        self.stdout.write(self.style.SUCCESS(
+            'Готово: '
+            f"converted={result['converted']}, "
+            f"bytes_before={result['bytes_before']}, "
+            f"bytes_after={result['bytes_after']}"
+        ))
+        if result['converted']:
+            self.stdout.write('Для возврата места на диске выполните VACUUM (ANALYZE) amplitude_bigdatavisit;')
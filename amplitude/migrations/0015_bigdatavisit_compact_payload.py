@@ -0,0 +1,38 @@
+# Generated by Django 4.2.28 on 2026-10-19 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amplitude', '0014_remove_allowedemployeeposition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bigdatavisit',
+            name='city',
+            field=models.CharField(blank=True, max_length=128, verbose_name='Город'),
+        ),
+        migrations.AddField(
+            model_name='bigdatavisit',
+            name='park',
+            field=models.CharField(blank=True, max_length=128, verbose_name='Парк'),
+        ),
+        migrations.AddField(
+            model_name='bigdatavisit',
+            name='payload_compressed',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Ответ BigData (zlib)'),
+        ),
+        migrations.AddField(
+            model_name='bigdatavisit',
+            name='payload_format',
+            field=models.CharField(choices=[('json', 'JSON (полностью)'), ('zlib', 'Сжатый ответ'), ('dropped', 'Без остатка')], db_index=True, default='json', max_length=16, verbose_name='Формат хранения ответа'),
+        ),
+        migrations.AddField(
+            model_name='bigdatavisit',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Хэш ответа BigData'),
+        ),
+    ]
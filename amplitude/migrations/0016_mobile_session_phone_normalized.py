@@ -0,0 +1,22 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amplitude', '0015_bigdatavisit_compact_payload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mobilesession',
+            name='phone_normalized',
+            field=models.CharField(blank=True, max_length=32, verbose_name='Телефон (normalized)'),
+        ),
+        migrations.AddIndex(
+            model_name='mobilesession',
+            index=models.Index(fields=['phone_normalized', 'event_time'], name='idx_mobsess_phone_time'),
+        ),
+    ]
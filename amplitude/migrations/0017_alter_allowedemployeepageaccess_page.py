@@ -0,0 +1,18 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amplitude', '0016_mobile_session_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='allowedemployeepageaccess',
+            name='page',
+            field=models.CharField(choices=[('analytics', 'Аналитика'), ('bonus-transactions', 'Транзакция бонусов'), ('coupon-dispatch', 'Отправка купонов'), ('push-dispatch', 'Отправка пушей'), ('blacklist', 'Черный список'), ('guest-profile', 'Профиль гостя')], db_index=True, max_length=64, verbose_name='Раздел портала'),
+        ),
+    ]
@@ -1,5 +1,10 @@
+import json
+import zlib
+
 from django.db import models
 
+from guest_profile.services.phone_utils import normalize_phone_number
+
 
 class MobileSession(models.Model):
     date = models.DateField(db_index=True, verbose_name='Дата')
@@ -8,6 +13,7 @@ class MobileSession(models.Model):
     user_id = models.CharField(max_length=255, blank=True, verbose_name='ID пользователя')
     device_id = models.CharField(max_length=255, db_index=True, verbose_name='ID устройства')
     phone_number = models.CharField(max_length=64, blank=True, verbose_name='Номер телефона')
+    phone_normalized = models.CharField(max_length=32, blank=True, verbose_name='Телефон (normalized)')
     platform = models.CharField(max_length=64, blank=True, verbose_name='Платформа')
     device_brand = models.CharField(max_length=128, blank=True, verbose_name='Бренд устройства')
     device_manufacturer = models.CharField(max_length=128, blank=True, verbose_name='Производитель устройства')
@@ -18,9 +24,20 @@ class MobileSession(models.Model):
 
     class Meta:
         ordering = ('-event_time',)
+        indexes = [
+            models.Index(fields=('phone_normalized', 'event_time'), name='idx_mobsess_phone_time'),
+        ]
         verbose_name = 'Сессия мобильного события'
         verbose_name_plural = 'Сессии мобильных событий'
 
+    def save(self, *args, **kwargs):
+        # bulk_create skips save(); bulk writers call fill_phone_normalized themselves.
+        self.fill_phone_normalized()
+        super().save(*args, **kwargs)
+
+    def fill_phone_normalized(self) -> None:
+        self.phone_normalized = normalize_phone_number(self.phone_number)
+
 
 class DailyDeviceActivity(models.Model):
     date = models.DateField(db_index=True, verbose_name='Дата')
@@ -77,12 +94,29 @@ class AmplitudeSyncSchedule(models.Model):
         return f'Hourly sync (enabled={self.enabled})'
 
 
+class BigDataPayloadFormat(models.TextChoices):
+    JSON = 'json', 'JSON (полностью)'
+    ZLIB = 'zlib', 'Сжатый ответ'
+    DROPPED = 'dropped', 'Без остатка'
+
+
 class BigDataVisit(models.Model):
     bigdata_visit_id = models.CharField(max_length=128, unique=True, db_index=True, verbose_name='ID визита BigData')
     guest_phone_raw = models.CharField(max_length=64, blank=True, verbose_name='Телефон (raw)')
     guest_phone_normalized = models.CharField(max_length=64, db_index=True, blank=True, verbose_name='Телефон (normalized)')
     time_create = models.DateTimeField(db_index=True, verbose_name='Время визита')
+    park = models.CharField(max_length=128, blank=True, verbose_name='Парк')
+    city = models.CharField(max_length=128, blank=True, verbose_name='Город')
     payload = models.JSONField(default=dict, blank=True, verbose_name='Сырой ответ BigData')
+    payload_format = models.CharField(
+        max_length=16,
+        choices=BigDataPayloadFormat.choices,
+        default=BigDataPayloadFormat.JSON,
+        db_index=True,
+        verbose_name='Формат хранения ответа',
+    )
+    payload_compressed = models.BinaryField(null=True, blank=True, verbose_name='Ответ BigData (zlib)')
+    payload_hash = models.CharField(max_length=64, blank=True, verbose_name='Хэш ответа BigData')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
 
@@ -97,6 +131,26 @@ class BigDataVisit(models.Model):
     def __str__(self) -> str:
         return f'{self.bigdata_visit_id} | {self.guest_phone_normalized} | {self.time_create}'
 
+    def get_payload(self) -> dict:
+        """Return the visit payload regardless of the storage format of the row.
+
+        JSON and ZLIB rows give back the original payload exactly; DROPPED rows are rebuilt from the
+        typed columns only.
+        """
+        if self.payload_format == BigDataPayloadFormat.JSON:
+            return dict(self.payload or {})
+
+        if self.payload_format == BigDataPayloadFormat.ZLIB and self.payload_compressed:
+            return json.loads(zlib.decompress(bytes(self.payload_compressed)).decode('utf-8'))
+
+        return {
+            'id': self.bigdata_visit_id,
+            'guest_phone': self.guest_phone_raw,
+            'time_create': self.time_create.isoformat() if self.time_create else None,
+            'park': self.park,
+            'city': self.city,
+        }
+
 
 class BigDataPhoneDaySyncState(models.Model):
     phone_normalized = models.CharField(max_length=64, db_index=True, verbose_name='Телефон (normalized)')
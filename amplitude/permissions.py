@@ -1,20 +1,22 @@
 from rest_framework.permissions import BasePermission
 
-from amplitude.services.employee_access_service import EmployeeAccessService
+from amplitude.models import EmployeePortalPage
+from amplitude.services.employee_access_service import get_request_employee_access
 
 
-class HasAnalyticsAccess(BasePermission):
-    message = 'You do not have access to analytics section.'
+class EmployeePageAccessPermission(BasePermission):
+    """Grants access when the user's employee position is allowed to open ``page``."""
+
+    page = ''
 
     def has_permission(self, request, view) -> bool:
         user = request.user
         if not user or not user.is_authenticated:
             return False
 
-        try:
-            iin = user.employee_binding.iin
-        except Exception:
-            return False
+        return get_request_employee_access(request).has_page(self.page)
 
-        allowed_pages = EmployeeAccessService().allowed_pages_for_iin(iin)
-        return 'analytics' in allowed_pages
+
+class HasAnalyticsAccess(EmployeePageAccessPermission):
+    message = 'You do not have access to analytics section.'
+    page = EmployeePortalPage.ANALYTICS
@@ -1,21 +1,49 @@
 import hashlib
 import json
+import zlib
 from collections import defaultdict
-from datetime import date, timedelta
-from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from django.conf import settings
 from django.db import transaction
 from django.db.models import Count
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 
-from amplitude.models import BigDataPhoneDaySyncState, BigDataVisit
+from amplitude.models import BigDataPayloadFormat, BigDataPhoneDaySyncState, BigDataVisit
+from guest_profile.models import GuestPhoneSource
+from guest_profile.services.guest_phone_cache import GuestPhoneCacheService, visit_guest_id
 from utils.avatariya_client import AvatariyaClient
 
 
 class BigDataVisitSyncService:
-    def __init__(self, avatariya_client: Optional[AvatariyaClient] = None) -> None:
+    visit_id_keys = ('id', 'visit_id', 'visitId', 'bigdata_id', 'uuid')
+    park_keys = ('park_name', 'park', 'park_id')
+    city_keys = ('city_name', 'city', 'city_id')
+    upsert_batch_size = 1000
+    upsert_fields = [
+        'guest_phone_raw',
+        'guest_phone_normalized',
+        'time_create',
+        'park',
+        'city',
+        'payload',
+        'payload_format',
+        'payload_compressed',
+        'payload_hash',
+        'updated_at',
+    ]
+
+    def __init__(
+        self,
+        avatariya_client: Optional[AvatariyaClient] = None,
+        payload_format: Optional[str] = None,
+        guest_cache: Optional[GuestPhoneCacheService] = None,
+    ) -> None:
         self.avatariya_client = avatariya_client or AvatariyaClient()
+        self.payload_format = self._resolve_payload_format(payload_format or settings.BIGDATA_VISIT_PAYLOAD_FORMAT)
+        self.guest_cache = guest_cache or GuestPhoneCacheService()
 
     def sync_visits(self, start_date: date, end_date: date, phones: List[str], force_refresh: bool = False) -> Dict:
         normalized_phones = self._normalize_unique_phones(phones)
@@ -26,6 +54,7 @@ class BigDataVisitSyncService:
                 'rows_fetched': 0,
                 'inserted': 0,
                 'updated': 0,
+                'unchanged': 0,
             }
 
         days = self._iter_days(start_date, end_date)
@@ -51,6 +80,7 @@ class BigDataVisitSyncService:
                 'rows_fetched': 0,
                 'inserted': 0,
                 'updated': 0,
+                'unchanged': 0,
             }
 
         rows = self.avatariya_client.visit_search_all_by_date_phones(
@@ -59,16 +89,14 @@ class BigDataVisitSyncService:
             phones=phones_to_fetch,
         )
 
-        inserted = 0
-        updated = 0
+        upsert_stats = self._upsert_visit_rows(rows)
+        # Visits carry the guest id, so every sync also warms the phone -> guest cache for free.
+        self.guest_cache.remember_many(
+            ((row.get('guest_phone'), visit_guest_id(row)) for row in rows),
+            source=GuestPhoneSource.BIGDATA,
+        )
         day_counts: Dict[Tuple[str, date], int] = defaultdict(int)
         for row in rows:
-            state = self._upsert_visit_row(row)
-            if state == 'inserted':
-                inserted += 1
-            elif state == 'updated':
-                updated += 1
-
             normalized_phone = self._normalize_phone(row.get('guest_phone'))
             visit_time = self._parse_visit_time(row)
             if normalized_phone and visit_time is not None:
@@ -102,8 +130,9 @@ class BigDataVisitSyncService:
             'phones_total': len(normalized_phones),
             'phones_fetched': len(phones_to_fetch),
             'rows_fetched': len(rows),
-            'inserted': inserted,
-            'updated': updated,
+            'inserted': upsert_stats['inserted'],
+            'updated': upsert_stats['updated'],
+            'unchanged': upsert_stats['unchanged'],
         }
 
     def build_phone_to_visit_times(self, start_date: date, end_date: date, phones: List[str]) -> Tuple[Dict[str, List], int]:
@@ -111,9 +140,14 @@ class BigDataVisitSyncService:
         if not normalized_phones:
             return {}, 0
 
+        # Plain timestamp bounds keep the (phone, time_create) index usable, unlike a __date lookup.
+        current_tz = timezone.get_current_timezone()
+        range_start = timezone.make_aware(datetime.combine(start_date, time.min), current_tz)
+        range_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), current_tz)
         rows = BigDataVisit.objects.filter(
-            time_create__date__range=(start_date, end_date),
             guest_phone_normalized__in=normalized_phones,
+            time_create__gte=range_start,
+            time_create__lt=range_end,
         ).values_list('guest_phone_normalized', 'time_create')
 
         mapping: Dict[str, List] = defaultdict(list)
@@ -129,32 +163,163 @@ class BigDataVisitSyncService:
 
         return mapping, total
 
-    def _upsert_visit_row(self, row: Dict) -> str:
+    def compact_stored_payloads(
+        self,
+        *,
+        batch_size: int = 1000,
+        limit: Optional[int] = None,
+        progress_callback: Optional[Callable[[Dict], None]] = None,
+    ) -> Dict:
+        """Convert rows still stored as full JSON into the configured compact format, batch by batch."""
+        if self.payload_format == BigDataPayloadFormat.JSON:
+            raise ValueError('BIGDATA_VISIT_PAYLOAD_FORMAT must be zlib or dropped to compact payloads')
+
+        batch_size = max(1, int(batch_size))
+        converted = 0
+        bytes_before = 0
+        bytes_after = 0
+        last_id = 0
+
+        while limit is None or converted < limit:
+            current_batch_size = batch_size if limit is None else min(batch_size, limit - converted)
+            batch = list(
+                BigDataVisit.objects.filter(payload_format=BigDataPayloadFormat.JSON, id__gt=last_id)
+                .order_by('id')
+                .only('id', 'park', 'city', 'payload')[:current_batch_size]
+            )
+            if not batch:
+                break
+
+            for visit in batch:
+                row = dict(visit.payload or {})
+                bytes_before += len(self._canonical_json(row))
+                compact = self._build_compact_fields(row)
+                visit.park = visit.park or compact['park']
+                visit.city = visit.city or compact['city']
+                visit.payload = {}
+                visit.payload_format = self.payload_format
+                visit.payload_compressed = compact['payload_compressed']
+                visit.payload_hash = compact['payload_hash']
+                bytes_after += len(compact['payload_compressed'] or b'')
+
+            with transaction.atomic():
+                BigDataVisit.objects.bulk_update(
+                    batch,
+                    ['park', 'city', 'payload', 'payload_format', 'payload_compressed', 'payload_hash'],
+                )
+
+            converted += len(batch)
+            last_id = batch[-1].id
+            if progress_callback is not None:
+                progress_callback({'converted': converted, 'last_id': last_id})
+
+        return {
+            'converted': converted,
+            'payload_format': self.payload_format,
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+        }
+
+    def _upsert_visit_rows(self, rows: List[Dict]) -> Dict[str, int]:
+        stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+
+        # Later duplicates win, matching the previous row-by-row update_or_create behaviour.
+        visits: Dict[str, BigDataVisit] = {}
+        for row in rows:
+            visit = self._build_visit(row)
+            if visit is None:
+                stats['skipped'] += 1
+                continue
+            visits[visit.bigdata_visit_id] = visit
+
+        prepared = list(visits.values())
+        for index in range(0, len(prepared), self.upsert_batch_size):
+            batch = prepared[index:index + self.upsert_batch_size]
+            existing_hashes = dict(
+                BigDataVisit.objects.filter(bigdata_visit_id__in=[visit.bigdata_visit_id for visit in batch])
+                .values_list('bigdata_visit_id', 'payload_hash')
+            )
+
+            to_write: List[BigDataVisit] = []
+            for visit in batch:
+                if visit.bigdata_visit_id not in existing_hashes:
+                    stats['inserted'] += 1
+                elif existing_hashes[visit.bigdata_visit_id] != visit.payload_hash:
+                    stats['updated'] += 1
+                else:
+                    stats['unchanged'] += 1
+                    continue
+                to_write.append(visit)
+
+            if to_write:
+                BigDataVisit.objects.bulk_create(
+                    to_write,
+                    update_conflicts=True,
+                    unique_fields=['bigdata_visit_id'],
+                    update_fields=self.upsert_fields,
+                )
+
+        return stats
+
+    def _build_visit(self, row: Dict) -> Optional[BigDataVisit]:
         visit_time = self._parse_visit_time(row)
         if visit_time is None:
-            return 'skipped'
+            return None
 
         raw_phone = str(row.get('guest_phone') or '').strip()
-        normalized_phone = self._normalize_phone(raw_phone)
-        bigdata_visit_id = self._extract_bigdata_visit_id(row)
-
-        with transaction.atomic():
-            _, created = BigDataVisit.objects.update_or_create(
-                bigdata_visit_id=bigdata_visit_id,
-                defaults={
-                    'guest_phone_raw': raw_phone,
-                    'guest_phone_normalized': normalized_phone,
-                    'time_create': visit_time,
-                    'payload': row,
-                },
-            )
+        compact = self._build_compact_fields(row)
+        return BigDataVisit(
+            bigdata_visit_id=self._extract_bigdata_visit_id(row),
+            guest_phone_raw=raw_phone,
+            guest_phone_normalized=self._normalize_phone(raw_phone),
+            time_create=visit_time,
+            park=compact['park'],
+            city=compact['city'],
+            payload=row if self.payload_format == BigDataPayloadFormat.JSON else {},
+            payload_format=self.payload_format,
+            payload_compressed=compact['payload_compressed'],
+            payload_hash=compact['payload_hash'],
+        )
+
+    def _build_compact_fields(self, row: Dict) -> Dict[str, Any]:
+        park = self._extract_label(row, self.park_keys)
+        city = self._extract_label(row, self.city_keys)
+
+        payload_compressed = None
+        if self.payload_format == BigDataPayloadFormat.ZLIB:
+            # The whole row is kept: the typed columns are truncated and flattened, so they cannot rebuild it.
+            payload_compressed = zlib.compress(self._canonical_json(row), 6)
+
+        return {
+            'park': park,
+            'city': city,
+            'payload_compressed': payload_compressed,
+            'payload_hash': hashlib.sha256(self._canonical_json(row)).hexdigest(),
+        }
+
+    def _extract_label(self, row: Dict, keys: Tuple[str, ...]) -> str:
+        for key in keys:
+            value = row.get(key)
+            if isinstance(value, dict):
+                value = value.get('name') or value.get('name_ru') or value.get('id')
+            if value is None:
+                continue
+            text = str(value).strip()
+            if text:
+                return text[:128]
+        return ''
+
+    def _canonical_json(self, value: Dict) -> bytes:
+        return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
 
-        if created:
-            return 'inserted'
-        return 'updated'
+    def _resolve_payload_format(self, value: str) -> str:
+        normalized = str(value or '').strip().lower()
+        if normalized not in BigDataPayloadFormat.values:
+            raise ValueError(f'Unsupported BigData payload format: {value}')
+        return normalized
 
     def _extract_bigdata_visit_id(self, row: Dict) -> str:
-        for key in ('id', 'visit_id', 'visitId', 'bigdata_id', 'uuid'):
+        for key in self.visit_id_keys:
             value = row.get(key)
             if value is None:
                 continue
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import logging
+from dataclasses import asdict, dataclass, field
 from typing import Any, Dict, List, Optional
 
+from django.conf import settings
+
 from amplitude.models import AllowedEmployeePageAccess, EmployeePortalPage
-from utils.avatariya_client import AvatariyaClient
+from utils.avatariya_client import AvatariyaAPIError, AvatariyaClient
+from utils.cache import LayeredCache
+
+logger = logging.getLogger(__name__)
+
+employee_access_cache = LayeredCache(
+    namespace='employee_access',
+    local_maxsize=settings.EMPLOYEE_ACCESS_LOCAL_CACHE_SIZE,
+    local_ttl_seconds=settings.EMPLOYEE_ACCESS_LOCAL_CACHE_SECONDS,
+)
 
 
 @dataclass(frozen=True)
@@ -16,6 +28,16 @@ class EmployeeProfile:
     position_name: str
 
 
+@dataclass(frozen=True)
+class EmployeeAccess:
+    iin: str
+    profile: Optional[EmployeeProfile] = None
+    allowed_pages: List[str] = field(default_factory=list)
+
+    def has_page(self, page: str) -> bool:
+        return page in self.allowed_pages
+
+
 class EmployeeAccessService:
     def __init__(self, avatariya_client: Optional[AvatariyaClient] = None) -> None:
         if avatariya_client is not None:
@@ -34,31 +56,71 @@ class EmployeeAccessService:
         normalized_iin = (iin or '').strip()
         if not normalized_iin:
             return None
+
+        cache_key = profile_cache_key(normalized_iin)
+        cached = employee_access_cache.get(cache_key)
+        if cached is not None:
+            return EmployeeProfile(**cached['profile']) if cached.get('found') else None
+
         if self.avatariya_client is None:
             return None
 
         try:
-            payload = self.avatariya_client.get_employee_by_iin(normalized_iin)
+            profile, complete = self._load_employee_profile(normalized_iin)
+        except AvatariyaAPIError as exc:
+            if exc.status_code != 404:
+                return None
+            profile, complete = None, True
         except Exception:
+            # Upstream failures are not cached so access recovers as soon as the API does.
             return None
 
+        if profile is None:
+            employee_access_cache.set(cache_key, {'found': False}, settings.EMPLOYEE_PROFILE_NEGATIVE_CACHE_SECONDS)
+        elif not complete:
+            # The position lookup failed; the profile is served without its name and loaded again next time.
+            logger.warning('employee_position_lookup_failed', extra={'position_guid': profile.position_guid})
+        else:
+            employee_access_cache.set(
+                cache_key,
+                {'found': True, 'profile': asdict(profile)},
+                settings.EMPLOYEE_PROFILE_CACHE_SECONDS,
+            )
+        return profile
+
+    def _load_employee_profile(self, normalized_iin: str) -> tuple[Optional[EmployeeProfile], bool]:
+        """Profile of an active employee and whether every part of it was loaded."""
+        payload = self.avatariya_client.get_employee_by_iin(normalized_iin)
+
         data = self._extract_employee_data(payload)
         if data is None:
-            return None
+            return None, True
 
         if data.get('active') is False:
-            return None
+            return None, True
 
         full_name = str(data.get('full_name') or data.get('name') or '').strip()
         email = str(data.get('email') or '').strip().lower()
         position_guid, position_name = self._extract_position(data)
 
-        return EmployeeProfile(
+        profile = EmployeeProfile(
             iin=str(data.get('iin') or normalized_iin).strip(),
             full_name=full_name,
             email=email,
             position_guid=position_guid,
-            position_name=position_name,
+            position_name=position_name or '',
+        )
+        return profile, position_name is not None
+
+    def resolve_access(self, iin: str) -> EmployeeAccess:
+        normalized_iin = (iin or '').strip()
+        profile = self.get_employee_profile(normalized_iin)
+        if profile is None:
+            return EmployeeAccess(iin=normalized_iin)
+        return EmployeeAccess(
+            iin=normalized_iin,
+            profile=profile,
+            allowed_pages=self.allowed_pages_for_position(profile.position_guid),
         )
 
     def allowed_pages_for_iin(self, iin: str) -> List[str]:
@@ -72,6 +134,15 @@ class EmployeeAccessService:
         if not normalized:
             return []
 
+        return list(
+            employee_access_cache.get_or_set(
+                pages_cache_key(normalized),
+                lambda: self._load_allowed_pages(normalized),
+                settings.EMPLOYEE_PAGES_CACHE_SECONDS,
+            )
+        )
+
+    def _load_allowed_pages(self, normalized: str) -> List[str]:
         allowed_set = set(
             AllowedEmployeePageAccess.objects.filter(position_guid=normalized, is_active=True)
             .values_list('page', flat=True)
@@ -97,7 +168,7 @@ class EmployeeAccessService:
 
         return payload
 
-    def _extract_position(self, data: Dict[str, Any]) -> tuple[str, str]:
+    def _extract_position(self, data: Dict[str, Any]) -> tuple[str, Optional[str]]:
         raw = data.get('position')
 
         if isinstance(raw, dict):
@@ -115,18 +186,63 @@ class EmployeeAccessService:
 
         return guid, self._fetch_position_name(guid)
 
-    def _fetch_position_name(self, position_guid: str) -> str:
+    def _fetch_position_name(self, position_guid: str) -> Optional[str]:
+        """Position name by guid; ``None`` when the lookup failed rather than found no name."""
         normalized = (position_guid or '').strip()
         if not normalized or self.avatariya_client is None:
             return ''
 
         try:
             payload = self.avatariya_client.get_position_by_guid(normalized)
+        except AvatariyaAPIError as exc:
+            return '' if exc.status_code == 404 else None
         except Exception:
-            return ''
+            return None
 
         if not isinstance(payload, dict):
             return ''
 
         data = payload.get('data') if isinstance(payload.get('data'), dict) else payload
         return str(data.get('name') or '').strip()
+
+
+def profile_cache_key(iin: str) -> str:
+    return f'profile:{(iin or "").strip()}'
+
+
+def pages_cache_key(position_guid: str) -> str:
+    return f'pages:{(position_guid or "").strip()}'
+
+
+def invalidate_employee_profile(iin: str) -> None:
+    employee_access_cache.delete(profile_cache_key(iin))
+
+
+def invalidate_position_pages(position_guid: str) -> None:
+    employee_access_cache.delete(pages_cache_key(position_guid))
+
+
+def get_request_employee_access(request) -> EmployeeAccess:
+    """Resolve the authenticated user's employee access once per request.
+
+    The result is memoized on the underlying ``HttpRequest`` together with the user it was resolved
+    for, so every permission class and the view itself share one upstream employee lookup.
+    """
+    http_request = getattr(request, '_request', request)
+    user = getattr(request, 'user', None)
+    user_id = getattr(user, 'pk', None) if user is not None and user.is_authenticated else None
+
+    memoized = getattr(http_request, '_employee_access', None)
+    if memoized is not None and memoized[0] == user_id:
+        return memoized[1]
+
+    iin = ''
+    if user_id is not None:
+        try:
+            iin = str(user.employee_binding.iin or '').strip()
+        except Exception:
+            iin = ''
+
+    access = EmployeeAccessService().resolve_access(iin) if iin else EmployeeAccess(iin='')
+    http_request._employee_access = (user_id, access)
+    return access
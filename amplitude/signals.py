@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from amplitude.models import AllowedEmployeePageAccess, UserEmployeeBinding
+from amplitude.services.employee_access_service import invalidate_employee_profile, invalidate_position_pages
+
+
+@receiver(pre_save, sender=AllowedEmployeePageAccess)
+def remember_previous_position_guid(sender, instance, **kwargs):
+    if not instance.pk:
+        instance._previous_position_guid = ''
+        return
+
+    instance._previous_position_guid = (
+        sender.objects.filter(pk=instance.pk).values_list('position_guid', flat=True).first() or ''
+    )
+
+
+@receiver(post_save, sender=AllowedEmployeePageAccess)
+@receiver(post_delete, sender=AllowedEmployeePageAccess)
+def invalidate_allowed_pages_cache(sender, instance, **kwargs):
+    invalidate_position_pages(instance.position_guid)
+    previous = getattr(instance, '_previous_position_guid', '')
+    if previous and previous != instance.position_guid:
+        invalidate_position_pages(previous)
+
+
+@receiver(pre_save, sender=UserEmployeeBinding)
+def remember_previous_iin(sender, instance, **kwargs):
+    if not instance.pk:
+        instance._previous_iin = ''
+        return
+
+    instance._previous_iin = sender.objects.filter(pk=instance.pk).values_list('iin', flat=True).first() or ''
+
+
+@receiver(post_save, sender=UserEmployeeBinding)
+@receiver(post_delete, sender=UserEmployeeBinding)
+def invalidate_employee_profile_cache(sender, instance, **kwargs):
+    invalidate_employee_profile(instance.iin)
+    previous = getattr(instance, '_previous_iin', '')
+    if previous and previous != instance.iin:
+        invalidate_employee_profile(previous)
@@ -1,15 +1,33 @@
 from datetime import date
 from unittest.mock import patch
 
+import requests
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
 from django.test import SimpleTestCase
 from rest_framework.test import APIRequestFactory, force_authenticate
 
+from amplitude.models import BigDataPayloadFormat, UserEmployeeBinding
 from amplitude.serializers import MobileRegistrationsStatsQuerySerializer
+from amplitude.services.bigdata_visit_service import BigDataVisitSyncService
+from amplitude.services.employee_access_service import (
+    EmployeeAccess,
+    EmployeeAccessService,
+    employee_access_cache,
+    get_request_employee_access,
+    invalidate_position_pages,
+)
 from amplitude.services.mobile_registrations_stats_service import (
     MobileRegistrationsStatsService,
     MobileRegistrationsUpstreamError,
 )
-from amplitude.views import MobileRegistrationsStatsViewSet
+from amplitude.views import MobileRegistrationsStatsViewSet, UpstreamCircuitBreakerStatusView
+from utils.avatariya_client import AvatariyaAPIError, AvatariyaClient
+from utils.circuit_breaker import CircuitBreaker, UpstreamCircuitOpenError
+from utils.deadline import DeadlineExceeded, deadline
+from utils.http_transport import HttpTransport, RetryPolicy, TokenBucket, get_transport
+from utils.mobile_client import MobileClient
 
 
 class _FakeMobileClient:
@@ -31,11 +49,17 @@ class _FakeEmployeeBinding:
 class _FakeUser:
     is_authenticated = True
 
-    def __init__(self, user_id: int = 1, iin: str = '123456789012'):
+    def __init__(self, user_id: int = 1, iin: str = '123456789012', is_staff: bool = False):
         self.id = user_id
+        self.pk = user_id
+        self.is_staff = is_staff
         self.employee_binding = _FakeEmployeeBinding(iin)
 
 
+def _access(*pages):
+    return EmployeeAccess(iin='123456789012', allowed_pages=list(pages))
+
+
 class MobileRegistrationsStatsQuerySerializerTests(SimpleTestCase):
     def test_valid_query(self):
         serializer = MobileRegistrationsStatsQuerySerializer(
@@ -127,7 +151,7 @@ class MobileRegistrationsStatsViewSetTests(SimpleTestCase):
         )
         force_authenticate(request, user=_FakeUser())
 
-        with patch('amplitude.views.EmployeeAccessService.allowed_pages_for_iin', return_value=['analytics']):
+        with patch('amplitude.views.EmployeeAccessService.resolve_access', return_value=_access('analytics')):
             with patch('amplitude.views.MobileRegistrationsStatsService') as service_cls:
                 service_cls.return_value.get_stats.return_value = {
                     'registrations': 1608,
@@ -149,7 +173,7 @@ class MobileRegistrationsStatsViewSetTests(SimpleTestCase):
         )
         force_authenticate(request, user=_FakeUser())
 
-        with patch('amplitude.views.EmployeeAccessService.allowed_pages_for_iin', return_value=['guest-profile']):
+        with patch('amplitude.views.EmployeeAccessService.resolve_access', return_value=_access('guest-profile')):
             response = self.view(request)
 
         self.assertEqual(response.status_code, 403)
@@ -161,10 +185,400 @@ class MobileRegistrationsStatsViewSetTests(SimpleTestCase):
         )
         force_authenticate(request, user=_FakeUser())
 
-        with patch('amplitude.views.EmployeeAccessService.allowed_pages_for_iin', return_value=['analytics']):
+        with patch('amplitude.views.EmployeeAccessService.resolve_access', return_value=_access('analytics')):
             with patch('amplitude.views.MobileRegistrationsStatsService') as service_cls:
                 service_cls.return_value.get_stats.side_effect = MobileRegistrationsUpstreamError('upstream failure')
                 response = self.view(request)
 
         self.assertEqual(response.status_code, 502)
         self.assertEqual(str(response.data['detail']), 'upstream failure')
+
+
+class BigDataVisitCompactPayloadTests(SimpleTestCase):
+    row = {
+        'id': 501,
+        'guest_phone': '8 707 123 45 67',
+        'time_create': '2026-02-01T12:30:00+05:00',
+        'park': {'id': 2, 'name': 'Mega Park'},
+        'city_name': 'Алматы',
+        'tickets': [{'id': 1, 'price': 5000}],
+    }
+
+    def test_zlib_format_extracts_columns_and_restores_the_original_payload(self):
+        service = BigDataVisitSyncService(avatariya_client=object(), payload_format='zlib')
+
+        visit = service._build_visit(self.row)
+
+        self.assertEqual(visit.bigdata_visit_id, '501')
+        self.assertEqual(visit.guest_phone_normalized, '77071234567')
+        self.assertEqual(visit.park, 'Mega Park')
+        self.assertEqual(visit.city, 'Алматы')
+        self.assertEqual(visit.payload, {})
+        self.assertEqual(visit.payload_format, BigDataPayloadFormat.ZLIB)
+        self.assertEqual(visit.get_payload(), self.row)
+
+    def test_dropped_format_keeps_only_typed_columns(self):
+        service = BigDataVisitSyncService(avatariya_client=object(), payload_format='dropped')
+
+        visit = service._build_visit(self.row)
+
+        self.assertIsNone(visit.payload_compressed)
+        self.assertNotIn('tickets', visit.get_payload())
+
+    def test_hash_is_stable_for_identical_rows(self):
+        service = BigDataVisitSyncService(avatariya_client=object(), payload_format='zlib')
+
+        first = service._build_visit(dict(self.row))
+        second = service._build_visit(dict(reversed(list(self.row.items()))))
+
+        self.assertEqual(first.payload_hash, second.payload_hash)
+
+    def test_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            BigDataVisitSyncService(avatariya_client=object(), payload_format='gzip')
+
+
+class _FakeResponse:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = '{}'
+        self.url = 'http://upstream.test/'
+
+    def close(self):
+        return None
+
+    def raise_for_status(self):
+        return None
+
+    def json(self):
+        return {}
+
+
+class HttpTransportTests(SimpleTestCase):
+    def test_get_transport_returns_process_wide_instance(self):
+        self.assertIs(get_transport('avatariya'), get_transport('avatariya'))
+        self.assertIsNot(get_transport('avatariya'), get_transport('mobile'))
+
+    def test_session_is_reused_and_rebuilt_after_fork(self):
+        transport = HttpTransport(name='test', pool_connections=2, pool_maxsize=4, pool_block=True)
+        session = transport.session
+        self.assertIs(transport.session, session)
+
+        adapter = session.get_adapter('https://upstream.test/')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertTrue(adapter._pool_block)
+
+        with patch('utils.http_transport.os.getpid', return_value=-1):
+            self.assertIsNot(transport.session, session)
+
+    def test_clients_route_requests_through_shared_transport(self):
+        transport = HttpTransport(name='test')
+        with patch.object(transport, 'request', return_value=_FakeResponse()) as request_mock:
+            AvatariyaClient(base_url='http://avatariya.test', transport=transport).get_guest(1)
+            MobileClient(base_url='http://mobile.test', transport=transport).get('/api/ping/')
+
+        self.assertEqual(request_mock.call_count, 2)
+        self.assertEqual(request_mock.call_args_list[0].args[0], 'GET')
+        self.assertTrue(request_mock.call_args_list[1].args[1].startswith('http://mobile.test/'))
+
+    def _transport(self, **kwargs):
+        retry_policy = RetryPolicy(
+            max_retries=kwargs.pop('max_retries', 2),
+            backoff_base_seconds=0.1,
+            backoff_max_seconds=1,
+            retry_after_max_seconds=30,
+        )
+        return HttpTransport(name='test', retry_policy=retry_policy, rate_limits=kwargs.pop('rate_limits', {}))
+
+    def test_retries_idempotent_call_on_gateway_error(self):
+        transport = self._transport()
+        responses = [_FakeResponse(503), _FakeResponse(200)]
+        with patch.object(transport.session, 'request', side_effect=responses) as request_mock, patch(
+            'utils.http_transport.time.sleep'
+        ) as sleep_mock:
+            response = transport.get('http://upstream.test/guest/1/', endpoint='guest')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(request_mock.call_count, 2)
+        self.assertLessEqual(sleep_mock.call_args.args[0], 0.1)
+
+    def test_does_not_retry_non_idempotent_post_on_gateway_error(self):
+        transport = self._transport()
+        with patch.object(transport.session, 'request', return_value=_FakeResponse(502)) as request_mock, patch(
+            'utils.http_transport.time.sleep'
+        ):
+            response = transport.post('http://upstream.test/cashback/', endpoint='cashback_create')
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(request_mock.call_count, 1)
+
+    def test_honors_retry_after_on_rate_limited_post(self):
+        transport = self._transport()
+        responses = [_FakeResponse(429, headers={'Retry-After': '2'}), _FakeResponse(201)]
+        with patch.object(transport.session, 'request', side_effect=responses), patch(
+            'utils.http_transport.time.sleep'
+        ) as sleep_mock:
+            response = transport.post('http://upstream.test/cashback/', endpoint='cashback_create')
+
+        self.assertEqual(response.status_code, 201)
+        sleep_mock.assert_called_once_with(2.0)
+
+    def test_retries_connection_reset_only_when_idempotent(self):
+        transport = self._transport(max_retries=1)
+        error = requests.exceptions.ConnectionError('reset')
+        with patch.object(transport.session, 'request', side_effect=[error, _FakeResponse(200)]), patch(
+            'utils.http_transport.time.sleep'
+        ):
+            self.assertEqual(transport.get('http://upstream.test/city/').status_code, 200)
+
+        with patch.object(transport.session, 'request', side_effect=error), patch('utils.http_transport.time.sleep'):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                transport.post('http://upstream.test/cashback/')
+
+    def test_token_bucket_waits_when_burst_is_exhausted(self):
+        bucket = TokenBucket(rate_per_second=10, capacity=1)
+        with patch('utils.http_transport.time.sleep') as sleep_mock:
+            self.assertEqual(bucket.acquire(), 0.0)
+            bucket.acquire()
+
+        self.assertTrue(sleep_mock.called)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def _transport(self, breaker):
+        retry_policy = RetryPolicy(max_retries=0, backoff_base_seconds=0, backoff_max_seconds=0)
+        return HttpTransport(name='test', retry_policy=retry_policy, rate_limits={}, circuit_breaker=breaker)
+
+    def test_opens_after_consecutive_failures_and_fails_fast(self):
+        breaker = CircuitBreaker(name='test', failure_threshold=2, reset_timeout_seconds=60)
+        transport = self._transport(breaker)
+        with patch.object(transport.session, 'request', return_value=_FakeResponse(503)) as request_mock:
+            transport.get('http://upstream.test/guest/1/')
+            transport.get('http://upstream.test/guest/1/')
+            with self.assertRaises(UpstreamCircuitOpenError):
+                transport.get('http://upstream.test/guest/1/')
+
+        self.assertEqual(request_mock.call_count, 2)
+        snapshot = breaker.snapshot()
+        self.assertEqual(snapshot['state'], CircuitBreaker.OPEN)
+        self.assertEqual(snapshot['total_rejections'], 1)
+
+    def test_client_errors_do_not_trip_the_breaker(self):
+        breaker = CircuitBreaker(name='test', failure_threshold=1, reset_timeout_seconds=60)
+        transport = self._transport(breaker)
+        with patch.object(transport.session, 'request', return_value=_FakeResponse(404)):
+            transport.get('http://upstream.test/guest/1/')
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_closes_circuit_on_success(self):
+        breaker = CircuitBreaker(name='test', failure_threshold=1, reset_timeout_seconds=0, half_open_max_calls=1)
+        breaker.record_failure('HTTP 503')
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+        breaker.before_call()
+        with self.assertRaises(UpstreamCircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_status_view_is_admin_only(self):
+        factory = APIRequestFactory()
+        view = UpstreamCircuitBreakerStatusView.as_view()
+
+        request = factory.get('/api/upstream/circuit-breakers/')
+        force_authenticate(request, user=_FakeUser(is_staff=False))
+        self.assertEqual(view(request).status_code, 403)
+
+        request = factory.get('/api/upstream/circuit-breakers/')
+        force_authenticate(request, user=_FakeUser(is_staff=True))
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue({'avatariya', 'mobile'} <= {item['name'] for item in response.data['upstreams']})
+
+
+class UpstreamTimeoutTests(SimpleTestCase):
+    def _transport(self, endpoint_timeouts=None):
+        return HttpTransport(
+            name='test',
+            retry_policy=RetryPolicy(max_retries=0),
+            rate_limits={},
+            connect_timeout_seconds=3,
+            endpoint_timeouts=endpoint_timeouts or {},
+        )
+
+    def test_splits_connect_and_read_timeouts_with_endpoint_override(self):
+        transport = self._transport(endpoint_timeouts={'employee': (2.0, 5.0)})
+        with patch.object(transport.session, 'request', return_value=_FakeResponse()) as request_mock:
+            transport.get('http://upstream.test/employees/1/', endpoint='employee', timeout=30)
+            transport.get('http://upstream.test/city/', endpoint='city', timeout=30)
+
+        self.assertEqual(request_mock.call_args_list[0].kwargs['timeout'], (2.0, 5.0))
+        self.assertEqual(request_mock.call_args_list[1].kwargs['timeout'], (3, 30))
+
+    def test_deadline_caps_timeouts_and_skips_calls_once_spent(self):
+        transport = self._transport()
+        with patch.object(transport.session, 'request', return_value=_FakeResponse()) as request_mock:
+            with deadline(1):
+                transport.get('http://upstream.test/city/', timeout=30)
+            with patch('utils.deadline.time.monotonic', side_effect=[100.0, 200.0]):
+                with deadline(1):
+                    with self.assertRaises(DeadlineExceeded):
+                        transport.get('http://upstream.test/city/', timeout=30)
+
+        connect_timeout, read_timeout = request_mock.call_args.kwargs['timeout']
+        self.assertLessEqual(connect_timeout, 1)
+        self.assertLessEqual(read_timeout, 1)
+        self.assertEqual(request_mock.call_count, 1)
+        self.assertEqual(transport.circuit_breaker.state, CircuitBreaker.CLOSED)
+
+    def test_rate_limit_wait_is_capped_by_the_deadline(self):
+        bucket = TokenBucket(rate_per_second=0.1, capacity=1)
+        transport = HttpTransport(
+            name='test',
+            retry_policy=RetryPolicy(max_retries=0),
+            rate_limits={'default': bucket},
+        )
+        with patch.object(transport.session, 'request', return_value=_FakeResponse()) as request_mock, patch(
+            'utils.http_transport.time.sleep'
+        ) as sleep_mock:
+            with deadline(1):
+                transport.get('http://upstream.test/city/', timeout=30)
+                with self.assertRaises(DeadlineExceeded):
+                    transport.get('http://upstream.test/city/', timeout=30)
+
+        self.assertEqual(request_mock.call_count, 1)
+        sleep_mock.assert_not_called()
+        self.assertEqual(transport.circuit_breaker.state, CircuitBreaker.CLOSED)
+
+    def test_nested_deadline_cannot_extend_outer_budget(self):
+        from utils.deadline import remaining_seconds
+
+        with deadline(1):
+            with deadline(60):
+                self.assertLessEqual(remaining_seconds(), 1)
+        self.assertIsNone(remaining_seconds())
+
+
+class _FakeEmployeeClient:
+    def __init__(self, payload=None, error=None, position_error=None):
+        self.payload = payload
+        self.error = error
+        self.position_error = position_error
+        self.calls = 0
+
+    def get_employee_by_iin(self, iin):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.payload
+
+    def get_position_by_guid(self, position_guid):
+        if self.position_error is not None:
+            raise self.position_error
+        return {'name': 'Manager'}
+
+
+class EmployeeAccessCacheTests(SimpleTestCase):
+    def setUp(self):
+        employee_access_cache.clear_local()
+        cache.clear()
+
+    def test_caches_employee_profile_between_service_instances(self):
+        client = _FakeEmployeeClient(
+            payload={'iin': '900101300001', 'full_name': 'Test', 'position': {'guid': 'pos-1', 'name': 'Manager'}}
+        )
+
+        first = EmployeeAccessService(avatariya_client=client).get_employee_profile('900101300001')
+        second = EmployeeAccessService(avatariya_client=client).get_employee_profile('900101300001')
+
+        self.assertEqual(first, second)
+        self.assertEqual(second.position_guid, 'pos-1')
+        self.assertEqual(client.calls, 1)
+
+    def test_caches_not_found_but_not_upstream_failures(self):
+        missing_client = _FakeEmployeeClient(error=AvatariyaAPIError('not found', 404))
+        service = EmployeeAccessService(avatariya_client=missing_client)
+        self.assertIsNone(service.get_employee_profile('900101300002'))
+        self.assertIsNone(service.get_employee_profile('900101300002'))
+        self.assertEqual(missing_client.calls, 1)
+
+        failing_client = _FakeEmployeeClient(error=AvatariyaAPIError('bad gateway', 502))
+        service = EmployeeAccessService(avatariya_client=failing_client)
+        self.assertIsNone(service.get_employee_profile('900101300003'))
+        self.assertIsNone(service.get_employee_profile('900101300003'))
+        self.assertEqual(failing_client.calls, 2)
+
+    def test_profile_with_failed_position_lookup_is_not_cached(self):
+        payload = {'iin': '900101300005', 'full_name': 'Test', 'position': 'pos-5'}
+        client = _FakeEmployeeClient(payload=payload, position_error=AvatariyaAPIError('bad gateway', 502))
+        service = EmployeeAccessService(avatariya_client=client)
+
+        profile = service.get_employee_profile('900101300005')
+        self.assertEqual((profile.position_guid, profile.position_name), ('pos-5', ''))
+
+        client.position_error = None
+        self.assertEqual(service.get_employee_profile('900101300005').position_name, 'Manager')
+        self.assertEqual(service.get_employee_profile('900101300005').position_name, 'Manager')
+        self.assertEqual(client.calls, 2)
+
+    def test_caches_allowed_pages_until_invalidated(self):
+        service = EmployeeAccessService(avatariya_client=_FakeEmployeeClient())
+        with patch.object(service, '_load_allowed_pages', side_effect=[['analytics'], ['analytics', 'coupons']]) as load_mock:
+            self.assertEqual(service.allowed_pages_for_position('pos-2'), ['analytics'])
+            self.assertEqual(service.allowed_pages_for_position('pos-2'), ['analytics'])
+            invalidate_position_pages('pos-2')
+            self.assertEqual(service.allowed_pages_for_position('pos-2'), ['analytics', 'coupons'])
+
+        self.assertEqual(load_mock.call_count, 2)
+
+    def test_binding_iin_change_invalidates_old_and_new_profiles(self):
+        client = _FakeEmployeeClient(
+            payload={'iin': '900101300001', 'full_name': 'Test', 'position': {'guid': 'pos-1', 'name': 'Manager'}}
+        )
+        service = EmployeeAccessService(avatariya_client=client)
+        service.get_employee_profile('900101300001')
+        service.get_employee_profile('900101300004')
+        binding = UserEmployeeBinding(pk=5, iin='900101300004')
+        binding._previous_iin = '900101300001'
+
+        post_save.send(sender=UserEmployeeBinding, instance=binding, created=False)
+        service.get_employee_profile('900101300001')
+        service.get_employee_profile('900101300004')
+        self.assertEqual(client.calls, 4)
+
+        post_delete.send(sender=UserEmployeeBinding, instance=UserEmployeeBinding(pk=5, iin='900101300004'))
+        service.get_employee_profile('900101300004')
+        self.assertEqual(client.calls, 5)
+
+
+class RequestEmployeeAccessTests(SimpleTestCase):
+    def test_resolves_access_once_per_request(self):
+        request = APIRequestFactory().get('/api/auth/me/')
+        request.user = _FakeUser()
+
+        with patch.object(EmployeeAccessService, 'resolve_access', return_value=_access('analytics')) as resolve_mock:
+            first = get_request_employee_access(request)
+            second = get_request_employee_access(request)
+
+        self.assertIs(first, second)
+        self.assertTrue(second.has_page('analytics'))
+        resolve_mock.assert_called_once_with('123456789012')
+
+    def test_permissions_and_view_share_one_resolution(self):
+        request = APIRequestFactory().get(
+            '/api/amplitude/mobile-registrations-stats/',
+            {'year': '2026', 'start_date': '2026-02-01', 'end_date': '2026-02-03'},
+        )
+        force_authenticate(request, user=_FakeUser())
+        view = MobileRegistrationsStatsViewSet.as_view({'get': 'list'})
+
+        with patch.object(EmployeeAccessService, 'resolve_access', return_value=_access('analytics')) as resolve_mock:
+            with patch('amplitude.views.MobileRegistrationsStatsService') as service_cls:
+                service_cls.return_value.get_stats.side_effect = MobileRegistrationsUpstreamError('upstream failure')
+                view(request)
+                self.assertEqual(get_request_employee_access(request).allowed_pages, ['analytics'])
+
+        resolve_mock.assert_called_once()
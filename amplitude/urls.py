@@ -9,6 +9,7 @@ from .views import (
 	DailyDeviceActivityViewSet,
 	MobileRegistrationsStatsViewSet,
 	LocationPresenceStatsViewSet,
+	UpstreamCircuitBreakerStatusView,
 )
 
 router = DefaultRouter()
@@ -22,4 +23,5 @@ urlpatterns += [
 	path('auth/login/', AuthLoginView.as_view(), name='auth-login'),
 	path('auth/me/', AuthMeView.as_view(), name='auth-me'),
 	path('auth/logout/', AuthLogoutView.as_view(), name='auth-logout'),
+	path('upstream/circuit-breakers/', UpstreamCircuitBreakerStatusView.as_view(), name='upstream-circuit-breakers'),
 ]
@@ -1,4 +1,5 @@
 import logging
+import os
 from datetime import datetime
 from typing import Any, Dict
 
@@ -8,11 +9,13 @@ from django.db import IntegrityError, transaction
 from django.utils import timezone
 from rest_framework import status, viewsets
 from rest_framework.authtoken.models import Token
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.response import Response
 
+from utils.http_transport import circuit_breaker_states
+
 from .models import DailyDeviceActivity, LocationPresenceStatsCache, UserEmployeeBinding
 from .permissions import HasAnalyticsAccess
 from .serializers import (
@@ -20,7 +23,7 @@ from .serializers import (
     MobileRegistrationsStatsQuerySerializer,
     MobileRegistrationsStatsResponseSerializer,
 )
-from .services.employee_access_service import EmployeeAccessService
+from .services.employee_access_service import EmployeeAccessService, get_request_employee_access
 from .services.location_presence_service import LocationPresenceAnalyticsService
 from .services.mobile_registrations_stats_service import MobileRegistrationsStatsService, MobileRegistrationsUpstreamError
 
@@ -177,19 +180,16 @@ class AuthLoginView(APIView):
         except UserEmployeeBinding.DoesNotExist as exc:
             raise ValidationError({'detail': 'Employee binding is missing. Please register first.'}) from exc
 
-        access_service = EmployeeAccessService()
-        profile = access_service.get_employee_profile(binding.iin)
-        if profile is None:
+        access = EmployeeAccessService().resolve_access(binding.iin)
+        if access.profile is None:
             raise ValidationError({'detail': 'Employee was not found or has no access to this site'})
 
-        allowed_pages = access_service.allowed_pages_for_position(profile.position_guid)
-
         token, _ = Token.objects.get_or_create(user=user)
         payload = _build_auth_response(
             user=user,
             iin=binding.iin,
-            profile=profile,
-            allowed_pages=allowed_pages,
+            profile=access.profile,
+            allowed_pages=access.allowed_pages,
         )
         payload['token'] = token.key
         return Response(payload)
@@ -206,9 +206,8 @@ class AuthRegisterView(APIView):
         if not email or not password or not iin:
             raise ValidationError({'detail': 'email, password and iin are required'})
 
-        access_service = EmployeeAccessService()
-        profile = access_service.get_employee_profile(iin)
-        if profile is None:
+        access = EmployeeAccessService().resolve_access(iin)
+        if access.profile is None:
             raise ValidationError({'detail': 'Employee was not found or has no access to this site'})
 
         User = get_user_model()
@@ -228,14 +227,12 @@ class AuthRegisterView(APIView):
         except IntegrityError as exc:
             raise ValidationError({'detail': 'Email or IIN is already registered'}) from exc
 
-        allowed_pages = access_service.allowed_pages_for_position(profile.position_guid)
-
         token, _ = Token.objects.get_or_create(user=user)
         payload = _build_auth_response(
             user=user,
             iin=iin,
-            profile=profile,
-            allowed_pages=allowed_pages,
+            profile=access.profile,
+            allowed_pages=access.allowed_pages,
         )
         payload['token'] = token.key
         return Response(payload)
@@ -245,22 +242,13 @@ class AuthMeView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        iin = ''
-        try:
-            iin = user.employee_binding.iin
-        except UserEmployeeBinding.DoesNotExist:
-            pass
-
-        access_service = EmployeeAccessService()
-        profile = access_service.get_employee_profile(iin) if iin else None
-        allowed_pages = access_service.allowed_pages_for_position(profile.position_guid) if profile else []
+        access = get_request_employee_access(request)
         return Response(
             _build_auth_response(
-                user=user,
-                iin=iin,
-                profile=profile,
-                allowed_pages=allowed_pages,
+                user=request.user,
+                iin=access.iin,
+                profile=access.profile,
+                allowed_pages=access.allowed_pages,
             )
         )
 
@@ -291,5 +279,19 @@ def _build_auth_response(
             },
         },
         'iin': iin,
-        'allowed_pages': allowed_pages,
+        'allowed_pages': list(allowed_pages),
     }
+
+
+class UpstreamCircuitBreakerStatusView(APIView):
+    """Circuit breaker state of the upstream APIs as seen by the worker process that serves the request."""
+
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {
+                'pid': os.getpid(),
+                'upstreams': circuit_breaker_states(),
+            }
+        )
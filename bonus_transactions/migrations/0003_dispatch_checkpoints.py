@@ -0,0 +1,53 @@
+# Generated by Django 4.2.28 on 2026-10-19 15:59
+
+from django.db import migrations, models
+
+
+def mark_existing_results_processed(apps, schema_editor):
+    # Rows written before checkpointing are final outcomes of finished runs.
+    BonusTransactionJobResult = apps.get_model('bonus_transactions', 'BonusTransactionJobResult')
+    BonusTransactionJobResult.objects.update(processed=True)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bonus_transactions', '0002_bonustransactionsettings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bonustransactionjob',
+            name='results_seeded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Строки результатов созданы'),
+        ),
+        migrations.AddField(
+            model_name='bonustransactionjob',
+            name='resume_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество возобновлений'),
+        ),
+        migrations.AddField(
+            model_name='bonustransactionjobresult',
+            name='attempted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Отправлено в обработку'),
+        ),
+        migrations.AddField(
+            model_name='bonustransactionjobresult',
+            name='processed',
+            field=models.BooleanField(default=False, verbose_name='Обработано'),
+        ),
+        migrations.AddField(
+            model_name='bonustransactionjobresult',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Время обработки'),
+        ),
+        migrations.AddIndex(
+            model_name='bonustransactionjobresult',
+            index=models.Index(fields=['job', 'processed'], name='idx_bonus_job_processed'),
+        ),
+        migrations.RunPython(mark_existing_results_processed, noop_reverse),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bonus_transactions', '0003_dispatch_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bonustransactionjob',
+            name='processed_rows',
+            field=models.PositiveIntegerField(default=0, verbose_name='Обработано строк'),
+        ),
+        migrations.AddField(
+            model_name='bonustransactionjob',
+            name='progress_updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Прогресс обновлен'),
+        ),
+        migrations.AddField(
+            model_name='bonustransactionjob',
+            name='rows_per_second',
+            field=models.FloatField(default=0, verbose_name='Скорость, строк/сек'),
+        ),
+    ]
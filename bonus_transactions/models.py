@@ -70,8 +70,13 @@ class BonusTransactionJob(models.Model):
     guests_found = models.PositiveIntegerField(default=0, verbose_name='Найдено гостей')
     cashbacks_created = models.PositiveIntegerField(default=0, verbose_name='Успешно начислено')
     errors_count = models.PositiveIntegerField(default=0, verbose_name='Ошибок')
+    processed_rows = models.PositiveIntegerField(default=0, verbose_name='Обработано строк')
+    rows_per_second = models.FloatField(default=0, verbose_name='Скорость, строк/сек')
+    progress_updated_at = models.DateTimeField(null=True, blank=True, verbose_name='Прогресс обновлен')
     external_api_response = models.JSONField(default=dict, blank=True, verbose_name='Ответ cashback API')
     error_log = models.TextField(blank=True, verbose_name='Лог ошибок')
+    results_seeded_at = models.DateTimeField(null=True, blank=True, verbose_name='Строки результатов созданы')
+    resume_count = models.PositiveIntegerField(default=0, verbose_name='Количество возобновлений')
     started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начало обработки')
     finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Конец обработки')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
@@ -102,6 +107,9 @@ class BonusTransactionJobResult(models.Model):
     error_message = models.TextField(blank=True, verbose_name='Текст ошибки')
     cashback_payload = models.JSONField(default=dict, blank=True, verbose_name='Отправленный payload')
     cashback_response = models.JSONField(default=dict, blank=True, verbose_name='Ответ cashback API')
+    processed = models.BooleanField(default=False, verbose_name='Обработано')
+    attempted_at = models.DateTimeField(null=True, blank=True, verbose_name='Отправлено в обработку')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Время обработки')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
 
@@ -109,6 +117,7 @@ class BonusTransactionJobResult(models.Model):
         ordering = ('id',)
         indexes = [
             models.Index(fields=('job', 'success'), name='idx_bonus_job_success'),
+            models.Index(fields=('job', 'processed'), name='idx_bonus_job_processed'),
         ]
         verbose_name = 'Результат начисления бонуса'
         verbose_name_plural = 'Результаты начисления бонусов'
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
-from bonus_transactions.models import BonusTransactionJob, BonusTransactionJobResult
+from bonus_transactions.models import BonusTransactionJob, BonusTransactionJobResult, BonusTransactionJobStatus
+from utils.job_progress import estimate_eta_seconds
 
 
 class BonusTransactionJobCreateSerializer(serializers.Serializer):
@@ -43,6 +44,7 @@ class BonusTransactionJobResultSerializer(serializers.ModelSerializer):
             'base_id',
             'success',
             'error_message',
+            'processed',
             'created_at',
         )
 
@@ -66,6 +68,7 @@ class BonusTransactionJobListSerializer(serializers.ModelSerializer):
             'guests_found',
             'cashbacks_created',
             'errors_count',
+            'resume_count',
             'started_at',
             'finished_at',
             'initiated_by_email',
@@ -80,12 +83,44 @@ class BonusTransactionJobListSerializer(serializers.ModelSerializer):
         return str(user.email or '').strip().lower()
 
 
-class BonusTransactionJobDetailSerializer(BonusTransactionJobListSerializer):
-    results = BonusTransactionJobResultSerializer(many=True, read_only=True)
-
+class BonusTransactionJobSummarySerializer(BonusTransactionJobListSerializer):
     class Meta(BonusTransactionJobListSerializer.Meta):
         fields = BonusTransactionJobListSerializer.Meta.fields + (
             'error_log',
             'external_api_response',
-            'results',
         )
+
+
+class BonusTransactionJobDetailSerializer(BonusTransactionJobSummarySerializer):
+    results = BonusTransactionJobResultSerializer(many=True, read_only=True)
+
+    class Meta(BonusTransactionJobSummarySerializer.Meta):
+        fields = BonusTransactionJobSummarySerializer.Meta.fields + ('results',)
+
+
+class BonusTransactionJobProgressSerializer(serializers.ModelSerializer):
+    total_rows = serializers.IntegerField(source='unique_phones')
+    succeeded = serializers.IntegerField(source='cashbacks_created')
+    failed = serializers.IntegerField(source='errors_count')
+    eta_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BonusTransactionJob
+        fields = (
+            'id',
+            'status',
+            'total_rows',
+            'processed_rows',
+            'succeeded',
+            'failed',
+            'rows_per_second',
+            'eta_seconds',
+            'progress_updated_at',
+            'started_at',
+            'finished_at',
+        )
+
+    def get_eta_seconds(self, obj):
+        if obj.status != BonusTransactionJobStatus.PROCESSING:
+            return None
+        return estimate_eta_seconds(total=obj.unique_phones, processed=obj.processed_rows, rows_per_second=obj.rows_per_second)
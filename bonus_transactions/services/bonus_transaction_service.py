@@ -1,17 +1,16 @@
 from __future__ import annotations
 
-import io
 import logging
 import re
 import uuid
-from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Sequence
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
 
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Count, F, Q
 from django.db.utils import OperationalError, ProgrammingError
 from django.utils import timezone as dj_timezone
-from openpyxl import load_workbook
 
 from bonus_transactions.models import (
     BonusTransactionJob,
@@ -20,20 +19,38 @@ from bonus_transactions.models import (
     BonusTransactionJobStatus,
     BonusTransactionInputSource,
 )
+from guest_profile.models import GuestPhoneSource
+from guest_profile.services.guest_phone_cache import GuestPhoneCacheService
 from utils.avatariya_client import AvatariyaClient
+from utils.concurrency import TaskOutcome, run_bounded
+from utils.excel_stream import iter_sheet_rows
+from utils.job_checkpoint import (
+    UPSTREAM_UNAVAILABLE_ERROR,
+    ResultCheckpoint,
+    SeedStats,
+    UpstreamUnavailable,
+    is_transient_error,
+    resumable_job_filter,
+)
+from utils.job_progress import JobProgress
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class _PhoneRow:
-    phone_raw: str
-    phone_normalized: str
-
-
 class BonusTransactionService:
-    def __init__(self, avatariya_client: Optional[AvatariyaClient] = None):
+    def __init__(
+        self,
+        avatariya_client: Optional[AvatariyaClient] = None,
+        checkpoint_batch_size: Optional[int] = None,
+        lookup_workers: Optional[int] = None,
+        cashback_workers: Optional[int] = None,
+        guest_cache: Optional[GuestPhoneCacheService] = None,
+    ):
         self.avatariya = avatariya_client or AvatariyaClient()
+        self.guest_cache = guest_cache or GuestPhoneCacheService()
+        self.checkpoint_batch_size = checkpoint_batch_size or settings.JOB_CHECKPOINT_BATCH_SIZE
+        self.lookup_workers = lookup_workers or settings.BONUS_TRANSACTION_LOOKUP_WORKERS
+        self.cashback_workers = cashback_workers or settings.BONUS_TRANSACTION_CASHBACK_WORKERS
 
     @transaction.atomic
     def create_job(
@@ -71,169 +88,65 @@ class BonusTransactionService:
         )
         return job
 
-    def process_job(self, job_id: int) -> BonusTransactionJob:
+    def process_job(self, job_id: int, *, resume: bool = False) -> BonusTransactionJob:
         job = BonusTransactionJob.objects.get(pk=job_id)
-
-        # Safety guard: process only pending jobs to avoid accidental duplicate accruals.
-        if job.status != BonusTransactionJobStatus.PENDING:
-            return job
-
-        # Additional guard for any inconsistent status transitions.
-        if job.cashbacks_created > 0:
-            return job
-
         now = dj_timezone.now()
-        claimed = BonusTransactionJob.objects.filter(
-            pk=job_id,
-            status=BonusTransactionJobStatus.PENDING,
-            cashbacks_created=0,
-        ).update(
-            status=BonusTransactionJobStatus.PROCESSING,
-            started_at=now,
-            finished_at=None,
-            error_log='',
-            external_api_response={},
-            total_phones=0,
-            unique_phones=0,
-            guests_found=0,
-            cashbacks_created=0,
-            errors_count=0,
-            updated_at=now,
-        )
+
+        if resume:
+            # Resume continues checkpointed rows only; committed rows are never resent, released ones keep their doc_guid.
+            claimed = BonusTransactionJob.objects.filter(self._resumable_filter(), pk=job_id).update(
+                status=BonusTransactionJobStatus.PROCESSING,
+                finished_at=None,
+                resume_count=F('resume_count') + 1,
+                updated_at=now,
+            )
+        else:
+            # Safety guard: process only pending jobs to avoid accidental duplicate accruals.
+            if job.status != BonusTransactionJobStatus.PENDING:
+                return job
+
+            # Additional guard for any inconsistent status transitions.
+            if job.cashbacks_created > 0:
+                return job
+
+            claimed = BonusTransactionJob.objects.filter(
+                pk=job_id,
+                status=BonusTransactionJobStatus.PENDING,
+                cashbacks_created=0,
+            ).update(
+                status=BonusTransactionJobStatus.PROCESSING,
+                started_at=now,
+                finished_at=None,
+                error_log='',
+                external_api_response={},
+                total_phones=0,
+                unique_phones=0,
+                guests_found=0,
+                cashbacks_created=0,
+                errors_count=0,
+                updated_at=now,
+            )
         if claimed == 0:
             return BonusTransactionJob.objects.get(pk=job_id)
 
         job = BonusTransactionJob.objects.get(pk=job_id)
-        logger.info('job_started', extra={'job_id': job_id})
+        logger.info('job_resumed' if resume else 'job_started', extra={'job_id': job_id})
 
         try:
-            raw_phones = self._collect_phone_candidates(job)
-            parsed_rows, parse_errors = self._parse_and_dedupe(raw_phones)
-
-            guest_found_count = 0
-            success_count = 0
-            result_rows: List[BonusTransactionJobResult] = []
-            api_outcomes: List[Dict] = []
-
-            for message in parse_errors:
-                result_rows.append(
-                    BonusTransactionJobResult(
-                        job=job,
-                        phone_raw='',
-                        phone_normalized='',
-                        success=False,
-                        error_message=message,
-                    )
-                )
-
-            for row in parsed_rows:
-                try:
-                    guest_payload = self.avatariya.find_guest_by_phone(row.phone_normalized)
-                    guest_id = self._extract_guest_id(guest_payload)
-                    if guest_id is None:
-                        result_rows.append(
-                            BonusTransactionJobResult(
-                                job=job,
-                                phone_raw=row.phone_raw,
-                                phone_normalized=row.phone_normalized,
-                                success=False,
-                                error_message='guest_not_found',
-                            )
-                        )
-                        continue
-
-                    guest_found_count += 1
-                    doc_guid = str(uuid.uuid4())
-                    base_id = self._build_base_id(job.base_id_prefix)
-                    payload = {
-                        'doc_guid': doc_guid,
-                        'guest': int(guest_id),
-                        'park_id': None,
-                        'amount': int(job.amount),
-                        'transaction_date': self._utc_iso_now(),
-                        'date': self._utc_iso_now(),
-                        'base_id': base_id,
-                        'type': int(job.bonus_type),
-                        'registration_bonus': bool(job.registration_bonus),
-                        'start_date': job.start_date.isoformat(),
-                        'expiration_date': job.expiration_date.isoformat(),
-                        'description': job.description,
-                    }
-
-                    api_response = self.avatariya.create_cashback(payload)
-                    success_count += 1
-                    api_outcomes.append({'phone': row.phone_normalized, 'ok': True})
-                    result_rows.append(
-                        BonusTransactionJobResult(
-                            job=job,
-                            phone_raw=row.phone_raw,
-                            phone_normalized=row.phone_normalized,
-                            guest_id=guest_id,
-                            doc_guid=doc_guid,
-                            base_id=base_id,
-                            success=True,
-                            cashback_payload=payload,
-                            cashback_response=api_response if isinstance(api_response, dict) else {'raw': api_response},
-                        )
-                    )
-                except Exception as exc:
-                    logger.warning(
-                        'row_processing_error',
-                        extra={'job_id': job.id, 'phone': row.phone_normalized, 'detail': str(exc)},
-                    )
-                    api_outcomes.append({'phone': row.phone_normalized, 'ok': False, 'error': str(exc)})
-                    result_rows.append(
-                        BonusTransactionJobResult(
-                            job=job,
-                            phone_raw=row.phone_raw,
-                            phone_normalized=row.phone_normalized,
-                            success=False,
-                            error_message='processing_error',
-                        )
-                    )
-
-            BonusTransactionJobResult.objects.filter(job=job).delete()
-            if result_rows:
-                BonusTransactionJobResult.objects.bulk_create(result_rows, batch_size=300)
-
-            total_errors = sum(1 for item in result_rows if not item.success)
-            error_messages = [item.error_message for item in result_rows if item.error_message]
-            job.total_phones = len(raw_phones)
-            job.unique_phones = len(parsed_rows)
-            job.guests_found = guest_found_count
-            job.cashbacks_created = success_count
-            job.errors_count = total_errors
-            job.status = BonusTransactionJobStatus.COMPLETED
+            checkpoint = self._checkpoint(job)
+            if not checkpoint.is_seeded:
+                self._seed_results(job=job, checkpoint=checkpoint)
+            checkpoint.close_interrupted()
+            progress = self._start_progress(job)
+            api_outcomes = self._process_pending_rows(job=job, checkpoint=checkpoint, progress=progress)
+            return self._finalize_job(job=job, api_outcomes=api_outcomes)
+        except UpstreamUnavailable as exc:
+            # Released rows keep their doc_guid, so the resume that sends them again cannot double-accrue.
+            logger.warning('job_upstream_unavailable', extra={'job_id': job.id, 'released_rows': exc.rows})
+            job.status = BonusTransactionJobStatus.FAILED
             job.finished_at = dj_timezone.now()
-            job.error_log = '\n'.join(error_messages[:500])
-            job.external_api_response = {
-                'processed': len(parsed_rows),
-                'success': success_count,
-                'errors': total_errors,
-                'sample': api_outcomes[:100],
-            }
-            job.save(
-                update_fields=[
-                    'total_phones',
-                    'unique_phones',
-                    'guests_found',
-                    'cashbacks_created',
-                    'errors_count',
-                    'status',
-                    'finished_at',
-                    'error_log',
-                    'external_api_response',
-                    'updated_at',
-                ]
-            )
-            logger.info(
-                'job_finished',
-                extra={
-                    'job_id': job.id,
-                    'cashbacks_created': success_count,
-                    'errors_count': total_errors,
-                },
-            )
+            job.error_log = UPSTREAM_UNAVAILABLE_ERROR
+            job.save(update_fields=['status', 'finished_at', 'error_log', 'updated_at'])
             return job
         except Exception as exc:
             logger.exception('job_failed', extra={'job_id': job.id})
@@ -244,58 +157,264 @@ class BonusTransactionService:
             job.save(update_fields=['status', 'finished_at', 'error_log', 'errors_count', 'updated_at'])
             raise
 
-    def _collect_phone_candidates(self, job: BonusTransactionJob) -> List[str]:
-        candidates: List[str] = []
+    def can_resume(self, job: BonusTransactionJob) -> bool:
+        return BonusTransactionJob.objects.filter(self._resumable_filter(), pk=job.pk).exists()
 
-        if job.source_text:
-            candidates.extend(self._extract_phones_from_text(job.source_text))
+    def _resumable_filter(self) -> Q:
+        return resumable_job_filter(
+            failed_status=BonusTransactionJobStatus.FAILED,
+            processing_status=BonusTransactionJobStatus.PROCESSING,
+        )
 
-        if job.source_file:
-            candidates.extend(self._extract_phones_from_excel(job.source_file.read()))
+    def _checkpoint(self, job: BonusTransactionJob) -> ResultCheckpoint:
+        return ResultCheckpoint(model=BonusTransactionJobResult, job=job, batch_size=self.checkpoint_batch_size)
 
-        return [value for value in candidates if str(value).strip()]
+    def _seed_results(self, *, job: BonusTransactionJob, checkpoint: ResultCheckpoint) -> None:
+        stats = SeedStats()
+        checkpoint.seed(self._iter_seed_results(job=job, stats=stats))
+        job.total_phones = stats.total_phones
+        job.unique_phones = stats.unique_phones
+        job.errors_count = stats.rejected
+        job.save(update_fields=['total_phones', 'unique_phones', 'errors_count', 'updated_at'])
 
-    def _parse_and_dedupe(self, values: Sequence[str]) -> tuple[List[_PhoneRow], List[str]]:
-        parsed_rows: List[_PhoneRow] = []
-        errors: List[str] = []
+    def _iter_seed_results(self, *, job: BonusTransactionJob, stats: SeedStats) -> Iterator[BonusTransactionJobResult]:
         seen: set[str] = set()
+        now = dj_timezone.now()
 
-        for raw in values:
+        for raw in self._iter_phone_candidates(job):
+            stats.total_phones += 1
             normalized = self._normalize_phone(raw)
             if not normalized:
-                errors.append('invalid_phone_format')
+                stats.rejected += 1
+                yield BonusTransactionJobResult(
+                    job=job,
+                    phone_raw='',
+                    phone_normalized='',
+                    success=False,
+                    error_message='invalid_phone_format',
+                    processed=True,
+                    processed_at=now,
+                )
                 continue
             if normalized in seen:
                 continue
+
             seen.add(normalized)
-            parsed_rows.append(_PhoneRow(phone_raw=str(raw).strip(), phone_normalized=normalized))
+            stats.unique_phones += 1
+            # doc_guid is fixed before the first send so that a row is always accrued under one document id.
+            yield BonusTransactionJobResult(
+                job=job,
+                phone_raw=str(raw).strip(),
+                phone_normalized=normalized,
+                doc_guid=str(uuid.uuid4()),
+                base_id=self._build_base_id(job.base_id_prefix),
+            )
+
+    def _start_progress(self, job: BonusTransactionJob) -> JobProgress:
+        return JobProgress.from_results(
+            job=job,
+            results=BonusTransactionJobResult.objects.filter(job=job),
+            succeeded_field='cashbacks_created',
+        )
+
+    def _process_pending_rows(
+        self,
+        *,
+        job: BonusTransactionJob,
+        checkpoint: ResultCheckpoint,
+        progress: JobProgress,
+    ) -> List[Dict]:
+        api_outcomes: List[Dict] = []
+        fields = ('guest_id', 'success', 'error_message', 'cashback_payload', 'cashback_response')
+        for batch in checkpoint.pending_batches():
+            checkpoint.mark_attempted(batch)
+            outcomes = self._accrue_batch(job=job, rows=batch, progress=progress)
+            retry_rows = [row for row, outcome in zip(batch, outcomes) if outcome.get('retry')]
+            if retry_rows:
+                checkpoint.commit([row for row, outcome in zip(batch, outcomes) if not outcome.get('retry')], fields=fields)
+                checkpoint.release(retry_rows)
+                raise UpstreamUnavailable(rows=len(retry_rows))
+            api_outcomes.extend(outcomes)
+            checkpoint.commit(batch, fields=fields)
+        progress.flush()
+        return api_outcomes
+
+    def _accrue_batch(
+        self,
+        *,
+        job: BonusTransactionJob,
+        rows: List[BonusTransactionJobResult],
+        progress: JobProgress,
+    ) -> List[Dict]:
+        """Resolve guests for the batch concurrently, then create cashbacks on a separate bounded pool.
+
+        Outcomes are returned in input order. Upstream throughput is capped by the transport rate
+        limits for the guest_search and cashback_create endpoints, not by the worker counts alone.
+        Phones already in the guest phone cache skip guest_search; fresh resolutions are stored back.
+        Rows that met a transient upstream error get an outcome with ``retry`` set and no progress.
+        """
+        outcomes: List[Optional[Dict]] = [None] * len(rows)
+        cached = self.guest_cache.get_many(row.phone_normalized for row in rows)
+        lookups = run_bounded(
+            lambda row: cached.get(row.phone_normalized) or self._lookup_guest_id(row.phone_normalized),
+            rows,
+            max_workers=self.lookup_workers,
+        )
+        self.guest_cache.remember_many(
+            (
+                (lookup.item.phone_normalized, lookup.value)
+                for lookup in lookups
+                if lookup.ok and lookup.value is not None and lookup.item.phone_normalized not in cached
+            ),
+            source=GuestPhoneSource.LOOKUP,
+        )
+
+        ready: List[Tuple[int, BonusTransactionJobResult]] = []
+        for lookup in lookups:
+            row = lookup.item
+            if not lookup.ok:
+                outcomes[lookup.index] = self._fail_row(job=job, row=row, exc=lookup.error)
+                if outcomes[lookup.index].get('retry'):
+                    continue
+            elif lookup.value is None:
+                row.success = False
+                row.error_message = 'guest_not_found'
+                outcomes[lookup.index] = {'phone': row.phone_normalized, 'ok': False, 'error': 'guest_not_found'}
+            else:
+                row.guest_id = lookup.value
+                ready.append((lookup.index, row))
+                continue
+            progress.record(False)
+
+        accruals = run_bounded(
+            lambda item: self._create_cashback(job=job, row=item[1]),
+            ready,
+            max_workers=self.cashback_workers,
+            on_complete=lambda accrual: self._record_accrual_progress(progress, accrual),
+        )
+        for accrual in accruals:
+            index, row = accrual.item
+            if accrual.ok:
+                outcomes[index] = {'phone': row.phone_normalized, 'ok': True}
+            else:
+                outcomes[index] = self._fail_row(job=job, row=row, exc=accrual.error)
+
+        return outcomes  # type: ignore[return-value]
+
+    def _record_accrual_progress(self, progress: JobProgress, accrual: TaskOutcome) -> None:
+        if not accrual.ok and is_transient_error(accrual.error):
+            return
+        progress.record(accrual.ok)
+
+    def _lookup_guest_id(self, phone: str) -> Optional[int]:
+        return self._extract_guest_id(self.avatariya.find_guest_by_phone(phone))
+
+    def _create_cashback(self, *, job: BonusTransactionJob, row: BonusTransactionJobResult) -> None:
+        # The persisted doc_guid travels with every send, so the upstream sees one document per row.
+        payload = {
+            'doc_guid': row.doc_guid,
+            'guest': int(row.guest_id),
+            'park_id': None,
+            'amount': int(job.amount),
+            'transaction_date': self._utc_iso_now(),
+            'date': self._utc_iso_now(),
+            'base_id': row.base_id,
+            'type': int(job.bonus_type),
+            'registration_bonus': bool(job.registration_bonus),
+            'start_date': job.start_date.isoformat(),
+            'expiration_date': job.expiration_date.isoformat(),
+            'description': job.description,
+        }
+        row.cashback_payload = payload
+
+        api_response = self.avatariya.create_cashback(payload)
+        row.success = True
+        row.error_message = ''
+        row.cashback_response = api_response if isinstance(api_response, dict) else {'raw': api_response}
+
+    def _fail_row(self, *, job: BonusTransactionJob, row: BonusTransactionJobResult, exc: BaseException) -> Dict:
+        if is_transient_error(exc):
+            logger.warning(
+                'row_upstream_unavailable',
+                extra={'job_id': job.id, 'phone': row.phone_normalized, 'detail': str(exc)},
+            )
+            return {'phone': row.phone_normalized, 'ok': False, 'error': str(exc), 'retry': True}
+
+        logger.warning(
+            'row_processing_error',
+            extra={'job_id': job.id, 'phone': row.phone_normalized, 'detail': str(exc)},
+        )
+        row.success = False
+        row.error_message = 'processing_error'
+        return {'phone': row.phone_normalized, 'ok': False, 'error': str(exc)}
+
+    def _finalize_job(self, *, job: BonusTransactionJob, api_outcomes: List[Dict]) -> BonusTransactionJob:
+        # Counters come from the persisted rows so that resumed runs report the whole job, not the last leg.
+        results = BonusTransactionJobResult.objects.filter(job=job)
+        counters = results.aggregate(
+            guests_found=Count('id', filter=Q(guest_id__isnull=False)),
+            cashbacks_created=Count('id', filter=Q(success=True)),
+            errors_count=Count('id', filter=Q(success=False)),
+        )
+        error_messages = list(results.exclude(error_message='').values_list('error_message', flat=True)[:500])
+
+        job.guests_found = counters['guests_found']
+        job.cashbacks_created = counters['cashbacks_created']
+        job.errors_count = counters['errors_count']
+        job.status = BonusTransactionJobStatus.COMPLETED
+        job.finished_at = dj_timezone.now()
+        job.error_log = '\n'.join(error_messages)
+        job.external_api_response = {
+            'processed': job.unique_phones,
+            'success': counters['cashbacks_created'],
+            'errors': counters['errors_count'],
+            'sample': api_outcomes[:100],
+        }
+        job.save(
+            update_fields=[
+                'guests_found',
+                'cashbacks_created',
+                'errors_count',
+                'status',
+                'finished_at',
+                'error_log',
+                'external_api_response',
+                'updated_at',
+            ]
+        )
+        logger.info(
+            'job_finished',
+            extra={
+                'job_id': job.id,
+                'cashbacks_created': job.cashbacks_created,
+                'errors_count': job.errors_count,
+            },
+        )
+        return job
+
+    def _iter_phone_candidates(self, job: BonusTransactionJob) -> Iterator[str]:
+        if job.source_text:
+            yield from self._extract_phones_from_text(job.source_text)
 
-        return parsed_rows, errors
+        if job.source_file and job.source_file.size:
+            with job.source_file.open('rb') as source:
+                yield from self._iter_phones_from_excel(source)
 
     def _extract_phones_from_text(self, text: str) -> List[str]:
         separators = r'[\n,;\t\r ]+'
         parts = re.split(separators, text)
         return [part.strip() for part in parts if part and part.strip()]
 
-    def _extract_phones_from_excel(self, file_bytes: bytes) -> List[str]:
-        if not file_bytes:
-            return []
-
-        workbook = load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
-        phones: List[str] = []
-
-        for sheet in workbook.worksheets:
-            for row_idx, row in enumerate(sheet.iter_rows(values_only=True), start=1):
-                row_values = [self._cell_to_str(cell) for cell in row]
-                for value in row_values:
-                    if not value:
-                        continue
-                    if row_idx == 1 and self._is_phone_header(value):
-                        continue
-                    phones.append(value)
-                    break
-
-        return phones
+    def _iter_phones_from_excel(self, source: BinaryIO) -> Iterator[str]:
+        for row_idx, row in iter_sheet_rows(source, all_sheets=True):
+            for cell in row:
+                value = self._cell_to_str(cell)
+                if not value:
+                    continue
+                if row_idx == 1 and self._is_phone_header(value):
+                    continue
+                yield value
+                break
 
     def _normalize_phone(self, value: str) -> str:
         if value is None:
@@ -1,5 +1,6 @@
 import logging
 
+from billiard.exceptions import SoftTimeLimitExceeded
 from celery import shared_task
 
 from bonus_transactions.services.bonus_transaction_service import BonusTransactionService
@@ -7,8 +8,13 @@ from bonus_transactions.services.bonus_transaction_service import BonusTransacti
 logger = logging.getLogger(__name__)
 
 
-@shared_task(bind=True)
-def process_bonus_transaction_job(self, job_id: int):
-    logger.info('task_started', extra={'job_id': job_id})
+# The service marks the job failed on timeout; its checkpointed rows can then be resumed.
+@shared_task(bind=True, soft_time_limit=3600, time_limit=3660)
+def process_bonus_transaction_job(self, job_id: int, resume: bool = False):
+    logger.info('task_started', extra={'job_id': job_id, 'resume': resume})
     service = BonusTransactionService()
-    service.process_job(job_id)
+    try:
+        service.process_job(job_id, resume=resume)
+    except SoftTimeLimitExceeded:
+        logger.exception('task_soft_time_limit_exceeded', extra={'job_id': job_id})
+        return {'job_id': job_id, 'status': 'failed', 'reason': 'timeout'}
@@ -1,7 +1,19 @@
+import io
+import threading
+import time
+from datetime import date
+from unittest.mock import patch
+
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import SimpleTestCase
+from openpyxl import Workbook
 
+from bonus_transactions.models import BonusTransactionJob, BonusTransactionJobResult
 from bonus_transactions.serializers import BonusTransactionJobCreateSerializer
+from bonus_transactions.services.bonus_transaction_service import BonusTransactionService
+from utils.avatariya_client import AvatariyaAPIError
+from utils.job_checkpoint import UpstreamUnavailable
+from utils.job_progress import JobProgress
 
 
 class BonusTransactionJobCreateSerializerTests(SimpleTestCase):
@@ -39,3 +51,194 @@ class BonusTransactionJobCreateSerializerTests(SimpleTestCase):
             }
         )
         self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+class _FakeCashbackClient:
+    def __init__(self, missing_phones=(), failing_phones=(), errors=None):
+        self.missing_phones = set(missing_phones)
+        self.failing_phones = set(failing_phones)
+        self.errors = dict(errors or {})
+        self.cashbacks = []
+        self.lookups = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def find_guest_by_phone(self, phone):
+        with self.lock:
+            self.lookups.append(phone)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        if phone in self.missing_phones:
+            return {}
+        return {'id': int(phone[-4:])}
+
+    def create_cashback(self, payload):
+        if payload['guest'] in self.errors:
+            raise self.errors[payload['guest']]
+        if str(payload['guest']) in self.failing_phones:
+            raise ValueError('Avatariya API error: boom')
+        with self.lock:
+            self.cashbacks.append(payload)
+            return {'id': len(self.cashbacks)}
+
+
+class _FakeGuestCache:
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+        self.remembered = []
+
+    def get_many(self, phones):
+        return {phone: self.known[phone] for phone in phones if phone in self.known}
+
+    def remember_many(self, pairs, *, source):
+        pairs = list(pairs)
+        self.remembered.extend(pairs)
+        return len(pairs)
+
+
+class _FakeCheckpoint:
+    def __init__(self, rows, batch_size=2):
+        self.rows = rows
+        self.batch_size = batch_size
+        self.committed = []
+        self.released = []
+
+    def pending_batches(self):
+        pending = [row for row in self.rows if not row.processed]
+        for start in range(0, len(pending), self.batch_size):
+            yield pending[start:start + self.batch_size]
+
+    def mark_attempted(self, rows):
+        return None
+
+    def commit(self, rows, fields):
+        for row in rows:
+            row.processed = True
+        self.committed.append(len(rows))
+
+    def release(self, rows):
+        self.released.extend(row.doc_guid for row in rows)
+
+
+class BonusTransactionCheckpointTests(SimpleTestCase):
+    def _job(self):
+        return BonusTransactionJob(
+            id=1,
+            description='Компенсация',
+            amount=500,
+            start_date=date(2026, 1, 1),
+            expiration_date=date(2026, 2, 1),
+        )
+
+    def _row(self, job, phone, **kwargs):
+        return BonusTransactionJobResult(job=job, phone_normalized=phone, doc_guid=f'guid-{phone}', base_id='bonus', **kwargs)
+
+    def test_pending_rows_are_accrued_in_committed_batches(self):
+        client = _FakeCashbackClient(missing_phones={'77070000002'})
+        service = BonusTransactionService(avatariya_client=client, guest_cache=_FakeGuestCache())
+        job = self._job()
+        rows = [self._row(job, f'7707000000{index}') for index in range(1, 4)]
+        checkpoint = _FakeCheckpoint(rows)
+        progress = JobProgress(job=job, succeeded_field='cashbacks_created', every_rows=1000)
+
+        with patch.object(JobProgress, 'flush'):
+            outcomes = service._process_pending_rows(job=job, checkpoint=checkpoint, progress=progress)
+
+        self.assertEqual(checkpoint.committed, [2, 1])
+        self.assertEqual((progress.succeeded, progress.failed), (2, 1))
+        self.assertEqual([row.success for row in rows], [True, False, True])
+        self.assertEqual(rows[1].error_message, 'guest_not_found')
+        self.assertEqual(len(outcomes), 3)
+
+    def test_resume_skips_processed_rows_and_keeps_doc_guid(self):
+        client = _FakeCashbackClient()
+        service = BonusTransactionService(avatariya_client=client, guest_cache=_FakeGuestCache())
+        job = self._job()
+        rows = [
+            self._row(job, '77070000001', success=True, processed=True),
+            self._row(job, '77070000002'),
+        ]
+        progress = JobProgress(job=job, succeeded_field='cashbacks_created', every_rows=1000)
+
+        with patch.object(JobProgress, 'flush'):
+            service._process_pending_rows(job=job, checkpoint=_FakeCheckpoint(rows), progress=progress)
+
+        self.assertEqual([payload['doc_guid'] for payload in client.cashbacks], ['guid-77070000002'])
+        self.assertEqual(rows[1].cashback_payload['guest'], 2)
+
+    def test_transient_cashback_errors_release_rows_and_stop_the_job(self):
+        client = _FakeCashbackClient(
+            errors={
+                2: AvatariyaAPIError('Avatariya API request failed', 502),
+                3: AvatariyaAPIError('Avatariya API error: bad amount', 400),
+            },
+        )
+        service = BonusTransactionService(avatariya_client=client, guest_cache=_FakeGuestCache())
+        job = self._job()
+        rows = [self._row(job, f'7707000000{index}') for index in range(1, 6)]
+        checkpoint = _FakeCheckpoint(rows, batch_size=3)
+        progress = JobProgress(job=job, succeeded_field='cashbacks_created', every_rows=1000)
+
+        with patch.object(JobProgress, 'flush'), self.assertRaises(UpstreamUnavailable):
+            service._process_pending_rows(job=job, checkpoint=checkpoint, progress=progress)
+
+        self.assertEqual(checkpoint.committed, [2])
+        self.assertEqual(checkpoint.released, ['guid-77070000002'])
+        self.assertEqual([row.processed for row in rows], [True, False, True, False, False])
+        self.assertEqual(rows[2].error_message, 'processing_error')
+        self.assertEqual((progress.succeeded, progress.failed), (1, 1))
+
+    def test_excel_phones_are_read_from_every_sheet(self):
+        workbook = Workbook()
+        workbook.active.append(['phone'])
+        workbook.active.append([77070000001.0])
+        second = workbook.create_sheet('more')
+        second.append([None, '8 707 000 00 02'])
+        source = io.BytesIO()
+        workbook.save(source)
+        source.seek(0)
+
+        phones = list(BonusTransactionService(avatariya_client=object())._iter_phones_from_excel(source))
+
+        self.assertEqual(phones, ['77070000001', '8 707 000 00 02'])
+
+    def test_guest_lookups_run_concurrently_and_outcomes_keep_input_order(self):
+        client = _FakeCashbackClient(missing_phones={'77070000003'}, failing_phones={'5'})
+        service = BonusTransactionService(
+            avatariya_client=client,
+            lookup_workers=4,
+            cashback_workers=2,
+            guest_cache=_FakeGuestCache(),
+        )
+        job = self._job()
+        rows = [self._row(job, f'7707000000{index}') for index in range(1, 9)]
+        progress = JobProgress(job=job, succeeded_field='cashbacks_created', every_rows=1000)
+
+        with patch.object(JobProgress, 'flush'):
+            outcomes = service._process_pending_rows(job=job, checkpoint=_FakeCheckpoint(rows, batch_size=8), progress=progress)
+
+        self.assertEqual([outcome['phone'] for outcome in outcomes], [row.phone_normalized for row in rows])
+        self.assertEqual(rows[2].error_message, 'guest_not_found')
+        self.assertEqual(rows[4].error_message, 'processing_error')
+        self.assertEqual((progress.succeeded, progress.failed), (6, 2))
+        self.assertGreater(client.max_active, 1)
+        self.assertLessEqual(client.max_active, 4)
+
+    def test_cached_guests_skip_lookup_and_new_resolutions_are_remembered(self):
+        client = _FakeCashbackClient(missing_phones={'77070000003'})
+        guest_cache = _FakeGuestCache(known={'77070000001': 9001})
+        service = BonusTransactionService(avatariya_client=client, guest_cache=guest_cache)
+        job = self._job()
+        rows = [self._row(job, f'7707000000{index}') for index in range(1, 4)]
+        progress = JobProgress(job=job, succeeded_field='cashbacks_created', every_rows=1000)
+
+        with patch.object(JobProgress, 'flush'):
+            service._process_pending_rows(job=job, checkpoint=_FakeCheckpoint(rows, batch_size=3), progress=progress)
+
+        self.assertEqual(sorted(client.lookups), ['77070000002', '77070000003'])
+        self.assertEqual(rows[0].guest_id, 9001)
+        self.assertEqual(guest_cache.remembered, [('77070000002', 2)])
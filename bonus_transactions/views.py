@@ -5,15 +5,32 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
 
-from bonus_transactions.models import BonusTransactionJob
+from bonus_transactions.models import BonusTransactionJob, BonusTransactionJobResult
 from bonus_transactions.permissions import HasBonusTransactionsAccess
 from bonus_transactions.serializers import (
     BonusTransactionJobCreateSerializer,
     BonusTransactionJobDetailSerializer,
     BonusTransactionJobListSerializer,
+    BonusTransactionJobProgressSerializer,
+    BonusTransactionJobResultSerializer,
+    BonusTransactionJobSummarySerializer,
 )
 from bonus_transactions.services.bonus_transaction_service import BonusTransactionService
 from bonus_transactions.tasks import process_bonus_transaction_job
+from utils.job_results import JobResultCursorPagination, export_job_results, filter_job_results, parse_bool_param
+
+PROGRESS_ONLY_FIELDS = (
+    'id',
+    'status',
+    'unique_phones',
+    'processed_rows',
+    'cashbacks_created',
+    'errors_count',
+    'rows_per_second',
+    'progress_updated_at',
+    'started_at',
+    'finished_at',
+)
 
 
 class BonusTransactionJobViewSet(viewsets.ViewSet):
@@ -50,14 +67,57 @@ class BonusTransactionJobViewSet(viewsets.ViewSet):
         )
 
         process_bonus_transaction_job.delay(job.id)
-        detail = BonusTransactionJobDetailSerializer(job)
+        detail = BonusTransactionJobSummarySerializer(job)
         return Response(detail.data, status=status.HTTP_201_CREATED)
 
     def retrieve(self, request, pk=None):
+        # Large jobs should be read with include_results=false plus the paginated results endpoint.
+        if not parse_bool_param(request.query_params, 'include_results', default=True):
+            job = get_object_or_404(BonusTransactionJob.objects.select_related('initiated_by'), pk=pk)
+            return Response(BonusTransactionJobSummarySerializer(job).data)
+
         job = get_object_or_404(BonusTransactionJob.objects.prefetch_related('results').select_related('initiated_by'), pk=pk)
         serializer = BonusTransactionJobDetailSerializer(job)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def results(self, request, pk=None):
+        job = get_object_or_404(BonusTransactionJob, pk=pk)
+        queryset = filter_job_results(BonusTransactionJobResult.objects.filter(job=job), request.query_params)
+        paginator = JobResultCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = BonusTransactionJobResultSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='results/export')
+    def export_results(self, request, pk=None):
+        job = get_object_or_404(BonusTransactionJob, pk=pk)
+        queryset = filter_job_results(BonusTransactionJobResult.objects.filter(job=job), request.query_params)
+        return export_job_results(
+            queryset,
+            fields=BonusTransactionJobResultSerializer.Meta.fields,
+            filename=f'bonus_transactions_{job.id}_results',
+            file_format=request.query_params.get('file_format', 'csv'),
+        )
+
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        # Reads only the live counters so that UI polling never loads the result rows.
+        job = get_object_or_404(BonusTransactionJob.objects.only(*PROGRESS_ONLY_FIELDS), pk=pk)
+        serializer = BonusTransactionJobProgressSerializer(job)
+        return Response(serializer.data)
+
     @action(detail=True, methods=['post'])
     def retry(self, request, pk=None):
         raise ValidationError({'detail': 'Retry is disabled to prevent duplicate bonus accruals.'})
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        job = get_object_or_404(BonusTransactionJob, pk=pk)
+        service = self.service_class()
+        if not service.can_resume(job):
+            raise ValidationError({'detail': 'Only failed or stalled jobs with checkpointed results can be resumed.'})
+
+        process_bonus_transaction_job.delay(job.id, resume=True)
+        detail = BonusTransactionJobSummarySerializer(job)
+        return Response(detail.data, status=status.HTTP_202_ACCEPTED)
@@ -183,6 +183,24 @@ SECURE_HSTS_PRELOAD = os.getenv('SECURE_HSTS_PRELOAD', 'True').lower() == 'true'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '').strip()
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'amplitude_data',
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'amplitude-data-default',
+        }
+    }
+
 
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
@@ -213,18 +231,90 @@ AMPLITUDE_MOBILE_EVENT_TYPES = [
     if event_type.strip()
 ]
 
+UPSTREAM_HTTP_POOL_CONNECTIONS = int(os.getenv('UPSTREAM_HTTP_POOL_CONNECTIONS', '10'))
+UPSTREAM_HTTP_POOL_MAXSIZE = int(os.getenv('UPSTREAM_HTTP_POOL_MAXSIZE', '32'))
+UPSTREAM_HTTP_POOL_BLOCK = os.getenv('UPSTREAM_HTTP_POOL_BLOCK', 'True').lower() == 'true'
+UPSTREAM_HTTP_KEEP_ALIVE = os.getenv('UPSTREAM_HTTP_KEEP_ALIVE', 'True').lower() == 'true'
+UPSTREAM_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv('UPSTREAM_HTTP_CONNECT_TIMEOUT_SECONDS', '3.05'))
+UPSTREAM_HTTP_MAX_RETRIES = int(os.getenv('UPSTREAM_HTTP_MAX_RETRIES', '3'))
+UPSTREAM_HTTP_BACKOFF_BASE_SECONDS = float(os.getenv('UPSTREAM_HTTP_BACKOFF_BASE_SECONDS', '0.5'))
+UPSTREAM_HTTP_BACKOFF_MAX_SECONDS = float(os.getenv('UPSTREAM_HTTP_BACKOFF_MAX_SECONDS', '10'))
+UPSTREAM_HTTP_RETRY_AFTER_MAX_SECONDS = float(os.getenv('UPSTREAM_HTTP_RETRY_AFTER_MAX_SECONDS', '30'))
+UPSTREAM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('UPSTREAM_CIRCUIT_FAILURE_THRESHOLD', '5'))
+UPSTREAM_CIRCUIT_RESET_SECONDS = float(os.getenv('UPSTREAM_CIRCUIT_RESET_SECONDS', '30'))
+UPSTREAM_CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv('UPSTREAM_CIRCUIT_HALF_OPEN_MAX_CALLS', '1'))
+# Per-endpoint token buckets as `endpoint=rate[/burst]` CSV; `default` applies to unlisted endpoints.
+UPSTREAM_RATE_LIMITS = {
+    'avatariya': os.getenv('AVATARIYA_RATE_LIMITS', ''),
+    'mobile': os.getenv('MOBILE_CLIENT_RATE_LIMITS', ''),
+}
+# Per-endpoint timeouts as `endpoint=[connect:]read` CSV; unlisted endpoints use the client timeout.
+UPSTREAM_ENDPOINT_TIMEOUTS = {
+    'avatariya': os.getenv(
+        'AVATARIYA_ENDPOINT_TIMEOUTS',
+        'employee=3:5,position=3:5,guest=3:10,guest_search=3:10,cashback_summary=3:10,crystal_summary=3:10',
+    ),
+    'mobile': os.getenv('MOBILE_CLIENT_ENDPOINT_TIMEOUTS', 'users_stats=3:15'),
+}
+
 AVATARIYA_BASE_URL = os.getenv('AVATARIYA_BASE_URL', 'http://188.94.158.71/api/v1')
 AVATARIYA_BEARER_TOKEN = os.getenv('AVATARIYA_BEARER_TOKEN', '')
 AVATARIYA_TIMEOUT_SECONDS = int(os.getenv('AVATARIYA_TIMEOUT_SECONDS', '30'))
 AVATARIYA_PHONES_BATCH_SIZE = int(os.getenv('AVATARIYA_PHONES_BATCH_SIZE', '100'))
 
+# json: keep the full raw payload; zlib: typed columns + the full payload compressed; dropped: typed columns only.
+BIGDATA_VISIT_PAYLOAD_FORMAT = os.getenv('BIGDATA_VISIT_PAYLOAD_FORMAT', 'zlib').strip().lower()
+
 MOBILE_CLIENT_BASE_URL = os.getenv('MOBILE_CLIENT_BASE_URL', 'https://app.avatariya.com')
 MOBILE_CLIENT_TOKEN = os.getenv('MOBILE_CLIENT_TOKEN', '')
 MOBILE_CLIENT_TIMEOUT_SECONDS = int(os.getenv('MOBILE_CLIENT_TIMEOUT_SECONDS', '30'))
 
+GUEST_PROFILE_DEADLINE_SECONDS = float(os.getenv('GUEST_PROFILE_DEADLINE_SECONDS', '15'))
+GUEST_PROFILE_MAX_WORKERS = int(os.getenv('GUEST_PROFILE_MAX_WORKERS', '7'))
+GUEST_PROFILE_SUMMARY_CACHE_SECONDS = int(os.getenv('GUEST_PROFILE_SUMMARY_CACHE_SECONDS', '300'))
+GUEST_PROFILE_HISTORY_CACHE_SECONDS = int(os.getenv('GUEST_PROFILE_HISTORY_CACHE_SECONDS', '60'))
+GUEST_PROFILE_LOCAL_CACHE_SECONDS = int(os.getenv('GUEST_PROFILE_LOCAL_CACHE_SECONDS', '30'))
+GUEST_PROFILE_LOCAL_CACHE_SIZE = int(os.getenv('GUEST_PROFILE_LOCAL_CACHE_SIZE', '1024'))
+GUEST_PROFILE_BATCH_WORKERS = int(os.getenv('GUEST_PROFILE_BATCH_WORKERS', '8'))
+GUEST_PROFILE_BATCH_MAX_PHONES = int(os.getenv('GUEST_PROFILE_BATCH_MAX_PHONES', '5000'))
+COUPON_DISPATCH_MAX_WORKERS = int(os.getenv('COUPON_DISPATCH_MAX_WORKERS', '16'))
+COUPON_DISPATCH_BULK_CHUNK_SIZE = int(os.getenv('COUPON_DISPATCH_BULK_CHUNK_SIZE', '100'))
+COUPON_FREE_COUNT_CACHE_SECONDS = int(os.getenv('COUPON_FREE_COUNT_CACHE_SECONDS', '120'))
+COUPON_FREE_COUNT_LOCAL_CACHE_SECONDS = int(os.getenv('COUPON_FREE_COUNT_LOCAL_CACHE_SECONDS', '10'))
+BONUS_TRANSACTION_LOOKUP_WORKERS = int(os.getenv('BONUS_TRANSACTION_LOOKUP_WORKERS', '16'))
+BONUS_TRANSACTION_CASHBACK_WORKERS = int(os.getenv('BONUS_TRANSACTION_CASHBACK_WORKERS', '8'))
+BIRTHDAY_GUEST_FETCH_WORKERS = int(os.getenv('BIRTHDAY_GUEST_FETCH_WORKERS', '8'))
+BIRTHDAY_PUSH_CHUNK_SIZE = int(os.getenv('BIRTHDAY_PUSH_CHUNK_SIZE', '100'))
+BIRTHDAY_STORY_RECIPIENT_WORKERS = int(os.getenv('BIRTHDAY_STORY_RECIPIENT_WORKERS', '8'))
+STORY_CONFIG_CACHE_SECONDS = int(os.getenv('STORY_CONFIG_CACHE_SECONDS', '3600'))
+STORY_CONFIG_LOCAL_CACHE_SECONDS = int(os.getenv('STORY_CONFIG_LOCAL_CACHE_SECONDS', '60'))
+
+# Reference lists are served stale up to REFERENCE_DATA_STALE_SECONDS while a background refresh runs.
+REFERENCE_CITIES_FRESH_SECONDS = int(os.getenv('REFERENCE_CITIES_FRESH_SECONDS', '3600'))
+REFERENCE_MARKETING_SALES_FRESH_SECONDS = int(os.getenv('REFERENCE_MARKETING_SALES_FRESH_SECONDS', '60'))
+REFERENCE_DATA_STALE_SECONDS = int(os.getenv('REFERENCE_DATA_STALE_SECONDS', '86400'))
+REFERENCE_DATA_LOCAL_CACHE_SECONDS = int(os.getenv('REFERENCE_DATA_LOCAL_CACHE_SECONDS', '30'))
+
+# Coupon and bonus jobs persist row outcomes every N rows; a job idle longer than the stale window can be resumed.
+JOB_CHECKPOINT_BATCH_SIZE = int(os.getenv('JOB_CHECKPOINT_BATCH_SIZE', '100'))
+JOB_RESUME_STALE_SECONDS = int(os.getenv('JOB_RESUME_STALE_SECONDS', '900'))
+JOB_PROGRESS_EVERY_ROWS = int(os.getenv('JOB_PROGRESS_EVERY_ROWS', '25'))
+
 ALLOWED_EMPLOYEE_POSITION_PATH = os.getenv('ALLOWED_EMPLOYEE_POSITION_PATH', 'p/position/154')
 ALLOWED_EMPLOYEE_POSITION_ID = int(os.getenv('ALLOWED_EMPLOYEE_POSITION_ID', '154'))
 
+EMPLOYEE_PROFILE_CACHE_SECONDS = int(os.getenv('EMPLOYEE_PROFILE_CACHE_SECONDS', '300'))
+EMPLOYEE_PROFILE_NEGATIVE_CACHE_SECONDS = int(os.getenv('EMPLOYEE_PROFILE_NEGATIVE_CACHE_SECONDS', '60'))
+EMPLOYEE_PAGES_CACHE_SECONDS = int(os.getenv('EMPLOYEE_PAGES_CACHE_SECONDS', '600'))
+EMPLOYEE_ACCESS_LOCAL_CACHE_SECONDS = int(os.getenv('EMPLOYEE_ACCESS_LOCAL_CACHE_SECONDS', '15'))
+EMPLOYEE_ACCESS_LOCAL_CACHE_SIZE = int(os.getenv('EMPLOYEE_ACCESS_LOCAL_CACHE_SIZE', '2048'))
+
+# Phone -> guest id mappings: the table keeps them for the TTL, Redis and the in-process layer front it.
+GUEST_PHONE_CACHE_TTL_SECONDS = int(os.getenv('GUEST_PHONE_CACHE_TTL_SECONDS', '604800'))
+GUEST_PHONE_CACHE_SHARED_SECONDS = int(os.getenv('GUEST_PHONE_CACHE_SHARED_SECONDS', '86400'))
+GUEST_PHONE_LOCAL_CACHE_SECONDS = int(os.getenv('GUEST_PHONE_LOCAL_CACHE_SECONDS', '300'))
+GUEST_PHONE_LOCAL_CACHE_SIZE = int(os.getenv('GUEST_PHONE_LOCAL_CACHE_SIZE', '20000'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -0,0 +1,79 @@
+import io
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from openpyxl import Workbook, load_workbook
+
+from bonus_transactions.services.bonus_transaction_service import BonusTransactionService
+from coupon_dispatch.services.coupon_dispatch_service import CouponDispatchService
+
+
+class Command(BaseCommand):
+    help = 'Замерить время и пиковую память разбора Excel файлов рассылки купонов и начисления бонусов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Строк в тестовом файле (по умолчанию 100000)')
+        parser.add_argument(
+            '--skip-full-load',
+            action='store_true',
+            help='Не замерять чтение всего файла в память (медленно на больших файлах)',
+        )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        if rows <= 0:
+            raise CommandError('--rows должен быть > 0')
+
+        # Services are only used for their parsers, so no upstream clients are created.
+        coupon_service = CouponDispatchService(avatariya_client=object(), mobile_client=object())
+        bonus_service = BonusTransactionService(avatariya_client=object())
+
+        with tempfile.TemporaryFile() as source:
+            self._write_workbook(source, rows)
+            size_mb = source.tell() / (1024 * 1024)
+            self.stdout.write(self.style.NOTICE(f'Тестовый файл: rows={rows}, size={size_mb:.1f} MB'))
+
+            if not options['skip_full_load']:
+                self._measure('full_load (load_workbook + .read())', source, self._full_load)
+            self._measure(
+                'coupon predefined stream',
+                source,
+                lambda handle: sum(1 for _ in coupon_service._iter_excel_phone_coupon_rows(handle)),
+            )
+            self._measure(
+                'bonus stream',
+                source,
+                lambda handle: sum(1 for _ in bonus_service._iter_phones_from_excel(handle)),
+            )
+
+    def _write_workbook(self, output, rows: int) -> None:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('phones')
+        sheet.append(['Телефон', 'Код купона'])
+        for index in range(rows):
+            sheet.append([f'7707{index:07d}', f'CODE{index:07d}'])
+        workbook.save(output)
+
+    def _full_load(self, handle) -> int:
+        workbook = load_workbook(io.BytesIO(handle.read()), data_only=True)
+        return sum(1 for _ in workbook.active.iter_rows(min_col=1, max_col=2))
+
+    def _measure(self, label: str, source, parse) -> None:
+        source.seek(0)
+        # tracemalloc slows parsing down evenly, so timings are comparable between readers, not absolute.
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            parsed = parse(source)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        rate = parsed / elapsed if elapsed > 0 else 0
+        self.stdout.write(
+            f'  {label}: rows={parsed}, seconds={elapsed:.2f}, rows_per_sec={rate:.0f}, '
+            f'peak_mb={peak / (1024 * 1024):.1f}'
+        )
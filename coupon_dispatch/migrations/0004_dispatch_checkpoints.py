@@ -0,0 +1,53 @@
+# Generated by Django 4.2.28 on 2026-10-19 15:59
+
+from django.db import migrations, models
+
+
+def mark_existing_results_processed(apps, schema_editor):
+    # Rows written before checkpointing are final outcomes of finished runs.
+    CouponDispatchJobResult = apps.get_model('coupon_dispatch', 'CouponDispatchJobResult')
+    CouponDispatchJobResult.objects.update(processed=True)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupon_dispatch', '0003_coupondispatchjob_dispatch_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupondispatchjob',
+            name='results_seeded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Строки результатов созданы'),
+        ),
+        migrations.AddField(
+            model_name='coupondispatchjob',
+            name='resume_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество возобновлений'),
+        ),
+        migrations.AddField(
+            model_name='coupondispatchjobresult',
+            name='attempted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Отправлено в обработку'),
+        ),
+        migrations.AddField(
+            model_name='coupondispatchjobresult',
+            name='processed',
+            field=models.BooleanField(default=False, verbose_name='Обработано'),
+        ),
+        migrations.AddField(
+            model_name='coupondispatchjobresult',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Время обработки'),
+        ),
+        migrations.AddIndex(
+            model_name='coupondispatchjobresult',
+            index=models.Index(fields=['job', 'processed'], name='idx_coup_job_processed'),
+        ),
+        migrations.RunPython(mark_existing_results_processed, noop_reverse),
+    ]
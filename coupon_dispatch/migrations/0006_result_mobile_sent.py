@@ -0,0 +1,18 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupon_dispatch', '0005_job_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupondispatchjobresult',
+            name='mobile_sent',
+            field=models.BooleanField(default=False, verbose_name='Отправлено в приложение'),
+        ),
+    ]
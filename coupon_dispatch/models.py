@@ -59,10 +59,15 @@ class CouponDispatchJob(models.Model):
 	available_coupons = models.PositiveIntegerField(default=0, verbose_name='Доступных купонов на старте')
 	coupons_assigned = models.PositiveIntegerField(default=0, verbose_name='Назначено купонов')
 	errors_count = models.PositiveIntegerField(default=0, verbose_name='Ошибок')
+	processed_rows = models.PositiveIntegerField(default=0, verbose_name='Обработано строк')
+	rows_per_second = models.FloatField(default=0, verbose_name='Скорость, строк/сек')
+	progress_updated_at = models.DateTimeField(null=True, blank=True, verbose_name='Прогресс обновлен')
 	mobile_api_sent = models.BooleanField(default=False, verbose_name='Отправлено в mobile API')
 	mobile_api_sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Время отправки в mobile API')
 	mobile_api_response = models.JSONField(default=dict, blank=True, verbose_name='Ответ mobile API')
 	error_log = models.TextField(blank=True, verbose_name='Лог ошибок')
+	results_seeded_at = models.DateTimeField(null=True, blank=True, verbose_name='Строки результатов созданы')
+	resume_count = models.PositiveIntegerField(default=0, verbose_name='Количество возобновлений')
 	started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начало обработки')
 	finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Конец обработки')
 	created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
@@ -91,6 +96,10 @@ class CouponDispatchJobResult(models.Model):
 	coupon_code = models.CharField(max_length=128, blank=True, verbose_name='Код купона')
 	success = models.BooleanField(default=False, db_index=True, verbose_name='Успех')
 	error_message = models.TextField(blank=True, verbose_name='Текст ошибки')
+	mobile_sent = models.BooleanField(default=False, verbose_name='Отправлено в приложение')
+	processed = models.BooleanField(default=False, verbose_name='Обработано')
+	attempted_at = models.DateTimeField(null=True, blank=True, verbose_name='Отправлено в обработку')
+	processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Время обработки')
 	created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
 	updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
 
@@ -98,6 +107,7 @@ class CouponDispatchJobResult(models.Model):
 		ordering = ('id',)
 		indexes = [
 			models.Index(fields=('job', 'success'), name='idx_coup_job_success'),
+			models.Index(fields=('job', 'processed'), name='idx_coup_job_processed'),
 		]
 		verbose_name = 'Результат рассылки купона'
 		verbose_name_plural = 'Результаты рассылки купонов'
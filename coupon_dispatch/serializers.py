@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.utils import timezone
 
-from .models import CouponDispatchJob, CouponDispatchJobResult
+from utils.job_progress import estimate_eta_seconds
+
+from .models import CouponDispatchJob, CouponDispatchJobResult, CouponDispatchJobStatus
 
 
 class MarketingSaleOptionSerializer(serializers.Serializer):
@@ -60,6 +62,7 @@ class CouponDispatchJobResultSerializer(serializers.ModelSerializer):
             'coupon_code',
             'success',
             'error_message',
+            'processed',
             'created_at',
         )
 
@@ -86,6 +89,7 @@ class CouponDispatchJobListSerializer(serializers.ModelSerializer):
             'errors_count',
             'mobile_api_sent',
             'mobile_api_sent_at',
+            'resume_count',
             'started_at',
             'finished_at',
             'initiated_by_email',
@@ -100,12 +104,44 @@ class CouponDispatchJobListSerializer(serializers.ModelSerializer):
         return str(user.email or '').strip().lower()
 
 
-class CouponDispatchJobDetailSerializer(CouponDispatchJobListSerializer):
-    results = CouponDispatchJobResultSerializer(many=True, read_only=True)
-
+class CouponDispatchJobSummarySerializer(CouponDispatchJobListSerializer):
     class Meta(CouponDispatchJobListSerializer.Meta):
         fields = CouponDispatchJobListSerializer.Meta.fields + (
             'error_log',
             'mobile_api_response',
-            'results',
         )
+
+
+class CouponDispatchJobDetailSerializer(CouponDispatchJobSummarySerializer):
+    results = CouponDispatchJobResultSerializer(many=True, read_only=True)
+
+    class Meta(CouponDispatchJobSummarySerializer.Meta):
+        fields = CouponDispatchJobSummarySerializer.Meta.fields + ('results',)
+
+
+class CouponDispatchJobProgressSerializer(serializers.ModelSerializer):
+    total_rows = serializers.IntegerField(source='unique_phones')
+    succeeded = serializers.IntegerField(source='coupons_assigned')
+    failed = serializers.IntegerField(source='errors_count')
+    eta_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CouponDispatchJob
+        fields = (
+            'id',
+            'status',
+            'total_rows',
+            'processed_rows',
+            'succeeded',
+            'failed',
+            'rows_per_second',
+            'eta_seconds',
+            'progress_updated_at',
+            'started_at',
+            'finished_at',
+        )
+
+    def get_eta_seconds(self, obj):
+        if obj.status != CouponDispatchJobStatus.PROCESSING:
+            return None
+        return estimate_eta_seconds(total=obj.unique_phones, processed=obj.processed_rows, rows_per_second=obj.rows_per_second)
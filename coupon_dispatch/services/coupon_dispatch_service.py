@@ -1,11 +1,12 @@
 from __future__ import annotations
 
-import io
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import date
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from django.conf import settings
+from django.db.models import Count, F, Q
 from django.utils import timezone
 
 from coupon_dispatch.models import (
@@ -16,10 +17,30 @@ from coupon_dispatch.models import (
     CouponDispatchJobStatus,
 )
 from utils.avatariya_client import AvatariyaClient
-from utils.mobile_client import MobileClient
+from utils.cache import LayeredCache
+from utils.concurrency import TaskOutcome, run_bounded
+from utils.excel_stream import iter_sheet_rows
+from utils.job_checkpoint import (
+    UPSTREAM_UNAVAILABLE_ERROR,
+    ResultCheckpoint,
+    SeedStats,
+    UpstreamUnavailable,
+    is_transient_error,
+    resumable_job_filter,
+)
+from utils.job_progress import JobProgress
+from utils.mobile_client import MobileAPIError, MobileClient
+from utils.reference_data import ReferenceDataCache
 
 logger = logging.getLogger(__name__)
 
+marketing_sale_reference_cache = ReferenceDataCache(namespace='reference_marketing_sales')
+free_coupon_count_cache = LayeredCache(
+    namespace='free_coupon_count',
+    local_maxsize=1024,
+    local_ttl_seconds=settings.COUPON_FREE_COUNT_LOCAL_CACHE_SECONDS,
+)
+
 
 @dataclass(frozen=True)
 class MarketingSaleOption:
@@ -50,13 +71,60 @@ class CouponDispatchService:
         self,
         avatariya_client: Optional[AvatariyaClient] = None,
         mobile_client: Optional[MobileClient] = None,
+        max_workers: Optional[int] = None,
+        bulk_chunk_size: Optional[int] = None,
+        checkpoint_batch_size: Optional[int] = None,
     ) -> None:
         self.avatariya_client = avatariya_client or AvatariyaClient()
         self.mobile_client = mobile_client or MobileClient()
+        self.max_workers = max_workers or settings.COUPON_DISPATCH_MAX_WORKERS
+        self.bulk_chunk_size = bulk_chunk_size or settings.COUPON_DISPATCH_BULK_CHUNK_SIZE
+        self.checkpoint_batch_size = checkpoint_batch_size or settings.JOB_CHECKPOINT_BATCH_SIZE
 
     def list_marketing_sales_with_available_coupons(self, search: str = '') -> List[MarketingSaleOption]:
-        raw_items = self.avatariya_client.list_coupon_assign_marketing_sales()
+        # Dropdown keystrokes filter a cached list; coupon counts may lag by the freshness window.
+        options = marketing_sale_reference_cache.get(
+            'marketing_sales',
+            self._load_marketing_sale_options,
+            fresh_seconds=settings.REFERENCE_MARKETING_SALES_FRESH_SECONDS,
+        )
         normalized_search = str(search or '').strip().lower()
+        if normalized_search:
+            options = [option for option in options if normalized_search in option.name.lower()]
+
+        # Counts kept current by running jobs override the possibly older list snapshot.
+        counts = free_coupon_count_cache.get_many(str(option.id) for option in options)
+        if not counts:
+            return list(options)
+        options = [
+            replace(option, available_coupons=max(counts[str(option.id)], 0)) if str(option.id) in counts else option
+            for option in options
+        ]
+        options.sort(key=lambda value: (-value.available_coupons, value.name.lower()))
+        return options
+
+    def get_free_coupons_count(self, marketing_sale_id: int, *, refresh: bool = False) -> int:
+        """Free coupons left in a marketing sale, read with a one-row ``/coupon/`` count request."""
+        cache_key = str(marketing_sale_id)
+        if not refresh:
+            cached = free_coupon_count_cache.get(cache_key)
+            if cached is not None:
+                # Concurrent jobs decrement the shared counter without a floor.
+                return max(cached, 0)
+
+        count = max(self.avatariya_client.count_coupons(marketing_sale_id=marketing_sale_id), 0)
+        free_coupon_count_cache.set(cache_key, count, settings.COUPON_FREE_COUNT_CACHE_SECONDS)
+        return count
+
+    def _consume_free_coupons(self, marketing_sale_id: int, assigned: int) -> None:
+        # Jobs running in parallel share the counter, so it is decremented atomically in the shared cache;
+        # a missing count is left for the next real read instead of being invented.
+        if assigned <= 0:
+            return
+        free_coupon_count_cache.decr(str(marketing_sale_id), assigned)
+
+    def _load_marketing_sale_options(self) -> List[MarketingSaleOption]:
+        raw_items = self.avatariya_client.list_coupon_assign_marketing_sales()
         options: List[MarketingSaleOption] = []
 
         for item in raw_items:
@@ -69,9 +137,6 @@ class CouponDispatchService:
                 continue
 
             sale_name = str(item.get('name') or '').strip()
-            if normalized_search and normalized_search not in sale_name.lower():
-                continue
-
             free_coupons_count = self._to_int(item.get('free_coupons_count')) or 0
             options.append(
                 MarketingSaleOption(
@@ -142,22 +207,26 @@ class CouponDispatchService:
             status=CouponDispatchJobStatus.PENDING,
         )
 
-    def process_job(self, job_id: int) -> Dict[str, Any]:
+    def process_job(self, job_id: int, *, resume: bool = False) -> Dict[str, Any]:
         job = CouponDispatchJob.objects.filter(id=job_id).first()
         if not job:
             raise ValueError(f'Coupon dispatch job {job_id} does not exist')
 
         now = timezone.now()
-        claimed = CouponDispatchJob.objects.filter(
-            id=job_id,
-            status=CouponDispatchJobStatus.PENDING,
-            coupons_assigned=0,
-        ).update(
+        if resume:
+            # Resume continues checkpointed rows only, so coupons already assigned are never sent again.
+            claim_filter = self._resumable_filter()
+            claim_updates: Dict[str, Any] = {'resume_count': F('resume_count') + 1}
+        else:
+            claim_filter = Q(status=CouponDispatchJobStatus.PENDING, coupons_assigned=0)
+            claim_updates = {'started_at': now}
+
+        claimed = CouponDispatchJob.objects.filter(claim_filter, id=job_id).update(
             status=CouponDispatchJobStatus.PROCESSING,
-            started_at=now,
             finished_at=None,
             error_log='',
             updated_at=now,
+            **claim_updates,
         )
 
         if claimed == 0:
@@ -166,18 +235,22 @@ class CouponDispatchService:
                 'job_skipped',
                 extra={
                     'job_id': job_id,
+                    'resume': resume,
                     'status': job.status if job else 'missing',
                     'coupons_assigned': job.coupons_assigned if job else 'n/a',
                 },
             )
             return {
                 'status': 'skipped',
-                'reason': 'non_pending_or_already_assigned',
+                'reason': 'not_resumable' if resume else 'non_pending_or_already_assigned',
                 'job_status': job.status if job else 'missing',
             }
 
         job = CouponDispatchJob.objects.filter(id=job_id).first()
-        logger.info('job_started', extra={'job_id': job_id, 'mode': job.dispatch_mode if job else 'unknown'})
+        logger.info(
+            'job_resumed' if resume else 'job_started',
+            extra={'job_id': job_id, 'mode': job.dispatch_mode if job else 'unknown'},
+        )
 
         try:
             mode = str(job.dispatch_mode or '').strip()
@@ -205,6 +278,18 @@ class CouponDispatchService:
                 },
             )
             return result
+        except UpstreamUnavailable as exc:
+            logger.warning('job_upstream_unavailable', extra={'job_id': job.id, 'released_rows': exc.rows})
+            job.status = CouponDispatchJobStatus.FAILED
+            job.finished_at = timezone.now()
+            job.error_log = UPSTREAM_UNAVAILABLE_ERROR
+            job.save(update_fields=['status', 'finished_at', 'error_log', 'updated_at'])
+            return {
+                'job_id': job.id,
+                'status': job.status,
+                'reason': UPSTREAM_UNAVAILABLE_ERROR,
+                'released_rows': exc.rows,
+            }
         except Exception as exc:
             logger.exception('job_failed', extra={'job_id': job.id})
             job.status = CouponDispatchJobStatus.FAILED
@@ -213,288 +298,389 @@ class CouponDispatchService:
             job.save(update_fields=['status', 'finished_at', 'error_log', 'updated_at'])
             raise
 
-    def _process_marketing_sale_job(self, job: CouponDispatchJob) -> Dict[str, Any]:
-        raw_phones = self._collect_raw_phones(job)
-        parsed_rows = [self._parse_phone(phone) for phone in raw_phones]
-
-        valid_rows: List[ParsedPhoneRow] = []
-        seen_phones = set()
-        result_rows: List[CouponDispatchJobResult] = []
+    def can_resume(self, job: CouponDispatchJob) -> bool:
+        return CouponDispatchJob.objects.filter(self._resumable_filter(), id=job.id).exists()
 
-        for parsed in parsed_rows:
-            if not parsed.valid:
-                result_rows.append(
-                    CouponDispatchJobResult(
-                        job=job,
-                        phone_raw=parsed.phone_raw,
-                        phone_normalized='',
-                        success=False,
-                        error_message=parsed.error_message,
-                    )
-                )
-                continue
+    def _resumable_filter(self) -> Q:
+        return resumable_job_filter(
+            failed_status=CouponDispatchJobStatus.FAILED,
+            processing_status=CouponDispatchJobStatus.PROCESSING,
+        )
 
-            if parsed.phone_normalized in seen_phones:
-                result_rows.append(
-                    CouponDispatchJobResult(
-                        job=job,
-                        phone_raw=parsed.phone_raw,
-                        phone_normalized=parsed.phone_normalized,
-                        success=False,
-                        error_message='duplicate_phone',
-                    )
-                )
-                continue
+    def _checkpoint(self, job: CouponDispatchJob, *, batch_size: Optional[int] = None) -> ResultCheckpoint:
+        return ResultCheckpoint(
+            model=CouponDispatchJobResult,
+            job=job,
+            batch_size=batch_size or self.checkpoint_batch_size,
+        )
 
-            seen_phones.add(parsed.phone_normalized)
-            valid_rows.append(parsed)
+    def _start_progress(self, job: CouponDispatchJob) -> JobProgress:
+        return JobProgress.from_results(
+            job=job,
+            results=CouponDispatchJobResult.objects.filter(job=job),
+            succeeded_field='coupons_assigned',
+        )
 
-        pre_validation_errors = sum(1 for row in result_rows if not row.success)
-        job.total_phones = len(raw_phones)
-        job.unique_phones = len(valid_rows)
-        job.errors_count = pre_validation_errors
-        job.save(update_fields=['total_phones', 'unique_phones', 'errors_count', 'updated_at'])
+    def _process_marketing_sale_job(self, job: CouponDispatchJob) -> Dict[str, Any]:
+        checkpoint = self._checkpoint(job)
+        if not checkpoint.is_seeded:
+            self._seed_marketing_sale_results(job=job, checkpoint=checkpoint)
+        checkpoint.close_interrupted()
+        progress = self._start_progress(job)
 
-        guests_found = 0
-        coupons_assigned = 0
-        mobile_sent_count = 0
         assign_responses: List[Dict[str, Any]] = []
+        valid_until = job.valid_until.isoformat() if job.valid_until else ''
 
-        for row in valid_rows:
-            try:
-                assign_result = self.avatariya_client.assign_coupon_via_admin(
+        for batch in checkpoint.pending_batches():
+            checkpoint.mark_attempted(batch)
+            # Upstream calls run concurrently; outcomes are consumed in input order to keep results deterministic.
+            outcomes = run_bounded(
+                lambda row: self.avatariya_client.assign_coupon_via_admin(
                     marketing_sale_id=job.marketing_sale_id,
                     phone_number=row.phone_normalized,
                     amount=job.title,
-                    valid_until=job.valid_until.isoformat() if job.valid_until else '',
-                )
-            except Exception as exc:
-                logger.warning(
-                    'assign_api_error',
-                    extra={'job_id': job.id, 'phone': row.phone_normalized, 'detail': str(exc)},
-                )
-                result_rows.append(
-                    CouponDispatchJobResult(
-                        job=job,
-                        phone_raw=row.phone_raw,
-                        phone_normalized=row.phone_normalized,
-                        success=False,
-                        error_message='assign_api_error',
-                    )
-                )
-                continue
+                    valid_until=valid_until,
+                ),
+                batch,
+                max_workers=self.max_workers,
+                on_complete=lambda outcome: self._record_assign_progress(progress, outcome),
+            )
 
-            assigned = bool(assign_result.get('assigned'))
-            guest_id = self._to_int(assign_result.get('guest_id'))
-            coupon_id = self._to_int(assign_result.get('coupon_id'))
-            coupon_code = str(assign_result.get('coupon_code') or '').strip()
-            mobile_sent = bool(assign_result.get('mobile_sent'))
-
-            if guest_id is not None:
-                guests_found += 1
-            if mobile_sent:
-                mobile_sent_count += 1
-
-            if assigned:
-                coupons_assigned += 1
-                result_rows.append(
-                    CouponDispatchJobResult(
-                        job=job,
-                        phone_raw=row.phone_raw,
-                        phone_normalized=row.phone_normalized,
-                        guest_id=guest_id,
-                        coupon_id=coupon_id,
-                        coupon_code=coupon_code,
-                        success=True,
-                        error_message='',
+            retry_rows: List[CouponDispatchJobResult] = []
+            for outcome in outcomes:
+                row = outcome.item
+                assign_result = outcome.value
+                if not outcome.ok and is_transient_error(outcome.error):
+                    logger.warning(
+                        'assign_api_unavailable',
+                        extra={'job_id': job.id, 'phone': row.phone_normalized, 'detail': str(outcome.error)},
                     )
-                )
-            else:
-                result_rows.append(
-                    CouponDispatchJobResult(
-                        job=job,
-                        phone_raw=row.phone_raw,
-                        phone_normalized=row.phone_normalized,
-                        guest_id=guest_id,
-                        coupon_id=coupon_id,
-                        coupon_code=coupon_code,
-                        success=False,
-                        error_message='coupon_not_assigned',
+                    retry_rows.append(row)
+                    continue
+                if not outcome.ok:
+                    logger.warning(
+                        'assign_api_error',
+                        extra={'job_id': job.id, 'phone': row.phone_normalized, 'detail': str(outcome.error)},
                     )
+                    row.success = False
+                    row.error_message = 'assign_api_error'
+                    continue
+
+                assigned = bool(assign_result.get('assigned'))
+                mobile_sent = bool(assign_result.get('mobile_sent'))
+                row.guest_id = self._to_int(assign_result.get('guest_id'))
+                row.coupon_id = self._to_int(assign_result.get('coupon_id'))
+                row.coupon_code = str(assign_result.get('coupon_code') or '').strip()
+                row.success = assigned
+                row.error_message = '' if assigned else 'coupon_not_assigned'
+                row.mobile_sent = mobile_sent
+
+                assign_responses.append(
+                    {
+                        'phone': row.phone_normalized,
+                        'assigned': assigned,
+                        'message': str(assign_result.get('message') or ''),
+                        'mobile_message': str(assign_result.get('mobile_message') or ''),
+                        'mobile_sent': mobile_sent,
+                        'coupon_id': row.coupon_id,
+                        'coupon_code': row.coupon_code,
+                    }
                 )
 
-            assign_responses.append(
-                {
-                    'phone': row.phone_normalized,
-                    'assigned': assigned,
-                    'message': str(assign_result.get('message') or ''),
-                    'mobile_message': str(assign_result.get('mobile_message') or ''),
-                    'mobile_sent': mobile_sent,
-                    'coupon_id': coupon_id,
-                    'coupon_code': coupon_code,
-                }
+            self._consume_free_coupons(job.marketing_sale_id, sum(1 for row in batch if row.success))
+            self._commit_or_release(
+                checkpoint,
+                batch,
+                retry_rows,
+                fields=('guest_id', 'coupon_id', 'coupon_code', 'success', 'error_message', 'mobile_sent'),
             )
+        progress.flush()
 
         free_count_after = self._get_free_coupons_count_for_sale(job.marketing_sale_id)
         return self._finalize_job(
             job=job,
-            result_rows=result_rows,
-            total_phones=len(raw_phones),
-            unique_phones=len(valid_rows),
-            guests_found=guests_found,
             available_coupons=free_count_after,
-            coupons_assigned=coupons_assigned,
-            mobile_sent_count=mobile_sent_count,
             api_path='/api/v1/admin/coupon-assign/assign/',
             responses=assign_responses,
         )
 
+    def _seed_marketing_sale_results(self, *, job: CouponDispatchJob, checkpoint: ResultCheckpoint) -> None:
+        parsed_rows = (self._parse_phone(phone) for phone in self._iter_raw_phones(job))
+        self._seed_results(job=job, checkpoint=checkpoint, parsed_rows=parsed_rows)
+
     def _process_predefined_coupon_job(self, job: CouponDispatchJob) -> Dict[str, Any]:
-        if not job.source_file:
+        if not job.source_file and not job.results_seeded_at:
             raise ValueError('Excel file is required for predefined_coupon mode')
 
-        raw_rows = self._read_excel_phone_coupon_rows(job.source_file.read())
-        parsed_rows = [self._parse_phone_coupon_row(phone_raw, coupon_raw) for phone_raw, coupon_raw in raw_rows]
+        chunk_size = max(1, self.bulk_chunk_size)
+        # Every row of a checkpoint batch is in flight at once, so the batch spans one chunk per worker.
+        checkpoint = self._checkpoint(job, batch_size=max(self.checkpoint_batch_size, chunk_size * self.max_workers))
+        if not checkpoint.is_seeded:
+            self._seed_predefined_coupon_results(job=job, checkpoint=checkpoint)
+        checkpoint.close_interrupted()
+        progress = self._start_progress(job)
 
-        valid_rows: List[ParsedPhoneCouponRow] = []
-        seen_phones = set()
-        result_rows: List[CouponDispatchJobResult] = []
+        api_responses: List[Dict[str, Any]] = []
+        valid_until = job.valid_until.isoformat() if job.valid_until else ''
+
+        for batch in checkpoint.pending_batches():
+            checkpoint.mark_attempted(batch)
+            chunks = [batch[index:index + chunk_size] for index in range(0, len(batch), chunk_size)]
+            chunk_outcomes = run_bounded(
+                lambda chunk: self._send_order_coupon_chunk(job=job, rows=chunk, valid_until=valid_until),
+                chunks,
+                max_workers=self.max_workers,
+                on_complete=lambda chunk_outcome: self._record_chunk_progress(progress, chunk_outcome),
+            )
 
-        for parsed in parsed_rows:
-            if not parsed.valid:
-                result_rows.append(
-                    CouponDispatchJobResult(
-                        job=job,
-                        phone_raw=parsed.phone_raw,
-                        phone_normalized=parsed.phone_normalized,
-                        coupon_code=parsed.coupon_code,
-                        success=False,
-                        error_message=parsed.error_message,
+            retry_rows: List[CouponDispatchJobResult] = []
+            for chunk_outcome in chunk_outcomes:
+                if chunk_outcome.ok:
+                    item_results = chunk_outcome.value
+                else:
+                    logger.warning('mobile_api_error', extra={'job_id': job.id, 'detail': str(chunk_outcome.error)})
+                    item_results = [(None, 'mobile_api_error')] * len(chunk_outcome.item)
+
+                for row, (api_result, error_code) in zip(chunk_outcome.item, item_results):
+                    if error_code == UPSTREAM_UNAVAILABLE_ERROR:
+                        retry_rows.append(row)
+                        continue
+                    row.success = not error_code
+                    row.error_message = error_code
+                    # Every coupon accepted by the bulk endpoint is delivered to the app.
+                    row.mobile_sent = not error_code
+                    if error_code:
+                        continue
+
+                    api_responses.append(
+                        {
+                            'phone': row.phone_normalized,
+                            'coupon_code': row.coupon_code,
+                            'response': api_result,
+                        }
                     )
-                )
-                continue
 
-            if parsed.phone_normalized in seen_phones:
-                result_rows.append(
-                    CouponDispatchJobResult(
-                        job=job,
-                        phone_raw=parsed.phone_raw,
-                        phone_normalized=parsed.phone_normalized,
-                        coupon_code=parsed.coupon_code,
-                        success=False,
-                        error_message='duplicate_phone',
-                    )
-                )
-                continue
+            self._commit_or_release(checkpoint, batch, retry_rows, fields=('success', 'error_message', 'mobile_sent'))
+        progress.flush()
 
-            seen_phones.add(parsed.phone_normalized)
-            valid_rows.append(parsed)
+        return self._finalize_job(
+            job=job,
+            available_coupons=0,
+            api_path='/api/prizes/order-coupon-info/bulk-create/',
+            responses=api_responses,
+        )
+
+    def _seed_predefined_coupon_results(self, *, job: CouponDispatchJob, checkpoint: ResultCheckpoint) -> None:
+        with job.source_file.open('rb') as source:
+            parsed_rows = (
+                self._parse_phone_coupon_row(phone_raw, coupon_raw)
+                for phone_raw, coupon_raw in self._iter_excel_phone_coupon_rows(source)
+            )
+            self._seed_results(job=job, checkpoint=checkpoint, parsed_rows=parsed_rows)
 
-        pre_validation_errors = sum(1 for row in result_rows if not row.success)
-        job.total_phones = len(raw_rows)
-        job.unique_phones = len(valid_rows)
-        job.errors_count = pre_validation_errors
+    def _seed_results(
+        self,
+        *,
+        job: CouponDispatchJob,
+        checkpoint: ResultCheckpoint,
+        parsed_rows: Iterable[Union[ParsedPhoneRow, ParsedPhoneCouponRow]],
+    ) -> None:
+        stats = SeedStats()
+        checkpoint.seed(self._iter_seed_results(job=job, parsed_rows=parsed_rows, stats=stats))
+        job.total_phones = stats.total_phones
+        job.unique_phones = stats.unique_phones
+        job.errors_count = stats.rejected
         job.save(update_fields=['total_phones', 'unique_phones', 'errors_count', 'updated_at'])
 
-        coupons_assigned = 0
-        mobile_sent_count = 0
-        api_responses: List[Dict[str, Any]] = []
+    def _iter_seed_results(
+        self,
+        *,
+        job: CouponDispatchJob,
+        parsed_rows: Iterable[Union[ParsedPhoneRow, ParsedPhoneCouponRow]],
+        stats: SeedStats,
+    ) -> Iterator[CouponDispatchJobResult]:
+        """Turn parsed input into result rows lazily: pending for unique valid phones, final errors otherwise."""
+        seen_phones = set()
+        now = timezone.now()
 
-        for row in valid_rows:
-            try:
-                api_result = self.mobile_client.create_order_coupon_info_bulk_item(
-                    coupon=row.coupon_code,
-                    phone_number=row.phone_normalized,
-                    amount=job.title,
-                    valid_until=job.valid_until.isoformat() if job.valid_until else '',
-                    is_mobile=False,
-                )
-            except Exception as exc:
-                logger.warning(
-                    'mobile_api_error',
-                    extra={'job_id': job.id, 'phone': row.phone_normalized, 'coupon': row.coupon_code, 'detail': str(exc)},
-                )
-                result_rows.append(
-                    CouponDispatchJobResult(
-                        job=job,
-                        phone_raw=row.phone_raw,
-                        phone_normalized=row.phone_normalized,
-                        coupon_code=row.coupon_code,
-                        success=False,
-                        error_message='mobile_api_error',
-                    )
+        for parsed in parsed_rows:
+            stats.total_phones += 1
+            coupon_code = getattr(parsed, 'coupon_code', '')
+            if not parsed.valid:
+                error_message = parsed.error_message
+            elif parsed.phone_normalized in seen_phones:
+                error_message = 'duplicate_phone'
+            else:
+                seen_phones.add(parsed.phone_normalized)
+                stats.unique_phones += 1
+                yield CouponDispatchJobResult(
+                    job=job,
+                    phone_raw=parsed.phone_raw,
+                    phone_normalized=parsed.phone_normalized,
+                    coupon_code=coupon_code,
                 )
                 continue
 
-            coupons_assigned += 1
-            mobile_sent_count += 1
-            result_rows.append(
-                CouponDispatchJobResult(
-                    job=job,
-                    phone_raw=row.phone_raw,
-                    phone_normalized=row.phone_normalized,
-                    coupon_code=row.coupon_code,
-                    success=True,
-                    error_message='',
-                )
+            stats.rejected += 1
+            yield CouponDispatchJobResult(
+                job=job,
+                phone_raw=parsed.phone_raw,
+                phone_normalized=parsed.phone_normalized,
+                coupon_code=coupon_code,
+                success=False,
+                error_message=error_message,
+                processed=True,
+                processed_at=now,
             )
-            api_responses.append(
-                {
-                    'phone': row.phone_normalized,
-                    'coupon_code': row.coupon_code,
-                    'response': api_result,
-                }
+
+    def _commit_or_release(
+        self,
+        checkpoint: ResultCheckpoint,
+        batch: List[CouponDispatchJobResult],
+        retry_rows: List[CouponDispatchJobResult],
+        *,
+        fields: Tuple[str, ...],
+    ) -> None:
+        """Commit the rows with a final outcome; rows that met an upstream outage stop the job for resume."""
+        if not retry_rows:
+            checkpoint.commit(batch, fields=fields)
+            return
+
+        retry_ids = {id(row) for row in retry_rows}
+        checkpoint.commit([row for row in batch if id(row) not in retry_ids], fields=fields)
+        checkpoint.release(retry_rows)
+        raise UpstreamUnavailable(rows=len(retry_rows))
+
+    def _record_assign_progress(self, progress: JobProgress, outcome: TaskOutcome) -> None:
+        if not outcome.ok and is_transient_error(outcome.error):
+            return
+        progress.record(outcome.ok and bool(outcome.value.get('assigned')))
+
+    def _record_chunk_progress(self, progress: JobProgress, chunk_outcome: TaskOutcome) -> None:
+        if not chunk_outcome.ok:
+            progress.advance(failed=len(chunk_outcome.item))
+            return
+        codes = [error_code for _, error_code in chunk_outcome.value if error_code != UPSTREAM_UNAVAILABLE_ERROR]
+        failed = sum(1 for error_code in codes if error_code)
+        progress.advance(succeeded=len(codes) - failed, failed=failed)
+
+    def _send_order_coupon_chunk(
+        self,
+        *,
+        job: CouponDispatchJob,
+        rows: List[CouponDispatchJobResult],
+        valid_until: str,
+    ) -> List[Tuple[Any, str]]:
+        """Send one bulk-create request and return ``(item_response, error_code)`` per row.
+
+        A chunk the upstream rejects as a whole (4xx validation error) is split in halves until the
+        offending rows are isolated. Rows of a chunk lost to a transport or server error are marked
+        ``upstream_unavailable`` and left for resume.
+        """
+        items = [
+            {
+                'coupon': row.coupon_code,
+                'phone_number': row.phone_normalized,
+                'amount': job.title,
+                'valid_until': valid_until,
+                'is_mobile': False,
+            }
+            for row in rows
+        ]
+        try:
+            response = self.mobile_client.create_order_coupon_info_bulk(items)
+        except MobileAPIError as exc:
+            if len(rows) > 1 and self._is_rejected_chunk(exc):
+                logger.info('bulk_chunk_split', extra={'job_id': job.id, 'chunk_size': len(rows)})
+                middle = len(rows) // 2
+                head = self._send_order_coupon_chunk(job=job, rows=rows[:middle], valid_until=valid_until)
+                tail = self._send_order_coupon_chunk(job=job, rows=rows[middle:], valid_until=valid_until)
+                return head + tail
+
+            logger.warning(
+                'mobile_api_error',
+                extra={'job_id': job.id, 'chunk_size': len(rows), 'status_code': exc.status_code, 'detail': str(exc)},
             )
+            return [(None, 'mobile_api_error' if self._is_rejected_chunk(exc) else UPSTREAM_UNAVAILABLE_ERROR)] * len(rows)
+        except Exception as exc:
+            logger.warning('mobile_api_error', extra={'job_id': job.id, 'chunk_size': len(rows), 'detail': str(exc)})
+            return [(None, UPSTREAM_UNAVAILABLE_ERROR if is_transient_error(exc) else 'mobile_api_error')] * len(rows)
 
-        return self._finalize_job(
-            job=job,
-            result_rows=result_rows,
-            total_phones=len(raw_rows),
-            unique_phones=len(valid_rows),
-            guests_found=0,
-            available_coupons=0,
-            coupons_assigned=coupons_assigned,
-            mobile_sent_count=mobile_sent_count,
-            api_path='/api/prizes/order-coupon-info/bulk-create/',
-            responses=api_responses,
-        )
+        return self._map_bulk_item_results(job=job, response=response, rows_count=len(rows))
+
+    def _map_bulk_item_results(self, *, job: CouponDispatchJob, response: Any, rows_count: int) -> List[Tuple[Any, str]]:
+        items = response
+        if isinstance(response, dict):
+            items = next(
+                (response[key] for key in ('results', 'coupons', 'created') if isinstance(response.get(key), list)),
+                None,
+            )
+
+        if isinstance(items, list) and len(items) == rows_count:
+            return [(item, 'mobile_api_item_error' if self._is_bulk_item_failed(item) else '') for item in items]
+
+        errors = response.get('errors') if isinstance(response, dict) else None
+        if isinstance(errors, list) and len(errors) == rows_count:
+            return [(response, 'mobile_api_item_error' if error else '') for error in errors]
+
+        if errors:
+            failed_indexes = {
+                self._to_int(error.get('index'))
+                for error in errors
+                if isinstance(error, dict) and self._to_int(error.get('index')) is not None
+            }
+            if failed_indexes:
+                return [
+                    (response, 'mobile_api_item_error' if index in failed_indexes else '')
+                    for index in range(rows_count)
+                ]
+
+        if items is not None or errors:
+            logger.warning('bulk_response_unmapped', extra={'job_id': job.id, 'chunk_size': rows_count})
+        # The upstream accepted the whole request and reported nothing per item.
+        return [(response, '')] * rows_count
+
+    def _is_bulk_item_failed(self, item: Any) -> bool:
+        if not isinstance(item, dict):
+            return False
+        return item.get('success') is False or bool(item.get('error')) or bool(item.get('errors'))
+
+    def _is_rejected_chunk(self, exc: MobileAPIError) -> bool:
+        return exc.is_rejection
 
     def _finalize_job(
         self,
         *,
         job: CouponDispatchJob,
-        result_rows: List[CouponDispatchJobResult],
-        total_phones: int,
-        unique_phones: int,
-        guests_found: int,
         available_coupons: int,
-        coupons_assigned: int,
-        mobile_sent_count: int,
         api_path: str,
         responses: List[Dict[str, Any]],
     ) -> Dict[str, Any]:
-        CouponDispatchJobResult.objects.filter(job=job).delete()
-        if result_rows:
-            CouponDispatchJobResult.objects.bulk_create(result_rows, batch_size=500)
+        # Counters come from the persisted rows so that resumed runs report the whole job, not the last leg.
+        results = CouponDispatchJobResult.objects.filter(job=job)
+        counters = results.aggregate(
+            guests_found=Count('id', filter=Q(guest_id__isnull=False)),
+            coupons_assigned=Count('id', filter=Q(success=True)),
+            errors_count=Count('id', filter=Q(success=False)),
+            mobile_sent=Count('id', filter=Q(mobile_sent=True)),
+        )
+        error_log_items = list(results.exclude(error_message='').values_list('error_message', flat=True)[:2000])
+        mobile_sent_count = counters['mobile_sent']
 
-        errors_count = sum(1 for row in result_rows if not row.success)
-        error_log_items = [row.error_message for row in result_rows if row.error_message]
         mobile_api_sent = mobile_sent_count > 0
         mobile_api_response: Dict[str, Any] = {
             'assign_api_path': api_path,
-            'attempted': unique_phones,
+            'attempted': job.unique_phones,
             'mobile_sent_count': mobile_sent_count,
             'valid_until': job.valid_until.isoformat() if job.valid_until else None,
             'responses_sample': responses[:100],
         }
 
         job.status = CouponDispatchJobStatus.COMPLETED
-        job.total_phones = total_phones
-        job.unique_phones = unique_phones
-        job.guests_found = guests_found
+        job.guests_found = counters['guests_found']
         job.available_coupons = available_coupons
-        job.coupons_assigned = coupons_assigned
-        job.errors_count = errors_count
+        job.coupons_assigned = counters['coupons_assigned']
+        job.errors_count = counters['errors_count']
         job.mobile_api_sent = mobile_api_sent
         job.mobile_api_response = mobile_api_response
         job.mobile_api_sent_at = timezone.now() if mobile_api_sent else None
@@ -503,8 +689,6 @@ class CouponDispatchService:
         job.save(
             update_fields=[
                 'status',
-                'total_phones',
-                'unique_phones',
                 'guests_found',
                 'available_coupons',
                 'coupons_assigned',
@@ -529,28 +713,20 @@ class CouponDispatchService:
         if not marketing_sale_id or marketing_sale_id <= 0:
             return 0
 
+        # The job has just changed the count, so the final figure is read fresh and stored for the dropdown.
         try:
-            sales = self.avatariya_client.list_coupon_assign_marketing_sales()
+            return self.get_free_coupons_count(marketing_sale_id, refresh=True)
         except Exception:
-            logger.exception('Failed to fetch marketing sales for free_coupons_count')
-            return 0
-
-        for item in sales:
-            sale_id = self._to_int(item.get('id'))
-            if sale_id == marketing_sale_id:
-                return self._to_int(item.get('free_coupons_count')) or 0
-        return 0
-
-    def _collect_raw_phones(self, job: CouponDispatchJob) -> List[str]:
-        values: List[str] = []
+            logger.exception('Failed to count free coupons for marketing sale')
+            return max(free_coupon_count_cache.get(str(marketing_sale_id)) or 0, 0)
 
+    def _iter_raw_phones(self, job: CouponDispatchJob) -> Iterator[str]:
         if job.source_text.strip():
-            values.extend(self._split_text_phones(job.source_text))
+            yield from self._split_text_phones(job.source_text)
 
         if job.source_file:
-            values.extend(self._read_excel_phones(job.source_file.read()))
-
-        return [value for value in values if value]
+            with job.source_file.open('rb') as source:
+                yield from self._iter_excel_phones(source)
 
     def _split_text_phones(self, source_text: str) -> List[str]:
         text = source_text.replace('\r', '\n').replace(';', '\n').replace(',', '\n')
@@ -564,33 +740,21 @@ class CouponDispatchService:
             values.append(line)
         return values
 
-    def _read_excel_phones(self, binary: bytes) -> List[str]:
-        from openpyxl import load_workbook
-
-        workbook = load_workbook(filename=io.BytesIO(binary), data_only=True)
-        sheet = workbook.active
-        phones: List[str] = []
-        for row in sheet.iter_rows(min_row=1, min_col=1, max_col=1):
-            value = row[0].value
+    def _iter_excel_phones(self, source: BinaryIO) -> Iterator[str]:
+        for _, values in iter_sheet_rows(source, max_col=1):
+            value = values[0] if values else None
             if value is None:
                 continue
             normalized = str(value).strip()
             if normalized:
                 if self._is_phone_header_label(normalized):
                     continue
-                phones.append(normalized)
-        return phones
+                yield normalized
 
-    def _read_excel_phone_coupon_rows(self, binary: bytes) -> List[Tuple[str, str]]:
-        from openpyxl import load_workbook
-
-        workbook = load_workbook(filename=io.BytesIO(binary), data_only=True)
-        sheet = workbook.active
-        rows: List[Tuple[str, str]] = []
-
-        for row in sheet.iter_rows(min_row=1, min_col=1, max_col=2):
-            raw_phone = str(row[0].value or '').strip()
-            raw_coupon = str(row[1].value or '').strip() if len(row) > 1 else ''
+    def _iter_excel_phone_coupon_rows(self, source: BinaryIO) -> Iterator[Tuple[str, str]]:
+        for _, values in iter_sheet_rows(source, max_col=2):
+            raw_phone = str((values[0] if values else None) or '').strip()
+            raw_coupon = str((values[1] if len(values) > 1 else None) or '').strip()
 
             if not raw_phone and not raw_coupon:
                 continue
@@ -598,9 +762,7 @@ class CouponDispatchService:
             if self._is_phone_header_label(raw_phone) and self._is_coupon_header_label(raw_coupon):
                 continue
 
-            rows.append((raw_phone, raw_coupon))
-
-        return rows
+            yield raw_phone, raw_coupon
 
     def _is_phone_header_label(self, value: str) -> bool:
         cleaned = ''.join(ch.lower() for ch in str(value) if ch.isalnum() or ch in {' ', '_', '-'})
@@ -11,10 +11,10 @@ logger = logging.getLogger(__name__)
 
 
 @shared_task(bind=True, soft_time_limit=600, time_limit=660)
-def process_coupon_dispatch_job_task(self, job_id: int):
-    logger.info('task_started', extra={'job_id': job_id})
+def process_coupon_dispatch_job_task(self, job_id: int, resume: bool = False):
+    logger.info('task_started', extra={'job_id': job_id, 'resume': resume})
     try:
-        return CouponDispatchService().process_job(job_id)
+        return CouponDispatchService().process_job(job_id, resume=resume)
     except SoftTimeLimitExceeded:
         logger.exception('task_soft_time_limit_exceeded', extra={'job_id': job_id})
         _mark_job_failed(
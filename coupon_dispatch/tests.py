@@ -1,10 +1,33 @@
+import io
+import threading
+import types
+import time
 from datetime import timedelta
+from unittest.mock import MagicMock, patch
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import SimpleTestCase
+from django.urls import reverse
 from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from rest_framework.exceptions import ValidationError
 
-from coupon_dispatch.serializers import CouponDispatchJobCreateSerializer
+from coupon_dispatch.models import CouponDispatchJob, CouponDispatchJobResult, CouponDispatchJobStatus, CouponDispatchMode
+from coupon_dispatch.serializers import CouponDispatchJobCreateSerializer, CouponDispatchJobProgressSerializer
+from coupon_dispatch.services.coupon_dispatch_service import (
+	CouponDispatchService,
+	free_coupon_count_cache,
+	marketing_sale_reference_cache,
+)
+from utils.avatariya_client import AvatariyaAPIError
+from utils.circuit_breaker import UpstreamCircuitOpenError
+from utils.concurrency import run_bounded
+from utils.job_checkpoint import SeedStats, UpstreamUnavailable
+from utils.job_progress import JobProgress
+from utils.job_results import filter_job_results, iter_csv_lines, write_xlsx
+from utils.mobile_client import MobileAPIError
+from utils.reference_data import ReferenceDataCache
 
 
 class CouponDispatchJobCreateSerializerTests(SimpleTestCase):
@@ -95,3 +118,471 @@ class CouponDispatchJobCreateSerializerTests(SimpleTestCase):
 			}
 		)
 		self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+class _FakeAssignClient:
+	def __init__(self, failing_phones=(), errors=None):
+		self.failing_phones = set(failing_phones)
+		self.errors = dict(errors or {})
+		self.active = 0
+		self.max_active = 0
+		self.lock = threading.Lock()
+
+	def assign_coupon_via_admin(self, *, marketing_sale_id, phone_number, amount, valid_until):
+		with self.lock:
+			self.active += 1
+			self.max_active = max(self.max_active, self.active)
+		time.sleep(0.01)
+		with self.lock:
+			self.active -= 1
+		if phone_number in self.errors:
+			raise self.errors[phone_number]
+		if phone_number in self.failing_phones:
+			raise ValueError('Avatariya API error: boom')
+		return {'assigned': True, 'mobile_sent': True, 'guest_id': 1, 'coupon_id': int(phone_number[-4:]), 'coupon_code': f'C{phone_number[-4:]}'}
+
+
+class RunBoundedTests(SimpleTestCase):
+	def test_returns_outcomes_in_input_order_and_captures_errors(self):
+		def work(value):
+			time.sleep(0.001 * (5 - value))
+			if value == 2:
+				raise ValueError('bad value')
+			return value * 10
+
+		outcomes = run_bounded(work, [0, 1, 2, 3, 4], max_workers=3)
+
+		self.assertEqual([outcome.index for outcome in outcomes], [0, 1, 2, 3, 4])
+		self.assertEqual([outcome.value for outcome in outcomes if outcome.ok], [0, 10, 30, 40])
+		self.assertIsInstance(outcomes[2].error, ValueError)
+
+	def test_pool_threads_keep_their_db_connection_until_the_pool_shuts_down(self):
+		thread_connections = []
+
+		def open_connections():
+			connection = MagicMock(thread_ident=threading.get_ident())
+			thread_connections.append(connection)
+			return [connection]
+
+		with patch('utils.concurrency.connections') as connections_mock:
+			connections_mock.all.side_effect = open_connections
+			run_bounded(lambda value: value, list(range(10)), max_workers=2)
+			self.assertLessEqual(len(thread_connections), 2)
+			self.assertNotIn(threading.get_ident(), [connection.thread_ident for connection in thread_connections])
+			for connection in thread_connections:
+				connection.close.assert_called_once_with()
+				connection.dec_thread_sharing.assert_called_once_with()
+
+			thread_connections.clear()
+			run_bounded(lambda value: value, [1, 2], max_workers=1)
+			self.assertEqual(thread_connections, [])
+			connections_mock.close_all.assert_not_called()
+
+
+class _FakeCheckpoint:
+	def __init__(self, rows=None, batch_size=3):
+		self.rows = list(rows or [])
+		self.batch_size = batch_size
+		self.is_seeded = rows is not None
+		self.attempted = []
+		self.committed = []
+		self.released = []
+
+	def seed(self, rows):
+		self.rows = list(rows)
+		self.is_seeded = True
+
+	def close_interrupted(self):
+		return 0
+
+	def pending_batches(self):
+		pending = [row for row in self.rows if not row.processed]
+		for start in range(0, len(pending), self.batch_size):
+			yield pending[start:start + self.batch_size]
+
+	def mark_attempted(self, rows):
+		self.attempted.append([row.phone_normalized for row in rows])
+
+	def commit(self, rows, fields):
+		for row in rows:
+			row.processed = True
+		self.committed.append(len(rows))
+
+	def release(self, rows):
+		self.released.extend(row.phone_normalized for row in rows)
+
+
+class CouponDispatchConcurrencyTests(SimpleTestCase):
+	def _marketing_job(self):
+		return CouponDispatchJob(
+			id=1,
+			title='Купон',
+			dispatch_mode=CouponDispatchMode.MARKETING_SALE,
+			marketing_sale_id=42,
+			valid_until=timezone.localdate(),
+			source_text='\n'.join(f'7707000000{index}' for index in range(1, 9)),
+		)
+
+	def _run_marketing_job(self, service, job, checkpoint):
+		progress = JobProgress(job=job, succeeded_field='coupons_assigned', every_rows=1000)
+		with patch.object(CouponDispatchJob, 'save'), patch.object(
+			service,
+			'_checkpoint',
+			return_value=checkpoint,
+		), patch.object(service, '_start_progress', return_value=progress), patch.object(
+			JobProgress,
+			'flush',
+		), patch.object(
+			service,
+			'_get_free_coupons_count_for_sale',
+			return_value=0,
+		), patch.object(service, '_finalize_job'):
+			service._process_marketing_sale_job(job)
+		return progress
+
+	def test_marketing_sale_job_assigns_concurrently_with_deterministic_results(self):
+		client = _FakeAssignClient(failing_phones={'77070000003'})
+		service = CouponDispatchService(avatariya_client=client, mobile_client=object(), max_workers=4)
+		checkpoint = _FakeCheckpoint(batch_size=8)
+
+		self._run_marketing_job(service, self._marketing_job(), checkpoint)
+
+		rows = checkpoint.rows
+		self.assertEqual([row.phone_normalized for row in rows], [f'7707000000{index}' for index in range(1, 9)])
+		self.assertEqual(rows[2].error_message, 'assign_api_error')
+		self.assertEqual(sum(1 for row in rows if row.success), 7)
+		self.assertGreater(client.max_active, 1)
+		self.assertLessEqual(client.max_active, 4)
+
+	def test_upstream_outage_releases_rows_and_stops_the_job_for_resume(self):
+		client = _FakeAssignClient(
+			errors={
+				'77070000003': UpstreamCircuitOpenError('avatariya', 30),
+				'77070000004': AvatariyaAPIError('Avatariya API error: bad phone', 400),
+			},
+		)
+		service = CouponDispatchService(avatariya_client=client, mobile_client=object(), max_workers=2)
+		checkpoint = _FakeCheckpoint(batch_size=4)
+
+		with self.assertRaises(UpstreamUnavailable):
+			self._run_marketing_job(service, self._marketing_job(), checkpoint)
+
+		rows = checkpoint.rows
+		self.assertEqual(checkpoint.committed, [3])
+		self.assertEqual(checkpoint.released, ['77070000003'])
+		self.assertFalse(rows[2].processed)
+		self.assertEqual(rows[3].error_message, 'assign_api_error')
+		self.assertEqual(len(checkpoint.attempted), 1)
+
+	def test_rows_are_committed_batch_by_batch(self):
+		service = CouponDispatchService(avatariya_client=_FakeAssignClient(), mobile_client=object(), max_workers=2)
+		checkpoint = _FakeCheckpoint(batch_size=3)
+
+		progress = self._run_marketing_job(service, self._marketing_job(), checkpoint)
+
+		self.assertEqual(checkpoint.committed, [3, 3, 2])
+		self.assertEqual((progress.processed, progress.succeeded, progress.failed), (8, 8, 0))
+		self.assertTrue(all(row.processed for row in checkpoint.rows))
+		# The final mobile_sent_count is counted from these persisted flags, so a resumed job keeps earlier sends.
+		self.assertTrue(all(row.mobile_sent for row in checkpoint.rows))
+
+	def test_resume_sends_only_unprocessed_rows(self):
+		client = _FakeAssignClient()
+		service = CouponDispatchService(avatariya_client=client, mobile_client=object(), max_workers=2)
+		job = self._marketing_job()
+		rows = [
+			CouponDispatchJobResult(job=job, phone_normalized='77070000001', success=True, processed=True),
+			CouponDispatchJobResult(job=job, phone_normalized='77070000002', success=True, processed=True),
+			CouponDispatchJobResult(job=job, phone_normalized='77070000003'),
+			CouponDispatchJobResult(job=job, phone_normalized='77070000004'),
+		]
+		checkpoint = _FakeCheckpoint(rows=rows)
+
+		with patch.object(service, '_seed_marketing_sale_results') as seed_mock:
+			self._run_marketing_job(service, job, checkpoint)
+
+		seed_mock.assert_not_called()
+		self.assertEqual(checkpoint.attempted, [['77070000003', '77070000004']])
+		self.assertTrue(all(row.success for row in rows))
+
+
+class _FakeBulkMobileClient:
+	def __init__(self, rejected_coupons=(), unavailable_coupons=()):
+		self.rejected_coupons = set(rejected_coupons)
+		self.unavailable_coupons = set(unavailable_coupons)
+		self.calls = []
+
+	def create_order_coupon_info_bulk(self, items):
+		self.calls.append([item['coupon'] for item in items])
+		if any(item['coupon'] in self.unavailable_coupons for item in items):
+			raise MobileAPIError('Mobile API request failed', 503)
+		if any(item['coupon'] in self.rejected_coupons for item in items):
+			raise MobileAPIError('Mobile API error: invalid coupon', 400)
+		return [{'id': index, 'coupon': item['coupon']} for index, item in enumerate(items)]
+
+
+class CouponDispatchBulkModeTests(SimpleTestCase):
+	def _run_job(self, mobile_client, rows, chunk_size, checkpoint=None):
+		service = CouponDispatchService(
+			avatariya_client=object(),
+			mobile_client=mobile_client,
+			max_workers=1,
+			bulk_chunk_size=chunk_size,
+		)
+		job = CouponDispatchJob(
+			id=1,
+			title='Купон',
+			dispatch_mode=CouponDispatchMode.PREDEFINED_COUPON,
+			valid_until=timezone.localdate(),
+			source_file=SimpleUploadedFile('coupons.xlsx', b''),
+		)
+		checkpoint = checkpoint or _FakeCheckpoint(batch_size=100)
+		progress = JobProgress(job=job, succeeded_field='coupons_assigned', every_rows=1000)
+		with patch.object(CouponDispatchJob, 'save'), patch.object(
+			service,
+			'_checkpoint',
+			return_value=checkpoint,
+		), patch.object(service, '_start_progress', return_value=progress), patch.object(
+			JobProgress,
+			'flush',
+		), patch.object(
+			service,
+			'_iter_excel_phone_coupon_rows',
+			return_value=rows,
+		), patch.object(
+			service,
+			'_finalize_job',
+		):
+			service._process_predefined_coupon_job(job)
+		return checkpoint.rows
+
+	def test_groups_rows_into_chunks(self):
+		client = _FakeBulkMobileClient()
+		rows = [(f'7707000000{index}', f'CODE{index}') for index in range(1, 6)]
+
+		result_rows = self._run_job(client, rows, chunk_size=2)
+
+		self.assertEqual(len(client.calls), 3)
+		self.assertEqual(sum(1 for row in result_rows if row.success), 5)
+
+	def test_splits_rejected_chunk_to_isolate_bad_rows(self):
+		client = _FakeBulkMobileClient(rejected_coupons={'CODE3'})
+		rows = [(f'7707000000{index}', f'CODE{index}') for index in range(1, 5)]
+
+		result_rows = self._run_job(client, rows, chunk_size=4)
+
+		errors = {row.coupon_code: row.error_message for row in result_rows if not row.success}
+		self.assertEqual(errors, {'CODE3': 'mobile_api_error'})
+		self.assertEqual(sum(1 for row in result_rows if row.success), 3)
+		self.assertEqual(client.calls[0], ['CODE1', 'CODE2', 'CODE3', 'CODE4'])
+
+	def test_server_error_releases_the_chunk_instead_of_failing_it(self):
+		client = _FakeBulkMobileClient(unavailable_coupons={'CODE3'})
+		rows = [(f'7707000000{index}', f'CODE{index}') for index in range(1, 5)]
+
+		checkpoint = _FakeCheckpoint(batch_size=100)
+
+		with self.assertRaises(UpstreamUnavailable):
+			self._run_job(client, rows, chunk_size=2, checkpoint=checkpoint)
+
+		self.assertEqual(checkpoint.released, ['77070000003', '77070000004'])
+		self.assertEqual(checkpoint.committed, [2])
+		self.assertEqual(len(client.calls), 2)
+
+
+class JobProgressTests(SimpleTestCase):
+	def test_flushes_counters_every_n_rows(self):
+		job = CouponDispatchJob(id=7, status=CouponDispatchJobStatus.PROCESSING)
+		progress = JobProgress(job=job, succeeded_field='coupons_assigned', every_rows=3, failed=2)
+
+		with patch.object(CouponDispatchJob.objects, 'filter') as filter_mock:
+			for ok in (True, False, True, True):
+				progress.record(ok)
+
+		filter_mock.assert_called_once_with(pk=7)
+		values = filter_mock.return_value.update.call_args.kwargs
+		self.assertEqual(values['processed_rows'], 3)
+		self.assertEqual(values['coupons_assigned'], 2)
+		self.assertEqual(values['errors_count'], 3)
+		self.assertEqual(progress.processed, 4)
+
+	def test_progress_serializer_estimates_eta_while_processing(self):
+		job = CouponDispatchJob(
+			id=7,
+			status=CouponDispatchJobStatus.PROCESSING,
+			unique_phones=100,
+			processed_rows=40,
+			rows_per_second=20.0,
+		)
+
+		data = CouponDispatchJobProgressSerializer(job).data
+
+		self.assertEqual(data['eta_seconds'], 3)
+		self.assertEqual(data['total_rows'], 100)
+		job.status = CouponDispatchJobStatus.COMPLETED
+		self.assertIsNone(CouponDispatchJobProgressSerializer(job).data['eta_seconds'])
+
+
+class JobResultExportTests(SimpleTestCase):
+	def test_csv_lines_are_streamed_row_by_row(self):
+		lines = iter_csv_lines(['Телефон', 'Успех'], iter([('77070000001', True), ('77070000002', None)]))
+
+		self.assertEqual(next(lines), '\ufeffТелефон,Успех\r\n')
+		self.assertEqual(list(lines), ['77070000001,True\r\n', '77070000002,\r\n'])
+
+	def test_xlsx_contains_header_and_rows(self):
+		output = io.BytesIO()
+		write_xlsx(['Телефон', 'Код купона'], [('77070000001', 'CODE1')], output)
+
+		sheet = load_workbook(io.BytesIO(output.getvalue()), read_only=True).active
+		self.assertEqual(list(sheet.iter_rows(values_only=True)), [('Телефон', 'Код купона'), ('77070000001', 'CODE1')])
+
+	def test_filters_results_by_success_and_error(self):
+		queryset = MagicMock()
+
+		filter_job_results(queryset, {'success': 'false', 'error_message': 'assign_api_error'})
+
+		queryset.filter.assert_called_once_with(success=False)
+		queryset.filter.return_value.filter.assert_called_once_with(error_message='assign_api_error')
+
+	def test_rejects_invalid_success_filter(self):
+		with self.assertRaises(ValidationError):
+			filter_job_results(MagicMock(), {'success': 'maybe'})
+
+	def test_result_routes(self):
+		self.assertTrue(reverse('coupon-dispatch-jobs-results', kwargs={'pk': 5}).endswith('/coupon-dispatch/jobs/5/results/'))
+		self.assertTrue(
+			reverse('coupon-dispatch-jobs-export-results', kwargs={'pk': 5}).endswith('/coupon-dispatch/jobs/5/results/export/')
+		)
+
+
+class ExcelStreamingTests(SimpleTestCase):
+	def _workbook(self, rows):
+		workbook = Workbook()
+		for row in rows:
+			workbook.active.append(row)
+		output = io.BytesIO()
+		workbook.save(output)
+		output.seek(0)
+		return output
+
+	def test_phone_coupon_rows_are_yielded_lazily(self):
+		service = CouponDispatchService(avatariya_client=object(), mobile_client=object())
+		source = self._workbook([('Телефон', 'Код купона'), ('87070000001', 'CODE1'), (None, None), ('77070000002', None)])
+
+		rows = service._iter_excel_phone_coupon_rows(source)
+
+		self.assertIsInstance(rows, types.GeneratorType)
+		self.assertEqual(list(rows), [('87070000001', 'CODE1'), ('77070000002', '')])
+
+	def test_seed_results_dedupe_while_streaming(self):
+		service = CouponDispatchService(avatariya_client=object(), mobile_client=object())
+		job = CouponDispatchJob(id=1, source_text='77070000001\n123\n87070000001\n77070000002')
+		stats = SeedStats()
+
+		parsed_rows = (service._parse_phone(phone) for phone in service._iter_raw_phones(job))
+		results = list(service._iter_seed_results(job=job, parsed_rows=parsed_rows, stats=stats))
+
+		self.assertEqual([row.error_message for row in results], ['', 'invalid_phone_format', 'duplicate_phone', ''])
+		self.assertEqual([row.processed for row in results], [False, True, True, False])
+		self.assertEqual((stats.total_phones, stats.unique_phones, stats.rejected), (4, 2, 2))
+
+
+class _FakeMarketingSalesClient:
+	def __init__(self):
+		self.calls = 0
+		self.count_calls = []
+
+	def count_coupons(self, *, marketing_sale_id):
+		self.count_calls.append(marketing_sale_id)
+		return 7
+
+	def list_coupon_assign_marketing_sales(self):
+		self.calls += 1
+		return [
+			{'id': 1, 'name': 'Весенняя акция', 'free_coupons_count': 3},
+			{'id': 2, 'name': 'Летняя акция', 'free_coupons_count': 10},
+			{'id': 3, 'name': 'Закрытая', 'status': False},
+		]
+
+
+class ReferenceDataCacheTests(SimpleTestCase):
+	def setUp(self):
+		marketing_sale_reference_cache.clear_local()
+		free_coupon_count_cache.clear_local()
+		cache.clear()
+
+	def test_marketing_sales_are_fetched_once_and_searched_locally(self):
+		client = _FakeMarketingSalesClient()
+		service = CouponDispatchService(avatariya_client=client, mobile_client=object())
+
+		all_sales = service.list_marketing_sales_with_available_coupons()
+		summer = service.list_marketing_sales_with_available_coupons(search='летн')
+
+		self.assertEqual([sale.id for sale in all_sales], [2, 1])
+		self.assertEqual([sale.id for sale in summer], [2])
+		self.assertEqual(client.calls, 1)
+
+	def test_stale_value_is_served_while_one_background_refresh_runs(self):
+		refreshes = []
+		reference_cache = ReferenceDataCache(namespace='test_reference', run_in_background=refreshes.append)
+		loads = iter([['old'], ['new']])
+
+		self.assertEqual(reference_cache.get('items', lambda: next(loads), fresh_seconds=0), ['old'])
+		self.assertEqual(reference_cache.get('items', lambda: next(loads), fresh_seconds=0), ['old'])
+		self.assertEqual(reference_cache.get('items', lambda: next(loads), fresh_seconds=0), ['old'])
+		self.assertEqual(len(refreshes), 1)
+
+		refreshes[0]()
+		self.assertEqual(reference_cache.get('items', lambda: next(loads), fresh_seconds=3600), ['new'])
+
+	def test_failed_refresh_keeps_the_stale_value(self):
+		refreshes = []
+		reference_cache = ReferenceDataCache(namespace='test_reference', run_in_background=refreshes.append)
+		reference_cache.load('items', lambda: ['old'])
+
+		def fail():
+			raise RuntimeError('upstream down')
+
+		self.assertEqual(reference_cache.get('items', fail, fresh_seconds=0), ['old'])
+		refreshes[0]()
+		self.assertEqual(reference_cache.get('items', fail, fresh_seconds=0), ['old'])
+		self.assertEqual(len(refreshes), 2)
+
+	def test_job_end_count_uses_count_endpoint_and_updates_dropdown(self):
+		client = _FakeMarketingSalesClient()
+		service = CouponDispatchService(avatariya_client=client, mobile_client=object())
+
+		self.assertEqual(service._get_free_coupons_count_for_sale(1), 7)
+		self.assertEqual(client.count_calls, [1])
+		self.assertEqual(client.calls, 0)
+
+		service._consume_free_coupons(1, 2)
+		self.assertEqual(service.get_free_coupons_count(1), 5)
+		self.assertEqual(client.count_calls, [1])
+
+		sales = service.list_marketing_sales_with_available_coupons()
+		self.assertEqual([(sale.id, sale.available_coupons) for sale in sales], [(2, 10), (1, 5)])
+
+	def test_consuming_an_uncached_count_does_not_invent_one(self):
+		service = CouponDispatchService(avatariya_client=_FakeMarketingSalesClient(), mobile_client=object())
+
+		service._consume_free_coupons(2, 3)
+
+		self.assertIsNone(free_coupon_count_cache.get('2'))
+
+	def test_parallel_jobs_decrement_the_shared_count_and_reads_clamp_at_zero(self):
+		client = _FakeMarketingSalesClient()
+		first = CouponDispatchService(avatariya_client=client, mobile_client=object())
+		second = CouponDispatchService(avatariya_client=client, mobile_client=object())
+		first.get_free_coupons_count(1, refresh=True)
+
+		# Both jobs read 7 before either writes back; neither decrement may be lost.
+		self.assertEqual(free_coupon_count_cache.get('1'), 7)
+		first._consume_free_coupons(1, 4)
+		second._consume_free_coupons(1, 5)
+
+		self.assertEqual(first.get_free_coupons_count(1), 0)
+		sales = first.list_marketing_sales_with_available_coupons()
+		self.assertEqual(dict((sale.id, sale.available_coupons) for sale in sales)[1], 0)
+		self.assertEqual(client.count_calls, [1])
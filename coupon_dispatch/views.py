@@ -1,23 +1,41 @@
 import logging
 
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from coupon_dispatch.models import CouponDispatchJob
+from coupon_dispatch.models import CouponDispatchJob, CouponDispatchJobResult
 from coupon_dispatch.permissions import HasCouponDispatchAccess
 from coupon_dispatch.serializers import (
 	CouponDispatchJobCreateSerializer,
 	CouponDispatchJobDetailSerializer,
 	CouponDispatchJobListSerializer,
+	CouponDispatchJobProgressSerializer,
+	CouponDispatchJobResultSerializer,
+	CouponDispatchJobSummarySerializer,
 	MarketingSaleOptionSerializer,
 )
 from coupon_dispatch.services.coupon_dispatch_service import CouponDispatchService
 from coupon_dispatch.tasks import process_coupon_dispatch_job_task
+from utils.job_results import JobResultCursorPagination, export_job_results, filter_job_results, parse_bool_param
 
 logger = logging.getLogger(__name__)
 
+PROGRESS_ONLY_FIELDS = (
+	'id',
+	'status',
+	'unique_phones',
+	'processed_rows',
+	'coupons_assigned',
+	'errors_count',
+	'rows_per_second',
+	'progress_updated_at',
+	'started_at',
+	'finished_at',
+)
+
 
 class CouponDispatchMarketingSaleViewSet(viewsets.ViewSet):
 	permission_classes = [IsAuthenticated, HasCouponDispatchAccess]
@@ -49,6 +67,11 @@ class CouponDispatchJobViewSet(viewsets.ViewSet):
 		return Response(serializer.data)
 
 	def retrieve(self, request, pk=None):
+		# Large jobs should be read with include_results=false plus the paginated results endpoint.
+		if not parse_bool_param(request.query_params, 'include_results', default=True):
+			job = self._get_job(pk)
+			return Response(CouponDispatchJobSummarySerializer(job).data)
+
 		job = CouponDispatchJob.objects.filter(id=pk).prefetch_related('results').first()
 		if not job:
 			raise ValidationError({'detail': 'Coupon dispatch job not found'})
@@ -56,6 +79,36 @@ class CouponDispatchJobViewSet(viewsets.ViewSet):
 		serializer = CouponDispatchJobDetailSerializer(job)
 		return Response(serializer.data)
 
+	@action(detail=True, methods=['get'])
+	def results(self, request, pk=None):
+		job = self._get_job(pk)
+		queryset = filter_job_results(CouponDispatchJobResult.objects.filter(job=job), request.query_params)
+		paginator = JobResultCursorPagination()
+		page = paginator.paginate_queryset(queryset, request, view=self)
+		serializer = CouponDispatchJobResultSerializer(page, many=True)
+		return paginator.get_paginated_response(serializer.data)
+
+	@action(detail=True, methods=['get'], url_path='results/export')
+	def export_results(self, request, pk=None):
+		job = self._get_job(pk)
+		queryset = filter_job_results(CouponDispatchJobResult.objects.filter(job=job), request.query_params)
+		return export_job_results(
+			queryset,
+			fields=CouponDispatchJobResultSerializer.Meta.fields,
+			filename=f'coupon_dispatch_{job.id}_results',
+			file_format=request.query_params.get('file_format', 'csv'),
+		)
+
+	@action(detail=True, methods=['get'])
+	def progress(self, request, pk=None):
+		# Reads only the live counters so that UI polling never loads the result rows.
+		job = CouponDispatchJob.objects.filter(id=pk).only(*PROGRESS_ONLY_FIELDS).first()
+		if not job:
+			raise ValidationError({'detail': 'Coupon dispatch job not found'})
+
+		serializer = CouponDispatchJobProgressSerializer(job)
+		return Response(serializer.data)
+
 	def create(self, request):
 		serializer = CouponDispatchJobCreateSerializer(data=request.data)
 		serializer.is_valid(raise_exception=True)
@@ -79,6 +132,30 @@ class CouponDispatchJobViewSet(viewsets.ViewSet):
 			logger.exception('Failed to enqueue coupon dispatch job %s, fallback to sync run', job.id)
 			service.process_job(job.id)
 
-		job = CouponDispatchJob.objects.filter(id=job.id).prefetch_related('results').first()
-		serializer_out = CouponDispatchJobDetailSerializer(job)
+		job.refresh_from_db()
+		serializer_out = CouponDispatchJobSummarySerializer(job)
 		return Response(serializer_out.data, status=201)
+
+	@action(detail=True, methods=['post'])
+	def resume(self, request, pk=None):
+		job = self._get_job(pk)
+
+		service = CouponDispatchService()
+		if not service.can_resume(job):
+			raise ValidationError({'detail': 'Only failed or stalled jobs with checkpointed results can be resumed'})
+
+		try:
+			process_coupon_dispatch_job_task.delay(job.id, resume=True)
+		except Exception:
+			logger.exception('Failed to enqueue coupon dispatch job %s resume, fallback to sync run', job.id)
+			service.process_job(job.id, resume=True)
+
+		job.refresh_from_db()
+		serializer_out = CouponDispatchJobSummarySerializer(job)
+		return Response(serializer_out.data, status=202)
+
+	def _get_job(self, pk) -> CouponDispatchJob:
+		job = CouponDispatchJob.objects.filter(id=pk).first()
+		if not job:
+			raise ValidationError({'detail': 'Coupon dispatch job not found'})
+		return job
@@ -1,3 +1,25 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import GuestPhoneCache, GuestProfileBatchJob, GuestProfileBatchResult
+
+
+@admin.register(GuestPhoneCache)
+class GuestPhoneCacheAdmin(admin.ModelAdmin):
+    list_display = ('phone_normalized', 'guest_id', 'source', 'resolved_at', 'expires_at')
+    list_filter = ('source',)
+    search_fields = ('phone_normalized', 'guest_id')
+
+
+@admin.register(GuestProfileBatchJob)
+class GuestProfileBatchJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'unique_phones', 'guests_found', 'errors_count', 'initiated_by', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('results_seeded_at', 'progress_updated_at', 'started_at', 'finished_at', 'created_at', 'updated_at')
+
+
+@admin.register(GuestProfileBatchResult)
+class GuestProfileBatchResultAdmin(admin.ModelAdmin):
+    list_display = ('job', 'phone_normalized', 'guest_id', 'status_code', 'cashback_sum', 'success', 'error_message')
+    list_filter = ('success',)
+    search_fields = ('phone_normalized', 'guest_id')
+    raw_id_fields = ('job',)
@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from guest_profile.services.external_guest_data_service import ExternalGuestDataService
+from guest_profile.services.guest_phone_cache import GuestPhoneCacheService
+from guest_profile.services.phone_utils import normalize_phone_number
+
+SOURCES = ('bigdata', 'birthday')
+PHONES_FILE_CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Заполнить кэш ID гостей по телефонам из визитов BigData, очереди ДР и файла телефонов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            action='append',
+            choices=SOURCES,
+            help='Локальный источник (можно повторять; по умолчанию все)',
+        )
+        parser.add_argument('--days', type=int, default=None, help='Брать визиты BigData только за последние N дней')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки (по умолчанию 1000)')
+        parser.add_argument(
+            '--phones-file',
+            default=None,
+            help='Файл с телефонами (по одному в строке); отсутствующие в кэше ищутся в Avatariya',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Параллельных запросов поиска гостя (по умолчанию BONUS_TRANSACTION_LOOKUP_WORKERS)',
+        )
+        parser.add_argument('--purge-expired', action='store_true', help='Удалить просроченные записи кэша')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size должен быть > 0')
+        if options['days'] is not None and options['days'] <= 0:
+            raise CommandError('--days должен быть > 0')
+
+        service = GuestPhoneCacheService()
+        sources = options['source'] or ([] if options['phones_file'] else list(SOURCES))
+
+        if options['purge_expired']:
+            self.stdout.write(f'  удалено просроченных={service.purge_expired()}')
+
+        if 'bigdata' in sources:
+            since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+            stored = service.warm_from_bigdata_visits(since=since, batch_size=options['batch_size'])
+            self.stdout.write(f'  bigdata: сохранено={stored}')
+
+        if 'birthday' in sources:
+            stored = service.warm_from_birthday_notifications(batch_size=options['batch_size'])
+            self.stdout.write(f'  birthday: сохранено={stored}')
+
+        if options['phones_file']:
+            self._warm_from_phones_file(options['phones_file'], options['workers'])
+
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def _warm_from_phones_file(self, path: str, workers) -> None:
+        try:
+            with open(path, encoding='utf-8-sig') as handle:
+                phones = list(dict.fromkeys(filter(None, (normalize_phone_number(line) for line in handle))))
+        except OSError as exc:
+            raise CommandError(f'Не удалось прочитать файл: {exc}') from exc
+
+        try:
+            external_service = ExternalGuestDataService()
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        max_workers = workers or settings.BONUS_TRANSACTION_LOOKUP_WORKERS
+        self.stdout.write(self.style.NOTICE(f'Поиск гостей: телефонов={len(phones)}, workers={max_workers}'))
+
+        resolved = 0
+        for start in range(0, len(phones), PHONES_FILE_CHUNK_SIZE):
+            chunk = phones[start:start + PHONES_FILE_CHUNK_SIZE]
+            resolved += len(external_service.resolve_guest_ids(chunk, max_workers=max_workers))
+            self.stdout.write(f'  обработано={start + len(chunk)}, найдено={resolved}')
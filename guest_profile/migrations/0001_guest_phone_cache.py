@@ -0,0 +1,31 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuestPhoneCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_normalized', models.CharField(max_length=32, unique=True, verbose_name='Телефон (normalized)')),
+                ('guest_id', models.PositiveBigIntegerField(db_index=True, verbose_name='ID гостя')),
+                ('source', models.CharField(choices=[('lookup', 'Поиск гостя по телефону'), ('bigdata', 'Визиты BigData'), ('birthday', 'Дни рождения')], default='lookup', max_length=16, verbose_name='Источник')),
+                ('resolved_at', models.DateTimeField(verbose_name='Получено')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Действительно до')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Кэш гостя по телефону',
+                'verbose_name_plural': 'Кэш гостей по телефону',
+            },
+        ),
+    ]
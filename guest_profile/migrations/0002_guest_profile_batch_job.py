@@ -0,0 +1,76 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('guest_profile', '0001_guest_phone_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuestProfileBatchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_text', models.TextField(blank=True, verbose_name='Телефоны (ручной ввод)')),
+                ('source_file', models.FileField(blank=True, null=True, upload_to='guest_profile_batches/', verbose_name='Excel файл')),
+                ('refresh', models.BooleanField(default=False, verbose_name='Без кэша профилей')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('processing', 'В обработке'), ('completed', 'Завершено'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=16, verbose_name='Статус')),
+                ('total_phones', models.PositiveIntegerField(default=0, verbose_name='Телефонов в исходных данных')),
+                ('unique_phones', models.PositiveIntegerField(default=0, verbose_name='Уникальных валидных телефонов')),
+                ('guests_found', models.PositiveIntegerField(default=0, verbose_name='Найдено гостей')),
+                ('errors_count', models.PositiveIntegerField(default=0, verbose_name='Ошибок')),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='Обработано строк')),
+                ('rows_per_second', models.FloatField(default=0, verbose_name='Скорость, строк/сек')),
+                ('progress_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Прогресс обновлен')),
+                ('error_log', models.TextField(blank=True, verbose_name='Лог ошибок')),
+                ('results_seeded_at', models.DateTimeField(blank=True, null=True, verbose_name='Строки результатов созданы')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало обработки')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Конец обработки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('initiated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='guest_profile_batch_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Инициатор')),
+            ],
+            options={
+                'verbose_name': 'Пакетная выгрузка профилей гостей',
+                'verbose_name_plural': 'Пакетные выгрузки профилей гостей',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.CreateModel(
+            name='GuestProfileBatchResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_raw', models.CharField(blank=True, max_length=64, verbose_name='Телефон (как введен)')),
+                ('phone_normalized', models.CharField(blank=True, max_length=32, verbose_name='Телефон (normalized)')),
+                ('guest_id', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='ID гостя')),
+                ('guest_name', models.CharField(blank=True, max_length=255, verbose_name='Имя гостя')),
+                ('status_code', models.CharField(blank=True, max_length=16, verbose_name='Статус гостя')),
+                ('is_blocked', models.BooleanField(default=False, verbose_name='Заблокирован')),
+                ('cashback_sum', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True, verbose_name='Кэшбэк')),
+                ('cashback_burn_date', models.CharField(blank=True, max_length=32, verbose_name='Дата сгорания кэшбэка')),
+                ('cashback_burn_sum', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True, verbose_name='Сгорит кэшбэка')),
+                ('total_crystals', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True, verbose_name='Кристаллы')),
+                ('warnings', models.CharField(blank=True, max_length=255, verbose_name='Предупреждения')),
+                ('success', models.BooleanField(default=False, verbose_name='Успех')),
+                ('error_message', models.TextField(blank=True, verbose_name='Текст ошибки')),
+                ('processed', models.BooleanField(default=False, verbose_name='Обработано')),
+                ('attempted_at', models.DateTimeField(blank=True, null=True, verbose_name='Отправлено в обработку')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Время обработки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='guest_profile.guestprofilebatchjob', verbose_name='Пакетная выгрузка')),
+            ],
+            options={
+                'verbose_name': 'Результат выгрузки профиля гостя',
+                'verbose_name_plural': 'Результаты выгрузки профилей гостей',
+                'ordering': ('id',),
+                'indexes': [models.Index(fields=['job', 'success'], name='idx_gp_batch_job_success'), models.Index(fields=['job', 'processed'], name='idx_gp_batch_job_processed')],
+            },
+        ),
+    ]
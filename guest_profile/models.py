@@ -1,3 +1,124 @@
 from django.db import models
 
-# Create your models here.
+
+class GuestPhoneSource(models.TextChoices):
+    LOOKUP = 'lookup', 'Поиск гостя по телефону'
+    BIGDATA = 'bigdata', 'Визиты BigData'
+    BIRTHDAY = 'birthday', 'Дни рождения'
+
+
+class GuestPhoneCache(models.Model):
+    phone_normalized = models.CharField(max_length=32, unique=True, verbose_name='Телефон (normalized)')
+    guest_id = models.PositiveBigIntegerField(db_index=True, verbose_name='ID гостя')
+    source = models.CharField(
+        max_length=16,
+        choices=GuestPhoneSource.choices,
+        default=GuestPhoneSource.LOOKUP,
+        verbose_name='Источник',
+    )
+    resolved_at = models.DateTimeField(verbose_name='Получено')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Действительно до')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        verbose_name = 'Кэш гостя по телефону'
+        verbose_name_plural = 'Кэш гостей по телефону'
+
+    def __str__(self) -> str:
+        return f'{self.phone_normalized} -> {self.guest_id}'
+
+
+class GuestProfileBatchJobStatus(models.TextChoices):
+    PENDING = 'pending', 'Ожидает'
+    PROCESSING = 'processing', 'В обработке'
+    COMPLETED = 'completed', 'Завершено'
+    FAILED = 'failed', 'Ошибка'
+
+
+class GuestProfileBatchJob(models.Model):
+    initiated_by = models.ForeignKey(
+        'auth.User',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='guest_profile_batch_jobs',
+        verbose_name='Инициатор',
+    )
+    source_text = models.TextField(blank=True, verbose_name='Телефоны (ручной ввод)')
+    source_file = models.FileField(upload_to='guest_profile_batches/', null=True, blank=True, verbose_name='Excel файл')
+    refresh = models.BooleanField(default=False, verbose_name='Без кэша профилей')
+
+    status = models.CharField(
+        max_length=16,
+        choices=GuestProfileBatchJobStatus.choices,
+        default=GuestProfileBatchJobStatus.PENDING,
+        db_index=True,
+        verbose_name='Статус',
+    )
+    total_phones = models.PositiveIntegerField(default=0, verbose_name='Телефонов в исходных данных')
+    unique_phones = models.PositiveIntegerField(default=0, verbose_name='Уникальных валидных телефонов')
+    guests_found = models.PositiveIntegerField(default=0, verbose_name='Найдено гостей')
+    errors_count = models.PositiveIntegerField(default=0, verbose_name='Ошибок')
+    processed_rows = models.PositiveIntegerField(default=0, verbose_name='Обработано строк')
+    rows_per_second = models.FloatField(default=0, verbose_name='Скорость, строк/сек')
+    progress_updated_at = models.DateTimeField(null=True, blank=True, verbose_name='Прогресс обновлен')
+    error_log = models.TextField(blank=True, verbose_name='Лог ошибок')
+    results_seeded_at = models.DateTimeField(null=True, blank=True, verbose_name='Строки результатов созданы')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начало обработки')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Конец обработки')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        ordering = ('-created_at',)
+        verbose_name = 'Пакетная выгрузка профилей гостей'
+        verbose_name_plural = 'Пакетные выгрузки профилей гостей'
+
+    def __str__(self) -> str:
+        return f'#{self.id} | phones={self.unique_phones} | {self.status}'
+
+
+class GuestProfileBatchResult(models.Model):
+    job = models.ForeignKey(
+        GuestProfileBatchJob,
+        on_delete=models.CASCADE,
+        related_name='results',
+        verbose_name='Пакетная выгрузка',
+    )
+    phone_raw = models.CharField(max_length=64, blank=True, verbose_name='Телефон (как введен)')
+    phone_normalized = models.CharField(max_length=32, blank=True, verbose_name='Телефон (normalized)')
+    guest_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='ID гостя')
+    guest_name = models.CharField(max_length=255, blank=True, verbose_name='Имя гостя')
+    status_code = models.CharField(max_length=16, blank=True, verbose_name='Статус гостя')
+    is_blocked = models.BooleanField(default=False, verbose_name='Заблокирован')
+    cashback_sum = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, verbose_name='Кэшбэк')
+    cashback_burn_date = models.CharField(max_length=32, blank=True, verbose_name='Дата сгорания кэшбэка')
+    cashback_burn_sum = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name='Сгорит кэшбэка',
+    )
+    total_crystals = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, verbose_name='Кристаллы')
+    warnings = models.CharField(max_length=255, blank=True, verbose_name='Предупреждения')
+    success = models.BooleanField(default=False, verbose_name='Успех')
+    error_message = models.TextField(blank=True, verbose_name='Текст ошибки')
+    processed = models.BooleanField(default=False, verbose_name='Обработано')
+    attempted_at = models.DateTimeField(null=True, blank=True, verbose_name='Отправлено в обработку')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Время обработки')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        ordering = ('id',)
+        indexes = [
+            models.Index(fields=('job', 'success'), name='idx_gp_batch_job_success'),
+            models.Index(fields=('job', 'processed'), name='idx_gp_batch_job_processed'),
+        ]
+        verbose_name = 'Результат выгрузки профиля гостя'
+        verbose_name_plural = 'Результаты выгрузки профилей гостей'
+
+    def __str__(self) -> str:
+        return f'job={self.job_id} phone={self.phone_normalized} success={self.success}'
@@ -5,7 +5,9 @@ from datetime import timedelta
 from django.utils import timezone
 from rest_framework import serializers
 
+from guest_profile.models import GuestProfileBatchJob, GuestProfileBatchJobStatus, GuestProfileBatchResult
 from guest_profile.services.phone_utils import normalize_phone_number
+from utils.job_progress import estimate_eta_seconds
 
 
 class GuestProfileQuerySerializer(serializers.Serializer):
@@ -16,6 +18,8 @@ class GuestProfileQuerySerializer(serializers.Serializer):
     mobile_events_limit = serializers.IntegerField(required=False, min_value=1, max_value=200, default=50)
     cashback_limit = serializers.IntegerField(required=False, min_value=1, max_value=200, default=50)
     crystal_limit = serializers.IntegerField(required=False, min_value=1, max_value=200, default=50)
+    refresh = serializers.BooleanField(required=False, default=False)
+    mobile_exact_count = serializers.BooleanField(required=False, default=False)
 
     default_history_days = 90
     max_range_days = 365
@@ -49,3 +53,83 @@ class GuestProfileQuerySerializer(serializers.Serializer):
         attrs['from_date'] = from_date
         attrs['to_date'] = to_date
         return attrs
+
+
+class GuestProfileBatchJobCreateSerializer(serializers.Serializer):
+    phones_text = serializers.CharField(required=False, allow_blank=True)
+    excel_file = serializers.FileField(required=False, allow_null=True)
+    refresh = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        phones_text = str(attrs.get('phones_text') or '').strip()
+        excel_file = attrs.get('excel_file')
+
+        if not phones_text and not excel_file:
+            raise serializers.ValidationError('Provide manual phone numbers or Excel file')
+
+        if excel_file is not None:
+            filename = str(getattr(excel_file, 'name', '')).lower()
+            if filename and not filename.endswith(('.xlsx', '.xlsm', '.xltx', '.xltm')):
+                raise serializers.ValidationError({'excel_file': 'Excel file must be .xlsx/.xlsm/.xltx/.xltm'})
+
+        return attrs
+
+
+class GuestProfileBatchResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GuestProfileBatchResult
+        fields = (
+            'id',
+            'phone_raw',
+            'phone_normalized',
+            'guest_id',
+            'guest_name',
+            'status_code',
+            'is_blocked',
+            'cashback_sum',
+            'cashback_burn_date',
+            'cashback_burn_sum',
+            'total_crystals',
+            'warnings',
+            'success',
+            'error_message',
+            'processed',
+        )
+
+
+class GuestProfileBatchJobSerializer(serializers.ModelSerializer):
+    initiated_by_email = serializers.SerializerMethodField()
+    eta_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GuestProfileBatchJob
+        fields = (
+            'id',
+            'status',
+            'refresh',
+            'total_phones',
+            'unique_phones',
+            'guests_found',
+            'errors_count',
+            'processed_rows',
+            'rows_per_second',
+            'eta_seconds',
+            'progress_updated_at',
+            'error_log',
+            'started_at',
+            'finished_at',
+            'initiated_by_email',
+            'created_at',
+            'updated_at',
+        )
+
+    def get_initiated_by_email(self, obj):
+        user = obj.initiated_by
+        if user is None:
+            return ''
+        return str(user.email or '').strip().lower()
+
+    def get_eta_seconds(self, obj):
+        if obj.status != GuestProfileBatchJobStatus.PROCESSING:
+            return None
+        return estimate_eta_seconds(total=obj.unique_phones, processed=obj.processed_rows, rows_per_second=obj.rows_per_second)
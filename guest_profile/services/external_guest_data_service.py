@@ -1,17 +1,52 @@
 from __future__ import annotations
 
 from datetime import date, datetime, time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Optional
 
+from guest_profile.models import GuestPhoneSource
+from guest_profile.services.guest_phone_cache import GuestPhoneCacheService, coerce_guest_id
 from utils.avatariya_client import AvatariyaClient
+from utils.concurrency import run_bounded
 
 
 class ExternalGuestDataService:
-    def __init__(self, avatariya_client: Optional[AvatariyaClient] = None) -> None:
+    def __init__(
+        self,
+        avatariya_client: Optional[AvatariyaClient] = None,
+        guest_cache: Optional[GuestPhoneCacheService] = None,
+    ) -> None:
         self.avatariya_client = avatariya_client or AvatariyaClient()
+        self.guest_cache = guest_cache or GuestPhoneCacheService()
+
+    def resolve_guest(self, normalized_phone: str) -> Optional[Dict[str, Any]]:
+        """Guest for the phone, answered from the phone cache as ``{'id': guest_id}`` when possible."""
+        guest_id = self.guest_cache.get_guest_id(normalized_phone)
+        if guest_id is not None:
+            return {'id': guest_id}
+        return self.find_guest_by_phone(normalized_phone)
+
+    def resolve_guest_ids(self, normalized_phones: Iterable[str], *, max_workers: int) -> Dict[str, int]:
+        """Guest ids for many phones: cached ones first, the rest searched concurrently and stored.
+
+        Phones without a guest and phones whose search failed are left out of the result.
+        """
+        phones = list(dict.fromkeys(normalized_phones))
+        resolved = self.guest_cache.get_many(phones)
+        missing = [phone for phone in phones if phone not in resolved]
+        lookups = run_bounded(self.lookup_guest_id, missing, max_workers=max_workers)
+        fresh = {lookup.item: lookup.value for lookup in lookups if lookup.ok and lookup.value is not None}
+        self.guest_cache.remember_many(fresh.items(), source=GuestPhoneSource.LOOKUP)
+        resolved.update(fresh)
+        return resolved
+
+    def lookup_guest_id(self, normalized_phone: str) -> Optional[int]:
+        """Live guest search without touching the phone cache; callers store results in bulk."""
+        return self._extract_guest_id(self.avatariya_client.find_guest_by_phone(normalized_phone))
 
     def find_guest_by_phone(self, normalized_phone: str) -> Optional[Dict[str, Any]]:
-        return self.avatariya_client.find_guest_by_phone(normalized_phone)
+        guest = self.avatariya_client.find_guest_by_phone(normalized_phone)
+        self.guest_cache.remember(normalized_phone, self._extract_guest_id(guest))
+        return guest
 
     def get_guest(self, guest_id: int) -> Dict[str, Any]:
         payload = self.avatariya_client.get_guest(guest_id)
@@ -56,6 +91,11 @@ class ExternalGuestDataService:
         )
         return self._normalize_list_payload(payload)
 
+    def _extract_guest_id(self, guest: Any) -> Optional[int]:
+        if not isinstance(guest, dict):
+            return None
+        return coerce_guest_id(guest.get('id') or guest.get('guest_id'))
+
     def _normalize_list_payload(self, payload: Any) -> Dict[str, Any]:
         if isinstance(payload, dict):
             results = payload.get('results')
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from amplitude.models import BigDataPayloadFormat, BigDataVisit
+from guest_profile.models import GuestPhoneCache, GuestPhoneSource
+from guest_profile.services.phone_utils import normalize_phone_number
+from notifications.models import KidBirthdayNotification
+from utils.cache import LayeredCache
+
+logger = logging.getLogger(__name__)
+
+guest_phone_cache = LayeredCache(
+    namespace='guest_phone',
+    local_maxsize=settings.GUEST_PHONE_LOCAL_CACHE_SIZE,
+    local_ttl_seconds=settings.GUEST_PHONE_LOCAL_CACHE_SECONDS,
+)
+
+WRITE_BATCH_SIZE = 1000
+VISIT_GUEST_ID_KEYS = ('guest_id', 'guestId', 'guest')
+
+
+def coerce_guest_id(value: Any) -> Optional[int]:
+    """Positive guest id from a bare id or a nested ``{'id': ...}`` guest object."""
+    if isinstance(value, dict):
+        value = value.get('id')
+    if isinstance(value, bool):
+        return None
+    try:
+        guest_id = int(value)
+    except (TypeError, ValueError):
+        return None
+    return guest_id if guest_id > 0 else None
+
+
+def visit_guest_id(row: Dict[str, Any]) -> Optional[int]:
+    """Guest id carried by a BigData visit row; ``id`` there is the visit, not the guest."""
+    for key in VISIT_GUEST_ID_KEYS:
+        guest_id = coerce_guest_id(row.get(key))
+        if guest_id is not None:
+            return guest_id
+    return None
+
+
+class GuestPhoneCacheService:
+    """Phone -> guest id mappings shared by coupon, bonus, birthday and profile flows.
+
+    Mappings live in ``GuestPhoneCache`` for ``GUEST_PHONE_CACHE_TTL_SECONDS`` and are fronted by the
+    layered Redis cache. Only positive resolutions are stored: a phone without a guest may register at
+    any time, so misses always go upstream. Cache failures are logged and treated as misses.
+    """
+
+    def __init__(self, ttl_seconds: Optional[int] = None, shared_ttl_seconds: Optional[int] = None) -> None:
+        self.ttl_seconds = ttl_seconds or settings.GUEST_PHONE_CACHE_TTL_SECONDS
+        self.shared_ttl_seconds = shared_ttl_seconds or settings.GUEST_PHONE_CACHE_SHARED_SECONDS
+
+    def get_guest_id(self, phone: str) -> Optional[int]:
+        normalized = normalize_phone_number(phone)
+        if not normalized:
+            return None
+        return self.get_many([normalized]).get(normalized)
+
+    def get_many(self, phones: Iterable[str]) -> Dict[str, int]:
+        """Return cached guest ids keyed by normalized phone; phones without a live mapping are absent."""
+        normalized = self._normalize_unique(phones)
+        if not normalized:
+            return {}
+
+        found = guest_phone_cache.get_many(normalized)
+        missing = [phone for phone in normalized if phone not in found]
+        if not missing:
+            return found
+
+        try:
+            persisted = self._load_persisted(missing)
+        except Exception:
+            logger.warning('guest_phone_cache_load_failed', extra={'phones_count': len(missing)}, exc_info=True)
+            return found
+
+        # Rows close to expiry are not pushed to the front cache, so it never outlives the table TTL.
+        refresh_before = timezone.now() + timedelta(seconds=self.shared_ttl_seconds)
+        front: Dict[str, int] = {}
+        for phone, (guest_id, expires_at) in persisted.items():
+            found[phone] = guest_id
+            if expires_at >= refresh_before:
+                front[phone] = guest_id
+        guest_phone_cache.set_many(front, self.shared_ttl_seconds)
+        return found
+
+    def remember(self, phone: str, guest_id: Any, *, source: str = GuestPhoneSource.LOOKUP) -> int:
+        return self.remember_many([(phone, guest_id)], source=source)
+
+    def remember_many(self, pairs: Iterable[Tuple[str, Any]], *, source: str = GuestPhoneSource.LOOKUP) -> int:
+        """Upsert ``(phone, guest_id)`` pairs; later pairs for the same phone win. Returns stored count."""
+        mapping: Dict[str, int] = {}
+        for phone, raw_guest_id in pairs:
+            normalized = normalize_phone_number(phone)
+            guest_id = coerce_guest_id(raw_guest_id)
+            if normalized and guest_id is not None:
+                mapping[normalized] = guest_id
+        if not mapping:
+            return 0
+
+        try:
+            self._store(mapping, source=source)
+        except Exception:
+            logger.warning('guest_phone_cache_store_failed', extra={'phones_count': len(mapping)}, exc_info=True)
+        guest_phone_cache.set_many(mapping, self.shared_ttl_seconds)
+        return len(mapping)
+
+    def forget(self, phone: str) -> None:
+        normalized = normalize_phone_number(phone)
+        if not normalized:
+            return
+        GuestPhoneCache.objects.filter(phone_normalized=normalized).delete()
+        guest_phone_cache.delete(normalized)
+
+    def purge_expired(self) -> int:
+        deleted, _ = GuestPhoneCache.objects.filter(expires_at__lt=timezone.now()).delete()
+        return deleted
+
+    def warm_from_bigdata_visits(self, *, since: Optional[datetime] = None, batch_size: int = WRITE_BATCH_SIZE) -> int:
+        """Store guest ids found in saved BigData visit payloads, newest visit winning per phone."""
+        queryset = BigDataVisit.objects.exclude(guest_phone_normalized='').exclude(
+            payload_format=BigDataPayloadFormat.DROPPED
+        )
+        if since is not None:
+            queryset = queryset.filter(time_create__gte=since)
+
+        stored = 0
+        last_id = 0
+        batch_size = max(1, int(batch_size))
+        while True:
+            batch = list(
+                queryset.filter(id__gt=last_id)
+                .order_by('id')
+                .only(
+                    'id',
+                    'bigdata_visit_id',
+                    'guest_phone_raw',
+                    'guest_phone_normalized',
+                    'time_create',
+                    'park',
+                    'city',
+                    'payload',
+                    'payload_format',
+                    'payload_compressed',
+                )[:batch_size]
+            )
+            if not batch:
+                return stored
+
+            last_id = batch[-1].id
+            ordered = sorted(batch, key=lambda visit: visit.time_create)
+            stored += self.remember_many(
+                ((visit.guest_phone_normalized, visit_guest_id(visit.get_payload())) for visit in ordered),
+                source=GuestPhoneSource.BIGDATA,
+            )
+
+    def warm_from_birthday_notifications(self, *, batch_size: int = WRITE_BATCH_SIZE) -> int:
+        """Store the guest id and phone pairs already collected for birthday notifications."""
+        stored = 0
+        last_id = 0
+        batch_size = max(1, int(batch_size))
+        while True:
+            batch = list(
+                KidBirthdayNotification.objects.exclude(guest_phone='')
+                .filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'guest_phone', 'guest_id')[:batch_size]
+            )
+            if not batch:
+                return stored
+
+            last_id = batch[-1][0]
+            stored += self.remember_many(
+                ((phone, guest_id) for _, phone, guest_id in batch),
+                source=GuestPhoneSource.BIRTHDAY,
+            )
+
+    def _load_persisted(self, phones: List[str]) -> Dict[str, Tuple[int, datetime]]:
+        rows = GuestPhoneCache.objects.filter(
+            phone_normalized__in=phones,
+            expires_at__gt=timezone.now(),
+        ).values_list('phone_normalized', 'guest_id', 'expires_at')
+        return {phone: (guest_id, expires_at) for phone, guest_id, expires_at in rows}
+
+    def _store(self, mapping: Dict[str, int], *, source: str) -> None:
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.ttl_seconds)
+        GuestPhoneCache.objects.bulk_create(
+            [
+                GuestPhoneCache(
+                    phone_normalized=phone,
+                    guest_id=guest_id,
+                    source=source,
+                    resolved_at=now,
+                    expires_at=expires_at,
+                )
+                for phone, guest_id in mapping.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['phone_normalized'],
+            update_fields=['guest_id', 'source', 'resolved_at', 'expires_at', 'updated_at'],
+            batch_size=WRITE_BATCH_SIZE,
+        )
+
+    def _normalize_unique(self, phones: Iterable[str]) -> List[str]:
+        return list(dict.fromkeys(phone for phone in map(normalize_phone_number, phones) if phone))
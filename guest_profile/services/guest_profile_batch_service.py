@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import logging
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Any, BinaryIO, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from guest_profile.models import (
+    GuestPhoneSource,
+    GuestProfileBatchJob,
+    GuestProfileBatchJobStatus,
+    GuestProfileBatchResult,
+)
+from guest_profile.services.external_guest_data_service import ExternalGuestDataService
+from guest_profile.services.guest_profile_service import GuestProfileService
+from guest_profile.services.phone_utils import normalize_phone_number
+from utils.concurrency import run_bounded
+from utils.excel_stream import iter_sheet_rows
+from utils.job_checkpoint import ResultCheckpoint, SeedStats
+from utils.job_progress import JobProgress
+
+logger = logging.getLogger(__name__)
+
+RESULT_FIELDS = (
+    'guest_id',
+    'guest_name',
+    'status_code',
+    'is_blocked',
+    'cashback_sum',
+    'cashback_burn_date',
+    'cashback_burn_sum',
+    'total_crystals',
+    'warnings',
+    'success',
+    'error_message',
+)
+PHONE_LIMIT_ERROR = 'phone_limit_exceeded'
+
+
+class GuestProfileBatchService:
+    """Compact guest summaries for a list of phones, built by a background job.
+
+    Phones are checkpointed as result rows and processed in batches: cached guest ids are read in one
+    call, the rest are searched on a bounded pool, and summaries reuse the profile block cache, so a
+    phone already opened in the portal costs no upstream calls.
+    """
+
+    def __init__(
+        self,
+        external_service: Optional[ExternalGuestDataService] = None,
+        profile_service: Optional[GuestProfileService] = None,
+        max_workers: Optional[int] = None,
+        max_phones: Optional[int] = None,
+        checkpoint_batch_size: Optional[int] = None,
+    ) -> None:
+        self.external_service = external_service or ExternalGuestDataService()
+        self.profile_service = profile_service or GuestProfileService(external_service=self.external_service)
+        self.max_workers = max_workers or settings.GUEST_PROFILE_BATCH_WORKERS
+        self.max_phones = max_phones or settings.GUEST_PROFILE_BATCH_MAX_PHONES
+        self.checkpoint_batch_size = checkpoint_batch_size or settings.JOB_CHECKPOINT_BATCH_SIZE
+
+    def create_job(self, *, initiated_by, phones_text: str, excel_file, refresh: bool) -> GuestProfileBatchJob:
+        return GuestProfileBatchJob.objects.create(
+            initiated_by=initiated_by,
+            source_text=str(phones_text or ''),
+            source_file=excel_file,
+            refresh=refresh,
+            status=GuestProfileBatchJobStatus.PENDING,
+        )
+
+    def process_job(self, job_id: int) -> GuestProfileBatchJob:
+        now = timezone.now()
+        claimed = GuestProfileBatchJob.objects.filter(pk=job_id, status=GuestProfileBatchJobStatus.PENDING).update(
+            status=GuestProfileBatchJobStatus.PROCESSING,
+            started_at=now,
+            finished_at=None,
+            updated_at=now,
+        )
+        job = GuestProfileBatchJob.objects.get(pk=job_id)
+        if claimed == 0:
+            return job
+
+        logger.info('guest_profile_batch_started', extra={'job_id': job_id})
+        try:
+            checkpoint = ResultCheckpoint(model=GuestProfileBatchResult, job=job, batch_size=self.checkpoint_batch_size)
+            self._seed_results(job=job, checkpoint=checkpoint)
+            progress = JobProgress.from_results(
+                job=job,
+                results=GuestProfileBatchResult.objects.filter(job=job),
+                succeeded_field='guests_found',
+            )
+            for batch in checkpoint.pending_batches():
+                checkpoint.mark_attempted(batch)
+                self._summarize_batch(batch, refresh=job.refresh, progress=progress)
+                checkpoint.commit(batch, fields=RESULT_FIELDS)
+            progress.flush()
+            return self._finalize_job(job)
+        except Exception:
+            logger.exception('guest_profile_batch_failed', extra={'job_id': job_id})
+            job.status = GuestProfileBatchJobStatus.FAILED
+            job.finished_at = timezone.now()
+            job.error_log = '\n'.join(filter(None, [job.error_log, 'unhandled_exception']))
+            job.save(update_fields=['status', 'finished_at', 'error_log', 'updated_at'])
+            raise
+
+    def _seed_results(self, *, job: GuestProfileBatchJob, checkpoint: ResultCheckpoint) -> None:
+        stats = SeedStats()
+        checkpoint.seed(self._iter_seed_results(job=job, stats=stats))
+        job.total_phones = stats.total_phones
+        job.unique_phones = stats.unique_phones
+        job.errors_count = stats.rejected
+        job.save(update_fields=['total_phones', 'unique_phones', 'errors_count', 'error_log', 'updated_at'])
+
+    def _iter_seed_results(self, *, job: GuestProfileBatchJob, stats: SeedStats) -> Iterator[GuestProfileBatchResult]:
+        seen: set[str] = set()
+        now = timezone.now()
+        for raw in self._iter_phone_candidates(job):
+            stats.total_phones += 1
+            if stats.unique_phones >= self.max_phones:
+                # Keep counting the input so the job shows how much of the list was left out.
+                job.error_log = PHONE_LIMIT_ERROR
+                continue
+            normalized = normalize_phone_number(raw)
+            if not normalized:
+                stats.rejected += 1
+                yield GuestProfileBatchResult(
+                    job=job,
+                    phone_raw=str(raw).strip()[:64],
+                    error_message='invalid_phone_format',
+                    processed=True,
+                    processed_at=now,
+                )
+                continue
+            if normalized in seen:
+                continue
+
+            seen.add(normalized)
+            stats.unique_phones += 1
+            yield GuestProfileBatchResult(job=job, phone_raw=str(raw).strip()[:64], phone_normalized=normalized)
+
+    def _summarize_batch(
+        self,
+        rows: List[GuestProfileBatchResult],
+        *,
+        refresh: bool,
+        progress: JobProgress,
+    ) -> None:
+        """Resolve guests and load their summaries on one bounded pool; row fields are filled in place."""
+        guest_cache = self.external_service.guest_cache
+        cached = guest_cache.get_many(row.phone_normalized for row in rows)
+
+        def summarize(row: GuestProfileBatchResult) -> Optional[dict]:
+            guest_id = cached.get(row.phone_normalized) or self.external_service.lookup_guest_id(row.phone_normalized)
+            if guest_id is None:
+                return None
+            return self.profile_service.get_summary(guest_id=guest_id, refresh=refresh)
+
+        outcomes = run_bounded(
+            summarize,
+            rows,
+            max_workers=self.max_workers,
+            on_complete=lambda outcome: progress.record(outcome.ok and outcome.value is not None),
+        )
+        guest_cache.remember_many(
+            (
+                (outcome.item.phone_normalized, outcome.value['guest_id'])
+                for outcome in outcomes
+                if outcome.ok and outcome.value and outcome.item.phone_normalized not in cached
+            ),
+            source=GuestPhoneSource.LOOKUP,
+        )
+
+        for outcome in outcomes:
+            row = outcome.item
+            if not outcome.ok:
+                logger.warning(
+                    'guest_profile_batch_row_failed',
+                    extra={'phone': row.phone_normalized, 'detail': str(outcome.error)},
+                )
+                row.success = False
+                row.error_message = 'guest_lookup_unavailable'
+            elif outcome.value is None:
+                row.success = False
+                row.error_message = 'guest_not_found'
+            else:
+                self._apply_summary(row, outcome.value)
+
+    def _apply_summary(self, row: GuestProfileBatchResult, summary: dict) -> None:
+        row.guest_id = summary['guest_id']
+        row.guest_name = summary['name'][:255]
+        row.status_code = summary['status_code']
+        row.is_blocked = summary['is_blocked']
+        row.cashback_sum = self._to_decimal(summary['cashback_sum'])
+        row.cashback_burn_date = str(summary['cashback_burn_date'] or '')[:32]
+        row.cashback_burn_sum = self._to_decimal(summary['cashback_burn_sum'])
+        row.total_crystals = self._to_decimal(summary['total_crystals'])
+        row.warnings = ','.join(summary['warnings'])[:255]
+        row.success = True
+        row.error_message = ''
+
+    @transaction.atomic
+    def _finalize_job(self, job: GuestProfileBatchJob) -> GuestProfileBatchJob:
+        counters = GuestProfileBatchResult.objects.filter(job=job).aggregate(
+            guests_found=Count('id', filter=Q(success=True)),
+            errors_count=Count('id', filter=Q(success=False)),
+        )
+        job.guests_found = counters['guests_found']
+        job.errors_count = counters['errors_count']
+        job.status = GuestProfileBatchJobStatus.COMPLETED
+        job.finished_at = timezone.now()
+        job.save(update_fields=['guests_found', 'errors_count', 'status', 'finished_at', 'updated_at'])
+        logger.info(
+            'guest_profile_batch_finished',
+            extra={'job_id': job.id, 'guests_found': job.guests_found, 'errors_count': job.errors_count},
+        )
+        return job
+
+    def _iter_phone_candidates(self, job: GuestProfileBatchJob) -> Iterator[str]:
+        if job.source_text:
+            yield from (part for part in re.split(r'[\n,;\t\r ]+', job.source_text) if part.strip())
+
+        if job.source_file and job.source_file.size:
+            with job.source_file.open('rb') as source:
+                yield from self._iter_phones_from_excel(source)
+
+    def _iter_phones_from_excel(self, source: BinaryIO) -> Iterator[str]:
+        """First non-empty cell of every row; a first row without digits is taken for a header."""
+        for row_number, values in iter_sheet_rows(source, all_sheets=True):
+            for cell in values:
+                if cell is None or str(cell).strip() == '':
+                    continue
+                value = str(int(cell)) if isinstance(cell, float) and cell.is_integer() else str(cell).strip()
+                if row_number == 1 and not any(ch.isdigit() for ch in value):
+                    break
+                yield value
+                break
+
+    def _to_decimal(self, value: Any) -> Optional[Decimal]:
+        if value is None or value == '':
+            return None
+        try:
+            return Decimal(str(value)).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            return None
@@ -3,18 +3,46 @@ from __future__ import annotations
 import logging
 from dataclasses import dataclass
 from datetime import date
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
 
 from guest_profile.services.external_guest_data_service import ExternalGuestDataService
 from guest_profile.services.mobile_activity_service import MobileActivityService
+from utils.cache import LayeredCache
+from utils.concurrency import run_bounded
+from utils.deadline import deadline
 
 logger = logging.getLogger(__name__)
 
+profile_block_cache = LayeredCache(
+    namespace='guest_profile_block',
+    local_maxsize=settings.GUEST_PROFILE_LOCAL_CACHE_SIZE,
+    local_ttl_seconds=settings.GUEST_PROFILE_LOCAL_CACHE_SECONDS,
+)
+
+CACHE_HIT = 'hit'
+CACHE_MISS = 'miss'
+
 
 class GuestNotFoundError(Exception):
     pass
 
 
+class GuestProfileUpstreamError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ProfileBlock:
+    key: str
+    warning_code: str
+    loader: Callable[[], Any]
+    default_value: Any
+    cache_key: str
+    ttl_seconds: int
+
+
 @dataclass(frozen=True)
 class GuestStatus:
     code: str
@@ -28,9 +56,15 @@ class GuestProfileService:
         self,
         external_service: Optional[ExternalGuestDataService] = None,
         mobile_activity_service: Optional[MobileActivityService] = None,
+        deadline_seconds: Optional[float] = None,
+        max_workers: Optional[int] = None,
     ) -> None:
         self.external_service = external_service or ExternalGuestDataService()
         self.mobile_activity_service = mobile_activity_service or MobileActivityService()
+        self.deadline_seconds = (
+            settings.GUEST_PROFILE_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+        )
+        self.max_workers = max_workers or settings.GUEST_PROFILE_MAX_WORKERS
 
     def get_profile_by_phone(
         self,
@@ -42,9 +76,41 @@ class GuestProfileService:
         mobile_events_limit: int,
         cashback_limit: int,
         crystal_limit: int,
+        refresh: bool = False,
+        mobile_exact_count: bool = False,
+    ) -> Dict[str, Any]:
+        # Every upstream call below shares one budget; blocks that run out of it degrade to warnings.
+        with deadline(self.deadline_seconds):
+            return self._build_profile(
+                normalized_phone=normalized_phone,
+                from_date=from_date,
+                to_date=to_date,
+                orders_limit=orders_limit,
+                mobile_events_limit=mobile_events_limit,
+                cashback_limit=cashback_limit,
+                crystal_limit=crystal_limit,
+                refresh=refresh,
+                mobile_exact_count=mobile_exact_count,
+            )
+
+    def _build_profile(
+        self,
+        *,
+        normalized_phone: str,
+        from_date: date,
+        to_date: date,
+        orders_limit: int,
+        mobile_events_limit: int,
+        cashback_limit: int,
+        crystal_limit: int,
+        refresh: bool,
+        mobile_exact_count: bool,
     ) -> Dict[str, Any]:
         warnings: List[str] = []
-        guest = self.external_service.find_guest_by_phone(normalized_phone)
+        try:
+            guest = self.external_service.resolve_guest(normalized_phone)
+        except Exception as exc:
+            raise GuestProfileUpstreamError('guest_lookup_unavailable') from exc
         if not guest:
             raise GuestNotFoundError('guest_not_found')
 
@@ -54,71 +120,81 @@ class GuestProfileService:
 
         logger.info('guest_profile_request_started', extra={'guest_id': guest_id})
 
-        guest_payload = self._safe_call(
+        history_ttl = settings.GUEST_PROFILE_HISTORY_CACHE_SECONDS
+        period = f'{from_date.isoformat()}:{to_date.isoformat()}'
+        # The blocks only need the guest id, so they run side by side: latency is the slowest call.
+        guest_block, cashback_block, crystal_block = self._summary_blocks(guest_id)
+        blocks, cache_status = self._load_blocks(
             warnings,
-            'guest_details_unavailable',
-            lambda: self.external_service.get_guest(guest_id),
-            default_value={},
+            [
+                guest_block,
+                ProfileBlock(
+                    key='purchase_history',
+                    warning_code='purchase_history_unavailable',
+                    loader=lambda: self.external_service.get_purchase_history(
+                        guest_id=guest_id,
+                        from_date=from_date,
+                        to_date=to_date,
+                        limit=orders_limit,
+                    ),
+                    default_value={'count': 0, 'results': []},
+                    cache_key=f'{guest_id}:purchase_history:{period}:{orders_limit}',
+                    ttl_seconds=history_ttl,
+                ),
+                cashback_block,
+                crystal_block,
+                ProfileBlock(
+                    key='cashback_history',
+                    warning_code='cashback_history_unavailable',
+                    loader=lambda: self.external_service.get_cashback_history(
+                        guest_id=guest_id,
+                        from_date=from_date,
+                        to_date=to_date,
+                        limit=cashback_limit,
+                    ),
+                    default_value={'count': 0, 'results': []},
+                    cache_key=f'{guest_id}:cashback_history:{period}:{cashback_limit}',
+                    ttl_seconds=history_ttl,
+                ),
+                ProfileBlock(
+                    key='crystal_history',
+                    warning_code='crystal_history_unavailable',
+                    loader=lambda: self.external_service.get_crystal_history(
+                        guest_id=guest_id,
+                        limit=crystal_limit,
+                    ),
+                    default_value={'count': 0, 'results': []},
+                    cache_key=f'{guest_id}:crystal_history:{crystal_limit}',
+                    ttl_seconds=history_ttl,
+                ),
+                ProfileBlock(
+                    key='mobile_activity',
+                    warning_code='mobile_activity_unavailable',
+                    loader=lambda: self.mobile_activity_service.get_activity_history(
+                        normalized_phone=normalized_phone,
+                        from_date=from_date,
+                        to_date=to_date,
+                        limit=mobile_events_limit,
+                        exact_count=mobile_exact_count,
+                    ),
+                    default_value={'count': 0, 'results': []},
+                    cache_key=(
+                        f'{guest_id}:mobile_activity:{normalized_phone}:{period}:{mobile_events_limit}'
+                        f':{int(mobile_exact_count)}'
+                    ),
+                    ttl_seconds=history_ttl,
+                ),
+            ],
+            refresh=refresh,
         )
+        guest_payload = blocks['guest']
         status = self._map_guest_status(guest_payload)
-
-        purchase_history = self._safe_call(
-            warnings,
-            'purchase_history_unavailable',
-            lambda: self.external_service.get_purchase_history(
-                guest_id=guest_id,
-                from_date=from_date,
-                to_date=to_date,
-                limit=orders_limit,
-            ),
-            default_value={'count': 0, 'results': []},
-        )
-
-        cashback_summary = self._safe_call(
-            warnings,
-            'cashback_summary_unavailable',
-            lambda: self.external_service.get_cashback_summary(guest_id=guest_id),
-            default_value={},
-        )
-        crystal_summary = self._safe_call(
-            warnings,
-            'crystal_summary_unavailable',
-            lambda: self.external_service.get_crystal_summary(guest_id=guest_id),
-            default_value={},
-        )
-
-        cashback_history = self._safe_call(
-            warnings,
-            'cashback_history_unavailable',
-            lambda: self.external_service.get_cashback_history(
-                guest_id=guest_id,
-                from_date=from_date,
-                to_date=to_date,
-                limit=cashback_limit,
-            ),
-            default_value={'count': 0, 'results': []},
-        )
-        crystal_history = self._safe_call(
-            warnings,
-            'crystal_history_unavailable',
-            lambda: self.external_service.get_crystal_history(
-                guest_id=guest_id,
-                limit=crystal_limit,
-            ),
-            default_value={'count': 0, 'results': []},
-        )
-
-        mobile_activity = self._safe_call(
-            warnings,
-            'mobile_activity_unavailable',
-            lambda: self.mobile_activity_service.get_activity_history(
-                normalized_phone=normalized_phone,
-                from_date=from_date,
-                to_date=to_date,
-                limit=mobile_events_limit,
-            ),
-            default_value={'count': 0, 'results': []},
-        )
+        purchase_history = blocks['purchase_history']
+        cashback_summary = blocks['cashback_summary']
+        crystal_summary = blocks['crystal_summary']
+        cashback_history = blocks['cashback_history']
+        crystal_history = blocks['crystal_history']
+        mobile_activity = blocks['mobile_activity']
 
         response = {
             'phone': normalized_phone,
@@ -147,6 +223,7 @@ class GuestProfileService:
             'crystal_history': crystal_history,
             'mobile_activity': mobile_activity,
             'warnings': warnings,
+            'cache': {'refresh': refresh, 'blocks': cache_status},
         }
 
         logger.info(
@@ -160,19 +237,100 @@ class GuestProfileService:
 
         return response
 
-    def _safe_call(
+    def get_summary(self, *, guest_id: int, refresh: bool = False) -> Dict[str, Any]:
+        """Compact status and balances of a resolved guest, used by batch profile jobs.
+
+        Reads the same cached blocks as the full profile and runs under its own deadline.
+        """
+        warnings: List[str] = []
+        with deadline(self.deadline_seconds):
+            blocks, _ = self._load_blocks(warnings, list(self._summary_blocks(guest_id)), refresh=refresh)
+
+        guest_payload = blocks['guest']
+        cashback_summary = blocks['cashback_summary']
+        status = self._map_guest_status(guest_payload)
+        return {
+            'guest_id': guest_id,
+            'name': str(guest_payload.get('name') or '').strip(),
+            'status_code': status.code,
+            'is_blocked': status.is_blocked,
+            'cashback_sum': cashback_summary.get('sum'),
+            'cashback_burn_date': cashback_summary.get('burn_date'),
+            'cashback_burn_sum': cashback_summary.get('burn_sum'),
+            'total_crystals': blocks['crystal_summary'].get('total_crystals'),
+            'warnings': warnings,
+        }
+
+    def _summary_blocks(self, guest_id: int) -> Tuple[ProfileBlock, ProfileBlock, ProfileBlock]:
+        summary_ttl = settings.GUEST_PROFILE_SUMMARY_CACHE_SECONDS
+        return (
+            ProfileBlock(
+                key='guest',
+                warning_code='guest_details_unavailable',
+                loader=lambda: self.external_service.get_guest(guest_id),
+                default_value={},
+                cache_key=f'{guest_id}:guest',
+                ttl_seconds=summary_ttl,
+            ),
+            ProfileBlock(
+                key='cashback_summary',
+                warning_code='cashback_summary_unavailable',
+                loader=lambda: self.external_service.get_cashback_summary(guest_id=guest_id),
+                default_value={},
+                cache_key=f'{guest_id}:cashback_summary',
+                ttl_seconds=summary_ttl,
+            ),
+            ProfileBlock(
+                key='crystal_summary',
+                warning_code='crystal_summary_unavailable',
+                loader=lambda: self.external_service.get_crystal_summary(guest_id=guest_id),
+                default_value={},
+                cache_key=f'{guest_id}:crystal_summary',
+                ttl_seconds=summary_ttl,
+            ),
+        )
+
+    def _load_blocks(
         self,
         warnings: List[str],
-        warning_code: str,
-        loader: Callable[[], Any],
-        default_value: Any,
-    ) -> Any:
-        try:
-            return loader()
-        except Exception:
-            warnings.append(warning_code)
-            logger.exception('guest_profile_block_failed', extra={'warning_code': warning_code})
-            return default_value
+        blocks: List[ProfileBlock],
+        *,
+        refresh: bool,
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Serve blocks from the block cache and load the rest on a bounded pool.
+
+        Returns block values and their cache status. ``refresh`` skips cache reads but still stores
+        fresh values. A failed block yields its default and a warning and is not cached. Workers
+        inherit the request deadline, so every upstream call still shares the total budget.
+        Warnings keep the block order, whatever order the calls finish in.
+        """
+        cached = {} if refresh else profile_block_cache.get_many(block.cache_key for block in blocks)
+        values: Dict[str, Any] = {}
+        cache_status: Dict[str, str] = {}
+        pending: List[ProfileBlock] = []
+        for block in blocks:
+            if block.cache_key in cached:
+                values[block.key] = cached[block.cache_key]
+                cache_status[block.key] = CACHE_HIT
+            else:
+                cache_status[block.key] = CACHE_MISS
+                pending.append(block)
+
+        outcomes = run_bounded(lambda block: block.loader(), pending, max_workers=self.max_workers)
+        for outcome in outcomes:
+            block = outcome.item
+            if outcome.ok:
+                values[block.key] = outcome.value
+                profile_block_cache.set(block.cache_key, outcome.value, block.ttl_seconds)
+                continue
+            warnings.append(block.warning_code)
+            logger.error(
+                'guest_profile_block_failed',
+                extra={'warning_code': block.warning_code},
+                exc_info=outcome.error,
+            )
+            values[block.key] = block.default_value
+        return values, cache_status
 
     def _extract_guest_id(self, guest: Dict[str, Any]) -> int:
         raw = guest.get('id') or guest.get('guest_id')
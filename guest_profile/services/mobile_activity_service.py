@@ -3,10 +3,8 @@ from __future__ import annotations
 from datetime import date
 from typing import Any, Dict, List, Optional
 
-from django.db.models import Q
-
 from amplitude.models import MobileSession
-from guest_profile.services.phone_utils import phone_search_variants
+from guest_profile.services.phone_utils import normalize_phone_number
 
 
 class MobileActivityService:
@@ -20,18 +18,25 @@ class MobileActivityService:
         from_date: date,
         to_date: date,
         limit: int,
+        exact_count: bool = False,
     ) -> Dict[str, Any]:
-        variants = phone_search_variants(normalized_phone)
-        if not variants:
-            return {'count': 0, 'results': []}
+        """Latest sessions of one phone, read as a range of the ``(phone_normalized, event_time)`` index.
 
-        phone_filter = Q()
-        for variant in variants:
-            phone_filter |= Q(phone_number__icontains=variant)
+        One row past ``limit`` is fetched to tell whether more exist. The full count is only queried
+        when ``exact_count`` is set; otherwise ``count`` is a lower bound and ``count_exact`` is False.
+        """
+        normalized = normalize_phone_number(normalized_phone)
+        if not normalized:
+            return {'count': 0, 'count_exact': True, 'has_more': False, 'results': []}
 
-        base_qs = self.model.objects.filter(date__gte=from_date, date__lte=to_date).filter(phone_filter)
-        total_count = base_qs.count()
-        rows = base_qs.order_by('-event_time')[:limit]
+        base_qs = self.model.objects.filter(
+            phone_normalized=normalized,
+            date__gte=from_date,
+            date__lte=to_date,
+        )
+        rows = list(base_qs.order_by('-event_time')[: limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
 
         results: List[Dict[str, Optional[str]]] = []
         for row in rows:
@@ -47,7 +52,14 @@ class MobileActivityService:
                 }
             )
 
+        if has_more and exact_count:
+            total_count = base_qs.count()
+        else:
+            total_count = len(results)
+
         return {
             'count': total_count,
+            'count_exact': exact_count or not has_more,
+            'has_more': has_more,
             'results': results,
         }
@@ -0,0 +1,19 @@
+import logging
+
+from billiard.exceptions import SoftTimeLimitExceeded
+from celery import shared_task
+
+from guest_profile.services.guest_profile_batch_service import GuestProfileBatchService
+
+logger = logging.getLogger(__name__)
+
+
+# The service marks the job failed on errors; partial results stay readable through the results endpoint.
+@shared_task(bind=True, soft_time_limit=3600, time_limit=3660)
+def process_guest_profile_batch_job(self, job_id: int):
+    logger.info('task_started', extra={'job_id': job_id})
+    try:
+        GuestProfileBatchService().process_job(job_id)
+    except SoftTimeLimitExceeded:
+        logger.exception('task_soft_time_limit_exceeded', extra={'job_id': job_id})
+        return {'job_id': job_id, 'status': 'failed', 'reason': 'timeout'}
@@ -1,7 +1,27 @@
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.cache import cache
 from django.test import SimpleTestCase
+from django.utils import timezone
 
+from amplitude.models import MobileSession
+from guest_profile.models import GuestProfileBatchJob, GuestProfileBatchResult
 from guest_profile.serializers import GuestProfileQuerySerializer
-from guest_profile.services.guest_profile_service import GuestProfileService
+from guest_profile.services.external_guest_data_service import ExternalGuestDataService
+from guest_profile.services.guest_profile_batch_service import PHONE_LIMIT_ERROR, GuestProfileBatchService
+from guest_profile.services.guest_phone_cache import GuestPhoneCacheService, guest_phone_cache, visit_guest_id
+from guest_profile.services.guest_profile_service import (
+	GuestProfileService,
+	GuestProfileUpstreamError,
+	profile_block_cache,
+)
+from guest_profile.services.mobile_activity_service import MobileActivityService
+from utils.deadline import remaining_seconds
+from utils.job_checkpoint import SeedStats
 
 
 class GuestProfileQuerySerializerTests(SimpleTestCase):
@@ -28,11 +48,16 @@ class GuestProfileQuerySerializerTests(SimpleTestCase):
 
 
 class _FakeExternalGuestDataService:
-	def __init__(self, *, black_list=2, fail_purchase=False):
+	def __init__(self, *, black_list=2, fail_purchase=False, fail_lookup=False):
 		self.black_list = black_list
 		self.fail_purchase = fail_purchase
+		self.fail_lookup = fail_lookup
+		self.lookup_budget = None
 
-	def find_guest_by_phone(self, normalized_phone):
+	def resolve_guest(self, normalized_phone):
+		if self.fail_lookup:
+			raise ValueError('upstream failed')
+		self.lookup_budget = remaining_seconds()
 		return {'id': 123, 'name': 'Test Guest'}
 
 	def get_guest(self, guest_id):
@@ -56,12 +81,44 @@ class _FakeExternalGuestDataService:
 		return {'count': 0, 'results': []}
 
 
+class _SlowExternalGuestDataService(_FakeExternalGuestDataService):
+	def __init__(self, **kwargs):
+		super().__init__(**kwargs)
+		self.active = 0
+		self.max_active = 0
+		self.block_budgets = []
+		self.lock = threading.Lock()
+
+	def _slow(self, result):
+		with self.lock:
+			self.active += 1
+			self.max_active = max(self.max_active, self.active)
+			self.block_budgets.append(remaining_seconds())
+		time.sleep(0.05)
+		with self.lock:
+			self.active -= 1
+		return result
+
+	def get_guest(self, guest_id):
+		return self._slow(super().get_guest(guest_id))
+
+	def get_purchase_history(self, **kwargs):
+		return self._slow(super().get_purchase_history(**kwargs))
+
+	def get_cashback_history(self, **kwargs):
+		return self._slow(super().get_cashback_history(**kwargs))
+
+
 class _FakeMobileActivityService:
 	def get_activity_history(self, **kwargs):
 		return {'count': 2, 'results': [{'event_type': 'open_home'}, {'event_type': 'open_profile'}]}
 
 
 class GuestProfileServiceTests(SimpleTestCase):
+	def setUp(self):
+		profile_block_cache.clear_local()
+		cache.clear()
+
 	def test_maps_blocked_status(self):
 		service = GuestProfileService(
 			external_service=_FakeExternalGuestDataService(black_list=1),
@@ -100,7 +157,326 @@ class GuestProfileServiceTests(SimpleTestCase):
 		self.assertIn('purchase_history_unavailable', payload['warnings'])
 		self.assertEqual(payload['purchase_history']['count'], 0)
 
+	def test_runs_upstream_calls_within_deadline(self):
+		external_service = _FakeExternalGuestDataService()
+		service = GuestProfileService(
+			external_service=external_service,
+			mobile_activity_service=_FakeMobileActivityService(),
+			deadline_seconds=5,
+		)
+
+		service.get_profile_by_phone(
+			normalized_phone='77071234567',
+			from_date=self._date('2026-01-01'),
+			to_date=self._date('2026-01-02'),
+			orders_limit=20,
+			mobile_events_limit=50,
+			cashback_limit=50,
+			crystal_limit=50,
+		)
+
+		self.assertIsNotNone(external_service.lookup_budget)
+		self.assertLessEqual(external_service.lookup_budget, 5)
+		self.assertIsNone(remaining_seconds())
+
+	def test_blocks_run_concurrently_within_the_deadline_and_keep_warning_order(self):
+		external_service = _SlowExternalGuestDataService(fail_purchase=True)
+		service = GuestProfileService(
+			external_service=external_service,
+			mobile_activity_service=_FakeMobileActivityService(),
+			deadline_seconds=5,
+		)
+
+		payload = service.get_profile_by_phone(
+			normalized_phone='77071234567',
+			from_date=self._date('2026-01-01'),
+			to_date=self._date('2026-01-02'),
+			orders_limit=20,
+			mobile_events_limit=50,
+			cashback_limit=50,
+			crystal_limit=50,
+		)
+
+		self.assertGreater(external_service.max_active, 1)
+		self.assertEqual(len(external_service.block_budgets), 2)
+		self.assertTrue(all(budget is not None and budget <= 5 for budget in external_service.block_budgets))
+		self.assertEqual(payload['warnings'], ['purchase_history_unavailable'])
+		self.assertEqual(payload['guest']['status']['code'], 'active')
+
+	def test_repeated_views_are_served_from_block_cache_until_refresh(self):
+		external_service = _SlowExternalGuestDataService(fail_purchase=True)
+		service = GuestProfileService(
+			external_service=external_service,
+			mobile_activity_service=_FakeMobileActivityService(),
+		)
+		params = {
+			'normalized_phone': '77071234567',
+			'from_date': self._date('2026-01-01'),
+			'to_date': self._date('2026-01-02'),
+			'orders_limit': 20,
+			'mobile_events_limit': 50,
+			'cashback_limit': 50,
+			'crystal_limit': 50,
+		}
+
+		first = service.get_profile_by_phone(**params)
+		second = service.get_profile_by_phone(**params)
+		wider = service.get_profile_by_phone(**{**params, 'orders_limit': 10})
+		refreshed = service.get_profile_by_phone(**params, refresh=True)
+
+		self.assertEqual(set(first['cache']['blocks'].values()), {'miss'})
+		self.assertEqual(second['cache']['blocks']['guest'], 'hit')
+		self.assertEqual(second['cache']['blocks']['cashback_history'], 'hit')
+		self.assertEqual(second['cache']['blocks']['purchase_history'], 'miss')
+		self.assertEqual(second['warnings'], ['purchase_history_unavailable'])
+		self.assertEqual(wider['cache']['blocks']['cashback_history'], 'hit')
+		self.assertTrue(refreshed['cache']['refresh'])
+		self.assertEqual(set(refreshed['cache']['blocks'].values()), {'miss'})
+		self.assertEqual(len(external_service.block_budgets), 4)
+
+	def test_raises_upstream_error_when_guest_lookup_fails(self):
+		service = GuestProfileService(
+			external_service=_FakeExternalGuestDataService(fail_lookup=True),
+			mobile_activity_service=_FakeMobileActivityService(),
+		)
+
+		with self.assertRaises(GuestProfileUpstreamError):
+			service.get_profile_by_phone(
+				normalized_phone='77071234567',
+				from_date=self._date('2026-01-01'),
+				to_date=self._date('2026-01-02'),
+				orders_limit=20,
+				mobile_events_limit=50,
+				cashback_limit=50,
+				crystal_limit=50,
+			)
+
 	def _date(self, value: str):
 		from datetime import datetime
 
 		return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class _FakeGuestSearchClient:
+	def __init__(self, guests):
+		self.guests = guests
+		self.lookups = []
+
+	def find_guest_by_phone(self, phone):
+		self.lookups.append(phone)
+		return self.guests.get(phone)
+
+
+class GuestPhoneCacheTests(SimpleTestCase):
+	def setUp(self):
+		guest_phone_cache.clear_local()
+		cache.clear()
+
+	def test_persisted_mappings_are_loaded_once_and_served_from_front_cache(self):
+		service = GuestPhoneCacheService(ttl_seconds=3600, shared_ttl_seconds=600)
+		expires_at = timezone.now() + timedelta(hours=1)
+		with patch.object(service, '_load_persisted', return_value={'77071234567': (55, expires_at)}) as load_mock:
+			self.assertEqual(service.get_many(['8 707 123 45 67', '77070000000']), {'77071234567': 55})
+			self.assertEqual(service.get_guest_id('+7 707 123 45 67'), 55)
+
+		load_mock.assert_called_once_with(['77071234567', '77070000000'])
+
+	def test_mappings_near_expiry_are_not_pushed_to_front_cache(self):
+		service = GuestPhoneCacheService(ttl_seconds=3600, shared_ttl_seconds=600)
+		expires_at = timezone.now() + timedelta(seconds=60)
+		with patch.object(service, '_load_persisted', return_value={'77071234567': (55, expires_at)}) as load_mock:
+			service.get_many(['77071234567'])
+			service.get_many(['77071234567'])
+
+		self.assertEqual(load_mock.call_count, 2)
+
+	def test_remember_many_skips_invalid_pairs_and_survives_store_failure(self):
+		service = GuestPhoneCacheService()
+		with patch.object(service, '_store', side_effect=RuntimeError('db down')) as store_mock:
+			stored = service.remember_many([('87071234567', '55'), ('bad', 1), ('77070000000', None), ('77071234567', 56)])
+
+		self.assertEqual(stored, 1)
+		store_mock.assert_called_once()
+		self.assertEqual(store_mock.call_args.args[0], {'77071234567': 56})
+		with patch.object(service, '_load_persisted') as load_mock:
+			self.assertEqual(service.get_guest_id('77071234567'), 56)
+		load_mock.assert_not_called()
+
+	def test_visit_guest_id_reads_guest_keys_only(self):
+		self.assertEqual(visit_guest_id({'id': 'visit-1', 'guest': {'id': 7}}), 7)
+		self.assertEqual(visit_guest_id({'id': 'visit-1', 'guest_id': '8'}), 8)
+		self.assertIsNone(visit_guest_id({'id': 9}))
+
+	def test_resolve_guest_ids_searches_only_uncached_phones(self):
+		client = _FakeGuestSearchClient({'77070000002': {'id': 2}})
+		guest_cache = GuestPhoneCacheService()
+		service = ExternalGuestDataService(avatariya_client=client, guest_cache=guest_cache)
+		with patch.object(guest_cache, '_load_persisted', return_value={}), patch.object(guest_cache, '_store') as store_mock:
+			guest_cache.remember_many([('77070000001', 1)])
+			resolved = service.resolve_guest_ids(['77070000001', '77070000002', '77070000003'], max_workers=2)
+
+		self.assertEqual(resolved, {'77070000001': 1, '77070000002': 2})
+		self.assertEqual(sorted(client.lookups), ['77070000002', '77070000003'])
+		self.assertEqual(store_mock.call_args.args[0], {'77070000002': 2})
+		self.assertEqual(service.resolve_guest('77070000002'), {'id': 2})
+
+
+class _FakeSessionQuerySet:
+	def __init__(self, rows):
+		self.rows = rows
+		self.filters = {}
+		self.count_calls = 0
+
+	def filter(self, **kwargs):
+		self.filters.update(kwargs)
+		return self
+
+	def order_by(self, *fields):
+		return self
+
+	def __getitem__(self, item):
+		return self.rows[item]
+
+	def count(self):
+		self.count_calls += 1
+		return len(self.rows)
+
+
+class _FakeSessionModel:
+	def __init__(self, rows):
+		self.objects = _FakeSessionQuerySet(rows)
+
+
+class MobileActivityServiceTests(SimpleTestCase):
+	def _rows(self, count):
+		return [
+			MobileSession(event_time=timezone.now(), event_type=f'event_{index}', phone_number='8 707 123 45 67')
+			for index in range(count)
+		]
+
+	def _history(self, model, **kwargs):
+		return MobileActivityService(model=model).get_activity_history(
+			normalized_phone='+7 707 123 45 67',
+			from_date=timezone.localdate(),
+			to_date=timezone.localdate(),
+			**kwargs,
+		)
+
+	def test_filters_by_exact_normalized_phone_and_skips_count_when_page_is_partial(self):
+		model = _FakeSessionModel(self._rows(2))
+		payload = self._history(model, limit=5)
+
+		self.assertEqual(model.objects.filters['phone_normalized'], '77071234567')
+		self.assertEqual((payload['count'], payload['count_exact'], payload['has_more']), (2, True, False))
+		self.assertEqual(model.objects.count_calls, 0)
+
+	def test_count_is_a_lower_bound_unless_exact_count_is_requested(self):
+		model = _FakeSessionModel(self._rows(4))
+		payload = self._history(model, limit=3)
+
+		self.assertEqual(len(payload['results']), 3)
+		self.assertEqual((payload['count'], payload['count_exact'], payload['has_more']), (3, False, True))
+		self.assertEqual(model.objects.count_calls, 0)
+
+		payload = self._history(model, limit=3, exact_count=True)
+		self.assertEqual((payload['count'], payload['count_exact']), (4, True))
+		self.assertEqual(model.objects.count_calls, 1)
+
+	def test_fill_phone_normalized_matches_lookup_normalization(self):
+		session = MobileSession(phone_number='8 (707) 123-45-67')
+		session.fill_phone_normalized()
+		self.assertEqual(session.phone_normalized, '77071234567')
+
+
+class _FakeBatchGuestCache:
+	def __init__(self, cached):
+		self.cached = cached
+		self.remembered = []
+
+	def get_many(self, phones):
+		return {phone: self.cached[phone] for phone in phones if phone in self.cached}
+
+	def remember_many(self, pairs, *, source):
+		self.remembered.extend(pairs)
+		return len(self.remembered)
+
+
+class _FakeBatchExternalService(_FakeExternalGuestDataService):
+	def __init__(self, *, cached, guests):
+		super().__init__()
+		self.guest_cache = _FakeBatchGuestCache(cached)
+		self.guests = guests
+		self.lookups = []
+
+	def lookup_guest_id(self, normalized_phone):
+		self.lookups.append(normalized_phone)
+		guest_id = self.guests.get(normalized_phone)
+		if isinstance(guest_id, Exception):
+			raise guest_id
+		return guest_id
+
+
+class _FakeProgress:
+	def __init__(self):
+		self.records = []
+
+	def record(self, ok):
+		self.records.append(ok)
+
+
+class GuestProfileBatchServiceTests(SimpleTestCase):
+	def setUp(self):
+		profile_block_cache.clear_local()
+		cache.clear()
+
+	def _service(self, external_service, **kwargs):
+		return GuestProfileBatchService(
+			external_service=external_service,
+			profile_service=GuestProfileService(external_service=external_service),
+			**kwargs,
+		)
+
+	def test_batch_resolves_uncached_phones_and_fills_compact_summaries(self):
+		external_service = _FakeBatchExternalService(
+			cached={'77070000001': 11},
+			guests={'77070000002': 12, '77070000003': None, '77070000004': RuntimeError('search down')},
+		)
+		rows = [GuestProfileBatchResult(phone_normalized=f'7707000000{index}') for index in range(1, 5)]
+		progress = _FakeProgress()
+
+		self._service(external_service, max_workers=3)._summarize_batch(rows, refresh=False, progress=progress)
+
+		self.assertEqual(sorted(external_service.lookups), ['77070000002', '77070000003', '77070000004'])
+		self.assertEqual(external_service.guest_cache.remembered, [('77070000002', 12)])
+		self.assertEqual([row.guest_id for row in rows], [11, 12, None, None])
+		self.assertEqual(
+			[row.error_message for row in rows],
+			['', '', 'guest_not_found', 'guest_lookup_unavailable'],
+		)
+		self.assertEqual(
+			(rows[0].status_code, rows[0].cashback_sum, rows[0].total_crystals),
+			('active', Decimal('10.00'), Decimal('5.00')),
+		)
+		self.assertEqual(sorted(progress.records), [False, False, True, True])
+
+	def test_seed_rows_skip_duplicates_reject_invalid_phones_and_respect_the_limit(self):
+		job = GuestProfileBatchJob(source_text='87070000001, 77070000001\nabc 77070000002 77070000003')
+		service = GuestProfileBatchService(external_service=object(), profile_service=object(), max_phones=2)
+		seed_stats = SeedStats()
+		rows = list(service._iter_seed_results(job=job, stats=seed_stats))
+
+		self.assertEqual([row.phone_normalized for row in rows], ['77070000001', '', '77070000002'])
+		self.assertEqual(rows[1].error_message, 'invalid_phone_format')
+		self.assertEqual((seed_stats.total_phones, seed_stats.unique_phones, seed_stats.rejected), (5, 2, 1))
+		self.assertEqual(job.error_log, PHONE_LIMIT_ERROR)
+
+	def test_summary_reuses_profile_block_cache(self):
+		external_service = _FakeExternalGuestDataService(black_list=1)
+		service = GuestProfileService(external_service=external_service)
+		with patch.object(external_service, 'get_guest', wraps=external_service.get_guest) as get_guest_mock:
+			first = service.get_summary(guest_id=7)
+			second = service.get_summary(guest_id=7)
+
+		self.assertEqual(first, second)
+		self.assertTrue(first['is_blocked'])
+		get_guest_mock.assert_called_once_with(7)
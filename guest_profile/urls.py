@@ -1,7 +1,12 @@
-from django.urls import path
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
 
-from guest_profile.views import GuestProfileByPhoneView
+from guest_profile.views import GuestProfileBatchJobViewSet, GuestProfileByPhoneView
+
+router = DefaultRouter()
+router.register('jobs', GuestProfileBatchJobViewSet, basename='guest-profile-batch-jobs')
 
 urlpatterns = [
     path('guest-profile/by-phone/', GuestProfileByPhoneView.as_view(), name='guest-profile-by-phone'),
+    path('guest-profile/batch/', include(router.urls)),
 ]
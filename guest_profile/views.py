@@ -1,11 +1,38 @@
-from rest_framework import status
+import logging
+
+from django.shortcuts import get_object_or_404
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from guest_profile.models import GuestProfileBatchJob, GuestProfileBatchResult
 from guest_profile.permissions import HasGuestProfileAccess
-from guest_profile.serializers import GuestProfileQuerySerializer
-from guest_profile.services.guest_profile_service import GuestNotFoundError, GuestProfileService
+from guest_profile.serializers import (
+	GuestProfileBatchJobCreateSerializer,
+	GuestProfileBatchJobSerializer,
+	GuestProfileBatchResultSerializer,
+	GuestProfileQuerySerializer,
+)
+from guest_profile.services.guest_profile_batch_service import GuestProfileBatchService
+from guest_profile.services.guest_profile_service import (
+	GuestNotFoundError,
+	GuestProfileService,
+	GuestProfileUpstreamError,
+)
+from guest_profile.tasks import process_guest_profile_batch_job
+from utils.job_results import JobResultCursorPagination, export_job_results, filter_job_results
+
+logger = logging.getLogger(__name__)
+
+
+class GuestProfileGatewayUnavailable(APIException):
+	status_code = status.HTTP_502_BAD_GATEWAY
+	default_detail = 'Guest profile service is temporarily unavailable.'
+	default_code = 'guest_profile_gateway_unavailable'
 
 
 class GuestProfileByPhoneView(APIView):
@@ -26,8 +53,62 @@ class GuestProfileByPhoneView(APIView):
 				mobile_events_limit=data['mobile_events_limit'],
 				cashback_limit=data['cashback_limit'],
 				crystal_limit=data['crystal_limit'],
+				refresh=data['refresh'],
+				mobile_exact_count=data['mobile_exact_count'],
 			)
 		except GuestNotFoundError:
 			return Response({'detail': 'guest_not_found'}, status=status.HTTP_404_NOT_FOUND)
+		except GuestProfileUpstreamError as exc:
+			logger.exception('guest_profile_lookup_failed')
+			raise GuestProfileGatewayUnavailable() from exc
 
 		return Response(payload)
+
+
+class GuestProfileBatchJobViewSet(viewsets.ViewSet):
+	"""Many-phone profile lookups: results can be paged or exported while the job is still running."""
+
+	permission_classes = [IsAuthenticated, HasGuestProfileAccess]
+	parser_classes = [MultiPartParser, FormParser, JSONParser]
+
+	def list(self, request):
+		queryset = GuestProfileBatchJob.objects.select_related('initiated_by').order_by('-created_at')[:100]
+		return Response(GuestProfileBatchJobSerializer(queryset, many=True).data)
+
+	def create(self, request):
+		serializer = GuestProfileBatchJobCreateSerializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		data = serializer.validated_data
+
+		job = GuestProfileBatchService().create_job(
+			initiated_by=request.user,
+			phones_text=data.get('phones_text') or '',
+			excel_file=data.get('excel_file'),
+			refresh=data['refresh'],
+		)
+		process_guest_profile_batch_job.delay(job.id)
+		return Response(GuestProfileBatchJobSerializer(job).data, status=status.HTTP_201_CREATED)
+
+	def retrieve(self, request, pk=None):
+		job = get_object_or_404(GuestProfileBatchJob.objects.select_related('initiated_by'), pk=pk)
+		return Response(GuestProfileBatchJobSerializer(job).data)
+
+	@action(detail=True, methods=['get'])
+	def results(self, request, pk=None):
+		job = get_object_or_404(GuestProfileBatchJob, pk=pk)
+		queryset = filter_job_results(GuestProfileBatchResult.objects.filter(job=job), request.query_params)
+		paginator = JobResultCursorPagination()
+		page = paginator.paginate_queryset(queryset, request, view=self)
+		serializer = GuestProfileBatchResultSerializer(page, many=True)
+		return paginator.get_paginated_response(serializer.data)
+
+	@action(detail=True, methods=['get'], url_path='results/export')
+	def export_results(self, request, pk=None):
+		job = get_object_or_404(GuestProfileBatchJob, pk=pk)
+		queryset = filter_job_results(GuestProfileBatchResult.objects.filter(job=job), request.query_params)
+		return export_job_results(
+			queryset,
+			fields=GuestProfileBatchResultSerializer.Meta.fields,
+			filename=f'guest_profiles_{job.id}',
+			file_format=request.query_params.get('file_format', 'csv'),
+		)
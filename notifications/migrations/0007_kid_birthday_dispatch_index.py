@@ -0,0 +1,17 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_pushdispatchlog'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='kidbirthdaynotification',
+            index=models.Index(fields=['notification_type', 'schedule_date', 'sent', 'guest_id'], name='idx_kidbd_type_date_sent_guest'),
+        ),
+    ]
@@ -90,6 +90,12 @@ class KidBirthdayNotification(models.Model):
 				name='uniq_kid_birthday_notification_once_per_day',
 			),
 		]
+		indexes = [
+			models.Index(
+				fields=('notification_type', 'schedule_date', 'sent', 'guest_id'),
+				name='idx_kidbd_type_date_sent_guest',
+			),
+		]
 		ordering = ('sent', 'scheduled_for', 'id')
 		verbose_name = 'Очередь уведомления о ДР ребенка'
 		verbose_name_plural = 'Очередь уведомлений о ДР детей'
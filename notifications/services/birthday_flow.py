@@ -1,13 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import logging
+from dataclasses import dataclass, field
 from datetime import date, datetime
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
-from django.db import connection
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
 from django.utils import timezone
 from zoneinfo import ZoneInfo
 
+from guest_profile.models import GuestPhoneSource
+from guest_profile.services.guest_phone_cache import GuestPhoneCacheService
 from notifications.choices import NotificationType
 from notifications.models import (
     KidBirthdayNotification,
@@ -16,10 +21,43 @@ from notifications.models import (
     StoryRecipientConfig,
 )
 from utils.avatariya_client import AvatariyaClient
-from utils.mobile_client import MobileClient
+from utils.cache import LayeredCache
+from utils.concurrency import run_bounded
+from utils.mobile_client import MobileAPIError, MobileClient
+
+logger = logging.getLogger(__name__)
 
 ALMATY_TZ = ZoneInfo('Asia/Almaty')
 
+story_config_cache = LayeredCache(
+    namespace='story_recipient_config',
+    local_maxsize=32,
+    local_ttl_seconds=settings.STORY_CONFIG_LOCAL_CACHE_SECONDS,
+)
+QUEUE_UPSERT_BATCH_SIZE = 500
+QUEUE_UPSERT_FIELDS = [
+    'birthday_date',
+    'kid_name',
+    'guest_id',
+    'guest_phone',
+    'scheduled_for',
+    'kid_payload',
+    'guest_payload',
+    'updated_at',
+]
+SENT_UPDATE_FIELDS = [
+    'sent',
+    'sent_at',
+    'guest_phone',
+    'guest_payload',
+    'story_created',
+    'external_story_id',
+    'last_error',
+    'processing_started_at',
+    'updated_at',
+]
+FAILED_UPDATE_FIELDS = ['last_error', 'processing_started_at', 'updated_at']
+
 
 @dataclass(frozen=True)
 class CollectResult:
@@ -28,19 +66,47 @@ class CollectResult:
     skipped: int
 
 
-@dataclass(frozen=True)
-class RecipientDispatchResult:
-    resolved_phone: str
-    guest_payload: Dict[str, Any]
-    story_created: bool
-    external_story_id: Optional[int]
-    last_error: str
+@dataclass
+class RecipientGroup:
+    """Claimed queue rows of one recipient and the outcome written back to all of them."""
+
+    rows: list[KidBirthdayNotification]
+    item: KidBirthdayNotification
+    phone: str = ''
+    guest_payload: Dict[str, Any] = field(default_factory=dict)
+    story_created: bool = False
+    external_story_id: Optional[int] = None
+    last_error: str = ''
+    sent_at: Optional[datetime] = None
+    error: str = ''
+    pushed: bool = False
+
+    def copy_from(self, existing: KidBirthdayNotification) -> None:
+        self.phone = existing.guest_phone
+        self.guest_payload = existing.guest_payload
+        self.story_created = existing.story_created
+        self.external_story_id = existing.external_story_id
+        self.last_error = existing.last_error
+        self.sent_at = existing.sent_at
 
 
 class KidBirthdayFlowService:
-    def __init__(self) -> None:
-        self.avatariya_client = AvatariyaClient()
-        self.mobile_client = MobileClient()
+    def __init__(
+        self,
+        *,
+        avatariya_client: Optional[AvatariyaClient] = None,
+        mobile_client: Optional[MobileClient] = None,
+        guest_cache: Optional[GuestPhoneCacheService] = None,
+        guest_fetch_workers: Optional[int] = None,
+        push_chunk_size: Optional[int] = None,
+        story_workers: Optional[int] = None,
+    ) -> None:
+        self.avatariya_client = avatariya_client or AvatariyaClient()
+        self.mobile_client = mobile_client or MobileClient()
+        self.guest_cache = guest_cache or GuestPhoneCacheService()
+        self.guest_fetch_workers = guest_fetch_workers or settings.BIRTHDAY_GUEST_FETCH_WORKERS
+        self.push_chunk_size = max(1, push_chunk_size or settings.BIRTHDAY_PUSH_CHUNK_SIZE)
+        self.story_workers = story_workers or settings.BIRTHDAY_STORY_RECIPIENT_WORKERS
 
     def collect_due_birthdays(self, notification_type: str = NotificationType.HB_KIDS) -> CollectResult:
         schedule = NotificationSchedule.objects.filter(notification_type=notification_type, enabled=True).first()
@@ -73,67 +139,143 @@ class KidBirthdayFlowService:
 
         scheduled_for_local = datetime.combine(today, schedule.send_time, tzinfo=ALMATY_TZ)
 
-        created = 0
-        updated = 0
-        skipped = 0
-        latest_queue_created_at = None
+        queue_rows, skipped = self._build_queue_rows(
+            kids,
+            notification_type=notification_type,
+            schedule_date=today,
+            scheduled_for=scheduled_for_local,
+        )
+        created, updated, latest_queue_created_at = self._upsert_queue_rows(
+            queue_rows,
+            notification_type=notification_type,
+            schedule_date=today,
+        )
 
+        schedule.last_checked_at = check_started_at
+        if latest_queue_created_at is not None:
+            schedule.last_queue_entry_created_at = latest_queue_created_at
+        schedule.save(update_fields=['last_checked_at', 'last_queue_entry_created_at', 'updated_at'])
+
+        return CollectResult(created=created, updated=updated, skipped=skipped)
+
+    def _build_queue_rows(
+        self,
+        kids: Iterable[Dict[str, Any]],
+        *,
+        notification_type: str,
+        schedule_date: date,
+        scheduled_for: datetime,
+    ) -> Tuple[List[KidBirthdayNotification], int]:
+        """Turn the kids of the day into queue rows; returns the rows and the skipped count.
+
+        Each guest is fetched once, however many kids share it, on a bounded pool.
+        """
+        skipped = 0
+        valid_kids: Dict[int, Tuple[int, Dict[str, Any]]] = {}
         for kid in kids:
-            kid_id = kid.get('id')
-            guest_id = kid.get('guest')
-            if not kid_id or not guest_id:
+            kid_id = _to_positive_int(kid.get('id'))
+            guest_id = _to_positive_int(kid.get('guest'))
+            if kid_id is None or guest_id is None or kid_id in valid_kids:
                 skipped += 1
                 continue
+            valid_kids[kid_id] = (guest_id, kid)
 
-            guest_payload: Dict[str, Any] = {}
-            guest_phone = ''
-            try:
-                guest_payload = self.avatariya_client.get_guest(int(guest_id))
-                guest_phone = str(guest_payload.get('phone') or '').strip()
-            except Exception:
-                # If guest payload is unavailable we cannot validate mobile_app, so skip queue entry.
-                skipped += 1
-                continue
+        guests = self._fetch_guests({guest_id for guest_id, _ in valid_kids.values()})
+        self.guest_cache.remember_many(
+            ((payload.get('phone'), guest_id) for guest_id, payload in guests.items()),
+            source=GuestPhoneSource.BIRTHDAY,
+        )
 
-            if not self._is_mobile_app_enabled(guest_payload):
+        rows: List[KidBirthdayNotification] = []
+        for kid_id, (guest_id, kid) in valid_kids.items():
+            guest_payload = guests.get(guest_id)
+            # If guest payload is unavailable we cannot validate mobile_app, so skip queue entry.
+            if guest_payload is None or not self._is_mobile_app_enabled(guest_payload):
                 skipped += 1
                 continue
 
-            obj, was_created = KidBirthdayNotification.objects.update_or_create(
-                notification_type=notification_type,
-                schedule_date=today,
-                kid_id=int(kid_id),
-                defaults={
-                    'birthday_date': _parse_date(kid.get('dob')),
-                    'kid_name': str(kid.get('name') or '').strip(),
-                    'guest_id': int(guest_id),
-                    'guest_phone': guest_phone,
-                    'scheduled_for': scheduled_for_local,
-                    'kid_payload': kid,
-                    'guest_payload': guest_payload,
-                },
+            rows.append(
+                KidBirthdayNotification(
+                    notification_type=notification_type,
+                    schedule_date=schedule_date,
+                    kid_id=kid_id,
+                    birthday_date=_parse_date(kid.get('dob')),
+                    kid_name=str(kid.get('name') or '').strip(),
+                    guest_id=guest_id,
+                    guest_phone=str(guest_payload.get('phone') or '').strip(),
+                    scheduled_for=scheduled_for,
+                    kid_payload=kid,
+                    guest_payload=guest_payload,
+                )
             )
-            if was_created:
-                created += 1
-                if obj.created_at and (latest_queue_created_at is None or obj.created_at > latest_queue_created_at):
-                    latest_queue_created_at = obj.created_at
-            elif not obj.sent:
-                updated += 1
 
-        schedule.last_checked_at = check_started_at
-        if latest_queue_created_at is not None:
-            schedule.last_queue_entry_created_at = latest_queue_created_at
-        schedule.save(update_fields=['last_checked_at', 'last_queue_entry_created_at', 'updated_at'])
+        return rows, skipped
+
+    def _fetch_guests(self, guest_ids: Set[int]) -> Dict[int, Dict[str, Any]]:
+        outcomes = run_bounded(self.avatariya_client.get_guest, sorted(guest_ids), max_workers=self.guest_fetch_workers)
+        guests: Dict[int, Dict[str, Any]] = {}
+        for outcome in outcomes:
+            if outcome.ok and isinstance(outcome.value, dict):
+                guests[outcome.item] = outcome.value
+            else:
+                logger.warning(
+                    'birthday_guest_fetch_failed',
+                    extra={'guest_id': outcome.item, 'detail': str(outcome.error or 'invalid_payload')},
+                )
+        return guests
 
-        return CollectResult(created=created, updated=updated, skipped=skipped)
+    def _upsert_queue_rows(
+        self,
+        rows: List[KidBirthdayNotification],
+        *,
+        notification_type: str,
+        schedule_date: date,
+    ) -> Tuple[int, int, Optional[datetime]]:
+        """Upsert queue rows in one statement per batch; returns created, updated and latest created_at.
+
+        Rows that already exist count as updated only while unsent, matching the former per-row
+        ``update_or_create`` accounting.
+        """
+        if not rows:
+            return 0, 0, None
+
+        with transaction.atomic():
+            existing_sent = dict(
+                KidBirthdayNotification.objects.filter(
+                    notification_type=notification_type,
+                    schedule_date=schedule_date,
+                    kid_id__in=[row.kid_id for row in rows],
+                ).values_list('kid_id', 'sent')
+            )
+            KidBirthdayNotification.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['notification_type', 'schedule_date', 'kid_id'],
+                update_fields=QUEUE_UPSERT_FIELDS,
+                batch_size=QUEUE_UPSERT_BATCH_SIZE,
+            )
+
+        created_rows = [row for row in rows if row.kid_id not in existing_sent]
+        updated = sum(1 for row in rows if row.kid_id in existing_sent and not existing_sent[row.kid_id])
+        latest_queue_created_at = max((row.created_at for row in created_rows if row.created_at), default=None)
+        return len(created_rows), updated, latest_queue_created_at
 
     def dispatch_due_notifications(self, notification_type: str = NotificationType.HB_KIDS, limit: int = 200) -> Dict[str, int]:
+        """Send due birthday pushes chunk by chunk: claim a chunk, push it, write its results in bulk.
+
+        Candidate rows come from one query and are grouped per recipient in memory. Each chunk of
+        ``push_chunk_size`` groups is claimed with ``UPDATE ... RETURNING`` right before it is sent;
+        rows a concurrent run claimed first are left to it. If the pass raises, the claims of groups
+        not pushed yet are released, so only a killed worker can leave a chunk claimed, and those rows
+        are never pushed twice.
+        """
         template = NotificationTemplate.objects.filter(notification_type=notification_type, enabled=True).first()
         schedule = NotificationSchedule.objects.filter(notification_type=notification_type, enabled=True).first()
         story_config, story_date = self._load_story_config(notification_type)
 
+        totals = {'sent': 0, 'failed': 0, 'skipped': 0, 'released': 0}
         if not template or not schedule:
-            return {'sent': 0, 'failed': 0, 'skipped': 0}
+            return totals
 
         now = timezone.now()
         today_local = now.astimezone(ALMATY_TZ).date()
@@ -147,159 +289,273 @@ class KidBirthdayFlowService:
                 processing_started_at__isnull=True,
             )
             .order_by('scheduled_for', 'id')
-            .only('id', 'notification_type', 'schedule_date', 'guest_id', 'guest_phone')
+            .only('id', 'guest_id', 'guest_phone')
         )
-        candidate_ids = self._choose_recipient_candidates(candidate_rows, limit=limit)
-
-        sent = 0
-        failed = 0
-        skipped = 0
-
-        for item_id in candidate_ids:
-            base_item = KidBirthdayNotification.objects.filter(id=item_id).first()
-            if not base_item:
-                skipped += 1
-                continue
-
-            group_ids = self._pending_group_ids(base_item, now=now)
-            if not group_ids:
-                skipped += 1
-                continue
-
-            claimed = KidBirthdayNotification.objects.filter(
-                id__in=group_ids,
-                sent=False,
-                last_error='',
-                processing_started_at__isnull=True,
-            ).update(processing_started_at=timezone.now())
-            if not claimed:
-                skipped += 1
-                continue
-
-            group_rows = list(KidBirthdayNotification.objects.filter(id__in=group_ids).order_by('id'))
-            dispatch_item = self._pick_dispatch_item(group_rows)
-
-            existing_sent = self._find_existing_sent(dispatch_item)
-            if existing_sent:
-                self._mark_group_already_sent(group_ids=group_ids, existing=existing_sent)
-                skipped += 1
-                continue
-
+        group_ids = self._group_pending_rows(candidate_rows, limit=limit)
+        for start in range(0, len(group_ids), self.push_chunk_size):
+            groups, skipped = self._claim_groups(group_ids[start:start + self.push_chunk_size])
             try:
-                result = self._dispatch_single(
-                    item=dispatch_item,
+                chunk_totals = self._dispatch_claimed(
+                    groups,
+                    notification_type=notification_type,
+                    schedule_date=today_local,
                     template=template,
                     story_config=story_config,
                     story_date=story_date,
                 )
-                self._mark_group_sent(group_ids=group_ids, result=result)
-                sent += 1
-            except Exception as exc:
-                self._mark_group_failed(group_ids=group_ids, error=str(exc))
-                failed += 1
-                continue
+            except Exception:
+                unpushed = [group for group in groups if not group.pushed]
+                logger.exception('birthday_dispatch_failed', extra={'released_groups': len(unpushed)})
+                self._release_claims(unpushed)
+                raise
+            totals['skipped'] += skipped
+            for key, value in chunk_totals.items():
+                totals[key] += value
+        return totals
+
+    def _dispatch_claimed(
+        self,
+        groups: list[RecipientGroup],
+        *,
+        notification_type: str,
+        schedule_date: date,
+        template: NotificationTemplate,
+        story_config: Optional[StoryRecipientConfig],
+        story_date: Optional[date],
+    ) -> Dict[str, int]:
+        sent_by_key = self._load_sent_today(groups, notification_type=notification_type, schedule_date=schedule_date)
 
-        return {'sent': sent, 'failed': failed, 'skipped': skipped}
+        pending: list[RecipientGroup] = []
+        already_sent: list[RecipientGroup] = []
+        for group in groups:
+            existing_sent = sent_by_key.get(self._recipient_key(group.item))
+            if existing_sent:
+                group.copy_from(existing_sent)
+                already_sent.append(group)
+            else:
+                pending.append(group)
+        self._save_sent(already_sent, sent_at=None)
+
+        if story_config and story_date and story_date != schedule_date:
+            error = f'Story date mismatch: story_date={story_date} != schedule_date={schedule_date}'
+            for group in pending:
+                group.error = error
+            self._save_failed(pending)
+            return {'sent': 0, 'failed': len(pending), 'skipped': len(already_sent), 'released': 0}
+
+        ready = self._resolve_phones(pending)
+        unresolved = [group for group in pending if group.error]
+        self._save_failed(unresolved)
+
+        sent, failed, released = self._send_groups(ready, template=template, story_config=story_config)
+        return {'sent': sent, 'failed': failed + len(unresolved), 'skipped': len(already_sent), 'released': released}
+
+    def _send_groups(
+        self,
+        groups: list[RecipientGroup],
+        *,
+        template: NotificationTemplate,
+        story_config: Optional[StoryRecipientConfig],
+    ) -> Tuple[int, int, int]:
+        """Push to the groups' phones in chunks sharing the template; returns sent, failed and released counts."""
+        sent = failed = released = 0
+        for start in range(0, len(groups), self.push_chunk_size):
+            chunk_sent, chunk_failed, chunk_released = self._push_chunk(
+                groups[start:start + self.push_chunk_size],
+                template=template,
+                story_config=story_config,
+            )
+            sent += chunk_sent
+            failed += chunk_failed
+            released += chunk_released
+        return sent, failed, released
 
-    def _dispatch_single(
+    def _push_chunk(
         self,
-        item: KidBirthdayNotification,
+        chunk: list[RecipientGroup],
+        *,
         template: NotificationTemplate,
-        story_config: StoryRecipientConfig | None,
-        story_date: Optional[date],
-    ) -> RecipientDispatchResult:
-        if story_config and story_date and story_date != item.schedule_date:
-            raise ValueError(
-                f'Story date mismatch: story_date={story_date} '
-                f'!= schedule_date={item.schedule_date}'
+        story_config: Optional[StoryRecipientConfig],
+    ) -> Tuple[int, int, int]:
+        """Send one mass push for the chunk and save its outcome.
+
+        A chunk the upstream rejects (4xx validation error) is split in halves until the offending
+        recipient is isolated, and only that recipient is marked failed. Transport, server and
+        circuit-open errors release the claim with an empty ``last_error``, so the rows go out next run.
+        """
+        try:
+            notification_id = self.mobile_client.send_mass_push(
+                phone_numbers=list(dict.fromkeys(group.phone for group in chunk)),
+                title=template.title,
+                body=template.body,
+                title_kz=template.title_kz,
+                body_kz=template.body_kz,
+                city=template.city,
+                park=template.park,
+                notification_type=template.notification_backend_type,
+                survey_id=template.survey_id,
+                review_id=template.review_id,
             )
+        except MobileAPIError as exc:
+            if not exc.is_rejection:
+                return self._release_chunk(chunk, exc)
+            if len(chunk) > 1:
+                logger.info('birthday_push_chunk_split', extra={'chunk_size': len(chunk)})
+                middle = len(chunk) // 2
+                head = self._push_chunk(chunk[:middle], template=template, story_config=story_config)
+                tail = self._push_chunk(chunk[middle:], template=template, story_config=story_config)
+                return head[0] + tail[0], head[1] + tail[1], head[2] + tail[2]
+            chunk[0].error = str(exc)
+            self._save_failed(chunk)
+            return 0, 1, 0
+        except Exception as exc:
+            return self._release_chunk(chunk, exc)
+
+        for group in chunk:
+            group.pushed = True
+        if story_config:
+            self._create_story_recipients(chunk, story_config=story_config, notification_id=notification_id)
+        self._save_sent(chunk, sent_at=timezone.now())
+        return len(chunk), 0, 0
+
+    def _release_chunk(self, chunk: list[RecipientGroup], exc: Exception) -> Tuple[int, int, int]:
+        logger.warning('birthday_push_chunk_released', extra={'chunk_size': len(chunk), 'detail': str(exc)})
+        self._release_claims(chunk)
+        return 0, 0, len(chunk)
+
+    def _release_claims(self, groups: list[RecipientGroup]) -> None:
+        row_ids = [row.id for group in groups for row in group.rows]
+        if not row_ids:
+            return
+        KidBirthdayNotification.objects.filter(id__in=row_ids, sent=False).update(
+            processing_started_at=None,
+            updated_at=timezone.now(),
+        )
+
+    def _claim_groups(self, group_ids: list[list[int]]) -> Tuple[list[RecipientGroup], int]:
+        """Claim the rows of the given groups at once; returns the groups this run owns and the skipped count."""
+        claimed = self._claim_rows(sorted(row_id for ids in group_ids for row_id in ids))
+        rows = KidBirthdayNotification.objects.in_bulk(claimed) if claimed else {}
 
-        phone = (item.guest_phone or '').strip()
-        guest_payload: Dict[str, Any] = dict(item.guest_payload or {})
-        if not phone:
-            guest_payload = self.avatariya_client.get_guest(item.guest_id)
-            phone = str(guest_payload.get('phone') or '').strip()
-
-        if not phone:
-            raise ValueError('Guest phone is empty')
-
-        notification_id = self.mobile_client.send_mass_push(
-            phone_numbers=[phone],
-            title=template.title,
-            body=template.body,
-            title_kz=template.title_kz,
-            body_kz=template.body_kz,
-            city=template.city,
-            park=template.park,
-            notification_type=template.notification_backend_type,
-            survey_id=template.survey_id,
-            review_id=template.review_id,
+        groups: list[RecipientGroup] = []
+        skipped = 0
+        for ids in group_ids:
+            group_rows = [rows[row_id] for row_id in sorted(ids) if row_id in rows]
+            if not group_rows:
+                skipped += 1
+                continue
+            groups.append(RecipientGroup(rows=group_rows, item=self._pick_dispatch_item(group_rows)))
+        return groups, skipped
+
+    def _claim_rows(self, row_ids: list[int]) -> Set[int]:
+        if not row_ids:
+            return set()
+
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {KidBirthdayNotification._meta.db_table} '
+                'SET processing_started_at = %s, updated_at = %s '
+                "WHERE id = ANY(%s) AND sent = FALSE AND last_error = '' AND processing_started_at IS NULL "
+                'RETURNING id',
+                [now, now, row_ids],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def _resolve_phones(self, groups: list[RecipientGroup]) -> list[RecipientGroup]:
+        """Fill in each group's phone, fetching the guest only when the queue row has none."""
+        missing = []
+        for group in groups:
+            group.phone = (group.item.guest_phone or '').strip()
+            group.guest_payload = dict(group.item.guest_payload or {})
+            if not group.phone:
+                missing.append(group)
+
+        outcomes = run_bounded(
+            lambda group: self.avatariya_client.get_guest(group.item.guest_id),
+            missing,
+            max_workers=self.guest_fetch_workers,
         )
+        for outcome in outcomes:
+            group = outcome.item
+            if not outcome.ok:
+                group.error = str(outcome.error)
+                continue
+            group.guest_payload = outcome.value if isinstance(outcome.value, dict) else {}
+            group.phone = str(group.guest_payload.get('phone') or '').strip()
+            if not group.phone:
+                group.error = 'Guest phone is empty'
 
-        story_created = False
-        external_story_id: Optional[int] = None
-        story_error = ''
+        return [group for group in groups if not group.error]
 
-        if story_config:
-            try:
-                recipient = self.mobile_client.create_story_recipient(
-                    phone_number=phone,
-                    story_id=int(story_config.story_id),
-                    notification_id=notification_id,
-                )
+    def _create_story_recipients(
+        self,
+        groups: list[RecipientGroup],
+        *,
+        story_config: StoryRecipientConfig,
+        notification_id: Optional[int],
+    ) -> None:
+        outcomes = run_bounded(
+            lambda group: self.mobile_client.create_story_recipient(
+                phone_number=group.phone,
+                story_id=int(story_config.story_id),
+                notification_id=notification_id,
+            ),
+            groups,
+            max_workers=self.story_workers,
+        )
+        for outcome in outcomes:
+            group = outcome.item
+            if outcome.ok:
                 # API may return created=false when recipient already exists; treat this as success.
-                story_created = True
-                external_story_id = int(recipient.get('story_id') or story_config.story_id)
-            except Exception as exc:
+                group.story_created = True
+                recipient = outcome.value if isinstance(outcome.value, dict) else {}
+                group.external_story_id = int(recipient.get('story_id') or story_config.story_id)
+            else:
                 # Push already sent successfully. Keep sent state and prevent re-send.
-                story_created = False
-                external_story_id = int(story_config.story_id)
-                story_error = f'Story recipient create failed after push send: {exc}'
-        else:
-            story_created = False
-            external_story_id = None
-
-        return RecipientDispatchResult(
-            resolved_phone=phone,
-            guest_payload=guest_payload,
-            story_created=story_created,
-            external_story_id=external_story_id,
-            last_error=story_error,
-        )
-
-    def _choose_recipient_candidates(self, rows: Iterable[KidBirthdayNotification], limit: int) -> list[int]:
-        candidate_ids: list[int] = []
-        seen_keys = set()
+                group.story_created = False
+                group.external_story_id = int(story_config.story_id)
+                group.last_error = f'Story recipient create failed after push send: {outcome.error}'
 
+    def _save_sent(self, groups: list[RecipientGroup], sent_at: Optional[datetime]) -> None:
+        now = timezone.now()
+        rows = []
+        for group in groups:
+            for row in group.rows:
+                row.sent = True
+                row.sent_at = group.sent_at or sent_at or now
+                row.guest_phone = group.phone
+                row.guest_payload = group.guest_payload
+                row.story_created = group.story_created
+                row.external_story_id = group.external_story_id
+                row.last_error = group.last_error
+                row.processing_started_at = None
+                row.updated_at = now
+                rows.append(row)
+        KidBirthdayNotification.objects.bulk_update(rows, SENT_UPDATE_FIELDS, batch_size=QUEUE_UPSERT_BATCH_SIZE)
+
+    def _save_failed(self, groups: list[RecipientGroup]) -> None:
+        now = timezone.now()
+        rows = []
+        for group in groups:
+            for row in group.rows:
+                row.last_error = group.error
+                row.processing_started_at = None
+                row.updated_at = now
+                rows.append(row)
+        KidBirthdayNotification.objects.bulk_update(rows, FAILED_UPDATE_FIELDS, batch_size=QUEUE_UPSERT_BATCH_SIZE)
+
+    def _group_pending_rows(self, rows: Iterable[KidBirthdayNotification], limit: int) -> list[list[int]]:
+        """Split the day's pending rows into recipient groups, keeping the first ``limit`` recipients."""
+        groups: Dict[str, list[int]] = {}
         for row in rows:
             key = self._recipient_key(row)
-            if key in seen_keys:
-                continue
-            seen_keys.add(key)
-            candidate_ids.append(row.id)
-            if len(candidate_ids) >= limit:
-                break
-
-        return candidate_ids
-
-    def _pending_group_ids(self, item: KidBirthdayNotification, now) -> list[int]:
-        qs = KidBirthdayNotification.objects.filter(
-            notification_type=item.notification_type,
-            schedule_date=item.schedule_date,
-            sent=False,
-            last_error='',
-            processing_started_at__isnull=True,
-            scheduled_for__lte=now,
-        )
-
-        if item.guest_id:
-            qs = qs.filter(guest_id=item.guest_id)
-        elif item.guest_phone:
-            qs = qs.filter(guest_phone=item.guest_phone)
-        else:
-            qs = qs.filter(id=item.id)
-
-        return list(qs.values_list('id', flat=True))
+            if key not in groups:
+                if len(groups) >= limit:
+                    continue
+                groups[key] = []
+            groups[key].append(row.id)
+        return list(groups.values())
 
     def _pick_dispatch_item(self, rows: list[KidBirthdayNotification]) -> KidBirthdayNotification:
         for row in rows:
@@ -307,109 +563,101 @@ class KidBirthdayFlowService:
                 return row
         return rows[0]
 
-    def _mark_group_sent(self, group_ids: list[int], result: RecipientDispatchResult) -> None:
-        now = timezone.now()
-        KidBirthdayNotification.objects.filter(id__in=group_ids).update(
-            sent=True,
-            sent_at=now,
-            guest_phone=result.resolved_phone,
-            guest_payload=result.guest_payload,
-            story_created=result.story_created,
-            external_story_id=result.external_story_id,
-            last_error=result.last_error,
-            processing_started_at=None,
-            updated_at=now,
-        )
-
-    def _mark_group_failed(self, group_ids: list[int], error: str) -> None:
-        now = timezone.now()
-        KidBirthdayNotification.objects.filter(id__in=group_ids).update(
-            last_error=error,
-            processing_started_at=None,
-            updated_at=now,
-        )
-
-    def _mark_group_already_sent(self, group_ids: list[int], existing: KidBirthdayNotification) -> None:
-        now = timezone.now()
-        KidBirthdayNotification.objects.filter(id__in=group_ids).update(
-            sent=True,
-            sent_at=existing.sent_at or now,
-            guest_phone=existing.guest_phone,
-            guest_payload=existing.guest_payload,
-            story_created=existing.story_created,
-            external_story_id=existing.external_story_id,
-            last_error=existing.last_error,
-            processing_started_at=None,
-            updated_at=now,
-        )
-
     def _recipient_key(self, row: KidBirthdayNotification) -> str:
         if row.guest_id:
             return f'guest:{row.guest_id}'
 
-        digits = ''.join(ch for ch in str(row.guest_phone or '') if ch.isdigit())
-        if digits:
-            return f'phone:{digits}'
+        phone_key = self._phone_key(row.guest_phone)
+        if phone_key:
+            return phone_key
 
         return f'row:{row.id}'
 
-    def _find_existing_sent(self, row: KidBirthdayNotification) -> Optional[KidBirthdayNotification]:
-        qs = KidBirthdayNotification.objects.filter(
-            notification_type=row.notification_type,
-            schedule_date=row.schedule_date,
-            sent=True,
-        ).order_by('sent_at', 'id')
-
-        if row.guest_id:
-            return qs.filter(guest_id=row.guest_id).first()
+    def _phone_key(self, phone: str) -> str:
+        digits = ''.join(ch for ch in str(phone or '') if ch.isdigit())
+        return f'phone:{digits}' if digits else ''
 
-        digits = ''.join(ch for ch in str(row.guest_phone or '') if ch.isdigit())
-        if digits:
-            return qs.filter(guest_phone=row.guest_phone).first()
-
-        return None
-
-    def _load_story_config(self, notification_type: str) -> tuple[Optional[StoryRecipientConfig], Optional[date]]:
-        try:
-            config = (
-                StoryRecipientConfig.objects.filter(notification_type=notification_type, enabled=True)
-                .only('id', 'notification_type', 'story_id', 'enabled')
-                .first()
+    def _load_sent_today(
+        self,
+        groups: list[RecipientGroup],
+        *,
+        notification_type: str,
+        schedule_date: date,
+    ) -> Dict[str, KidBirthdayNotification]:
+        """Earliest row already sent today per recipient key, for every group, in one query."""
+        guest_ids = {group.item.guest_id for group in groups if group.item.guest_id}
+        phones = {group.item.guest_phone for group in groups if not group.item.guest_id and group.item.guest_phone}
+        if not guest_ids and not phones:
+            return {}
+
+        rows = (
+            KidBirthdayNotification.objects.filter(
+                notification_type=notification_type,
+                schedule_date=schedule_date,
+                sent=True,
             )
-        except Exception:
-            return None, None
-
-        if not config:
-            return None, None
+            .filter(Q(guest_id__in=guest_ids) | Q(guest_phone__in=phones))
+            .order_by('sent_at', 'id')
+            .only(
+                'id',
+                'guest_id',
+                'guest_phone',
+                'guest_payload',
+                'sent_at',
+                'story_created',
+                'external_story_id',
+                'last_error',
+            )
+        )
+        sent_by_key: Dict[str, KidBirthdayNotification] = {}
+        for row in rows:
+            if row.guest_id:
+                sent_by_key.setdefault(f'guest:{row.guest_id}', row)
+            phone_key = self._phone_key(row.guest_phone)
+            if phone_key:
+                sent_by_key.setdefault(phone_key, row)
+        return sent_by_key
 
-        story_date = None
-        if self._story_date_column_exists():
+    def _load_story_config(self, notification_type: str) -> tuple[Optional[StoryRecipientConfig], Optional[date]]:
+        """Enabled story config of the type, read through the story config cache.
+
+        The cached entry is dropped whenever a config is saved or deleted, so edits in the admin are
+        seen by the next dispatch run. Database errors are not cached.
+        """
+        cache_key = story_config_cache_key(notification_type)
+        cached = story_config_cache.get(cache_key)
+        if cached is None:
             try:
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        'SELECT story_date FROM notifications_storyrecipientconfig WHERE id = %s',
-                        [config.id],
-                    )
-                    row = cursor.fetchone()
-                    story_date = row[0] if row else None
+                config = (
+                    StoryRecipientConfig.objects.filter(notification_type=notification_type, enabled=True)
+                    .only('id', 'notification_type', 'story_id', 'story_date', 'enabled')
+                    .first()
+                )
             except Exception:
-                story_date = None
+                return None, None
+
+            cached = {'found': False}
+            if config:
+                cached = {
+                    'found': True,
+                    'id': config.id,
+                    'story_id': config.story_id,
+                    'story_date': config.story_date.isoformat() if config.story_date else None,
+                }
+            story_config_cache.set(cache_key, cached, settings.STORY_CONFIG_CACHE_SECONDS)
 
-        return config, story_date
+        if not cached.get('found'):
+            return None, None
 
-    def _story_date_column_exists(self) -> bool:
-        try:
-            with connection.cursor() as cursor:
-                columns = {
-                    col.name
-                    for col in connection.introspection.get_table_description(
-                        cursor,
-                        StoryRecipientConfig._meta.db_table,
-                    )
-                }
-            return 'story_date' in columns
-        except Exception:
-            return False
+        story_date = date.fromisoformat(cached['story_date']) if cached.get('story_date') else None
+        config = StoryRecipientConfig(
+            id=cached['id'],
+            notification_type=notification_type,
+            story_id=cached['story_id'],
+            story_date=story_date,
+            enabled=True,
+        )
+        return config, story_date
 
     def _is_mobile_app_enabled(self, guest_payload: Dict[str, Any]) -> bool:
         value = guest_payload.get('mobile_app')
@@ -425,6 +673,14 @@ class KidBirthdayFlowService:
         return False
 
 
+def _to_positive_int(value: Any) -> Optional[int]:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
 def _parse_date(value: Any):
     if not value:
         return timezone.now().date()
@@ -432,3 +688,11 @@ def _parse_date(value: Any):
         return datetime.fromisoformat(str(value)).date()
     except ValueError:
         return timezone.now().date()
+
+
+def story_config_cache_key(notification_type: str) -> str:
+    return f'config:{(notification_type or "").strip()}'
+
+
+def invalidate_story_config(notification_type: str) -> None:
+    story_config_cache.delete(story_config_cache_key(notification_type))
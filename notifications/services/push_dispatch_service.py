@@ -4,11 +4,16 @@ import logging
 from dataclasses import dataclass
 from typing import List, Optional
 
+from django.conf import settings
+
 from utils.avatariya_client import AvatariyaClient
 from utils.mobile_client import MobileClient
+from utils.reference_data import ReferenceDataCache
 
 logger = logging.getLogger(__name__)
 
+city_reference_cache = ReferenceDataCache(namespace="reference_cities")
+
 
 class PushDispatchUpstreamError(Exception):
     pass
@@ -41,8 +46,23 @@ class PushDispatchService:
         self.mobile_client = mobile_client or MobileClient()
 
     def list_cities(self, search: str = "") -> List[NotificationCityOption]:
-        raw_items = self.avatariya_client.list_cities()
+        # The city list barely changes, so autocomplete filters a cached copy instead of paging /city/.
+        options = city_reference_cache.get(
+            "cities",
+            self._load_city_options,
+            fresh_seconds=settings.REFERENCE_CITIES_FRESH_SECONDS,
+        )
         normalized_search = str(search or "").strip().lower()
+        if not normalized_search:
+            return list(options)
+        return [
+            option
+            for option in options
+            if normalized_search in f"{option.name_ru} {option.name_kz}".strip().lower()
+        ]
+
+    def _load_city_options(self) -> List[NotificationCityOption]:
+        raw_items = self.avatariya_client.list_cities()
         options: List[NotificationCityOption] = []
 
         for item in raw_items:
@@ -52,11 +72,6 @@ class PushDispatchService:
 
             name_ru = str(item.get("name_ru") or "").strip()
             name_kz = str(item.get("name_kz") or "").strip()
-
-            searchable = f"{name_ru} {name_kz}".strip().lower()
-            if normalized_search and normalized_search not in searchable:
-                continue
-
             if not (name_ru or name_kz):
                 continue
 
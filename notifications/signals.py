@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from notifications.models import StoryRecipientConfig
+from notifications.services.birthday_flow import invalidate_story_config
+
+
+@receiver(pre_save, sender=StoryRecipientConfig)
+def remember_previous_notification_type(sender, instance, **kwargs):
+	if not instance.pk:
+		instance._previous_notification_type = ''
+		return
+
+	instance._previous_notification_type = (
+		sender.objects.filter(pk=instance.pk).values_list('notification_type', flat=True).first() or ''
+	)
+
+
+@receiver(post_save, sender=StoryRecipientConfig)
+@receiver(post_delete, sender=StoryRecipientConfig)
+def invalidate_story_config_cache(sender, instance, **kwargs):
+	invalidate_story_config(instance.notification_type)
+	previous = getattr(instance, '_previous_notification_type', '')
+	if previous and previous != instance.notification_type:
+		invalidate_story_config(previous)
@@ -1,7 +1,27 @@
+import threading
+import time
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.db.models.signals import post_save
 from django.test import SimpleTestCase
 
+from notifications.models import (
+	KidBirthdayNotification,
+	NotificationSchedule,
+	NotificationTemplate,
+	StoryRecipientConfig,
+)
 from notifications.serializers import PushDispatchRequestSerializer
-from notifications.services.push_dispatch_service import PushDispatchService
+from notifications.services.birthday_flow import (
+	ALMATY_TZ,
+	KidBirthdayFlowService,
+	RecipientGroup,
+	story_config_cache,
+)
+from notifications.services.push_dispatch_service import PushDispatchService, city_reference_cache
+from utils.mobile_client import MobileAPIError
 
 
 class PushDispatchRequestSerializerTests(SimpleTestCase):
@@ -51,6 +71,10 @@ class _FakeMobileClient:
 
 
 class PushDispatchServiceTests(SimpleTestCase):
+	def setUp(self):
+		city_reference_cache.clear_local()
+		cache.clear()
+
 	def test_list_cities_filters_empty_names_and_search(self):
 		service = PushDispatchService(
 			avatariya_client=_FakeAvatariyaClient(),
@@ -108,3 +132,329 @@ class PushDispatchServiceTests(SimpleTestCase):
 		self.assertEqual(len(mobile.calls), 1)
 		self.assertIsNone(mobile.calls[0]['phone_numbers'])
 		self.assertEqual(mobile.calls[0]['city'], '7')
+
+
+class _FakeBirthdayAvatariyaClient:
+	def __init__(self, guests, failing_guests=()):
+		self.guests = guests
+		self.failing_guests = set(failing_guests)
+		self.calls = []
+		self.active = 0
+		self.max_active = 0
+		self.lock = threading.Lock()
+
+	def get_guest(self, guest_id):
+		with self.lock:
+			self.calls.append(guest_id)
+			self.active += 1
+			self.max_active = max(self.max_active, self.active)
+		time.sleep(0.01)
+		with self.lock:
+			self.active -= 1
+		if guest_id in self.failing_guests:
+			raise ValueError('upstream failed')
+		return self.guests[guest_id]
+
+
+class _FakeGuestCache:
+	def __init__(self):
+		self.remembered = []
+
+	def remember_many(self, pairs, *, source):
+		self.remembered.extend(pairs)
+		return len(self.remembered)
+
+
+class KidBirthdayCollectTests(SimpleTestCase):
+	def _service(self, client):
+		return KidBirthdayFlowService(
+			avatariya_client=client,
+			mobile_client=object(),
+			guest_cache=_FakeGuestCache(),
+			guest_fetch_workers=4,
+		)
+
+	def test_guests_are_fetched_once_concurrently_and_skips_are_counted(self):
+		client = _FakeBirthdayAvatariyaClient(
+			guests={
+				10: {'phone': '77070000010', 'mobile_app': True},
+				11: {'phone': '77070000011', 'mobile_app': False},
+				13: {'phone': '77070000013', 'mobile_app': 'yes'},
+				14: {'phone': '77070000014', 'mobile_app': 1},
+			},
+			failing_guests={12},
+		)
+		service = self._service(client)
+		kids = [
+			{'id': 1, 'guest': 10, 'name': 'A', 'dob': '2020-05-01'},
+			{'id': 2, 'guest': 10, 'name': 'B'},
+			{'id': 3, 'guest': 11},
+			{'id': 4, 'guest': 12},
+			{'id': 5, 'guest': None},
+			{'id': 1, 'guest': 10},
+			{'id': 6, 'guest': 13},
+			{'id': 7, 'guest': 14},
+		]
+
+		rows, skipped = service._build_queue_rows(
+			kids,
+			notification_type='hb_kids',
+			schedule_date=date(2026, 5, 1),
+			scheduled_for=datetime(2026, 5, 1, 10, 0, tzinfo=ALMATY_TZ),
+		)
+
+		self.assertEqual(sorted(client.calls), [10, 11, 12, 13, 14])
+		self.assertGreater(client.max_active, 1)
+		self.assertEqual([row.kid_id for row in rows], [1, 2, 6, 7])
+		self.assertEqual(rows[0].guest_phone, '77070000010')
+		self.assertEqual(rows[0].birthday_date, date(2020, 5, 1))
+		self.assertEqual(skipped, 4)
+		self.assertIn(('77070000011', 11), service.guest_cache.remembered)
+
+	def test_upsert_counts_created_and_unsent_updates_with_one_bulk_write(self):
+		service = self._service(_FakeBirthdayAvatariyaClient(guests={}))
+		rows = [
+			KidBirthdayNotification(kid_id=kid_id, notification_type='hb_kids', schedule_date=date(2026, 5, 1))
+			for kid_id in (1, 2, 3)
+		]
+		existing = MagicMock()
+		existing.values_list.return_value = [(2, False), (3, True)]
+
+		def bulk_create(objs, **kwargs):
+			for obj in objs:
+				obj.created_at = datetime(2026, 5, 1, 9, obj.kid_id, tzinfo=ALMATY_TZ)
+			return objs
+
+		with patch.object(KidBirthdayNotification.objects, 'filter', return_value=existing), patch.object(
+			KidBirthdayNotification.objects, 'bulk_create', side_effect=bulk_create
+		) as bulk_mock, patch('notifications.services.birthday_flow.transaction.atomic'):
+			created, updated, latest = service._upsert_queue_rows(
+				rows,
+				notification_type='hb_kids',
+				schedule_date=date(2026, 5, 1),
+			)
+
+		bulk_mock.assert_called_once()
+		self.assertTrue(bulk_mock.call_args.kwargs['update_conflicts'])
+		self.assertEqual((created, updated), (1, 1))
+		self.assertEqual(latest, datetime(2026, 5, 1, 9, 1, tzinfo=ALMATY_TZ))
+
+
+class _FakeBirthdayMobileClient:
+	def __init__(self, failing_phone=None, error=None):
+		self.failing_phone = failing_phone
+		self.error = error or MobileAPIError('push rejected', 400)
+		self.push_calls = []
+		self.story_calls = []
+
+	def send_mass_push(self, **kwargs):
+		self.push_calls.append(kwargs['phone_numbers'])
+		if self.failing_phone in kwargs['phone_numbers']:
+			raise self.error
+		return len(self.push_calls)
+
+	def create_story_recipient(self, **kwargs):
+		self.story_calls.append(kwargs)
+		return {'story_id': kwargs['story_id'], 'created': True}
+
+
+class KidBirthdayDispatchTests(SimpleTestCase):
+	def _group(self, row_id, phone, extra_rows=0):
+		rows = [
+			KidBirthdayNotification(id=row_id * 10 + offset, guest_id=row_id, guest_phone=phone)
+			for offset in range(extra_rows + 1)
+		]
+		return RecipientGroup(rows=rows, item=rows[0], phone=phone)
+
+	def test_groups_are_pushed_in_chunks_and_saved_in_bulk(self):
+		mobile = _FakeBirthdayMobileClient(failing_phone='77070000004')
+		service = KidBirthdayFlowService(
+			avatariya_client=object(),
+			mobile_client=mobile,
+			guest_cache=_FakeGuestCache(),
+			push_chunk_size=2,
+			story_workers=2,
+		)
+		groups = [
+			self._group(1, '77070000001', extra_rows=1),
+			self._group(2, '77070000001'),
+			self._group(3, '77070000003'),
+			self._group(4, '77070000004'),
+			self._group(5, '77070000005'),
+		]
+		template = NotificationTemplate(title='Title', body='Body')
+		story_config = StoryRecipientConfig(story_id=42)
+
+		with patch.object(KidBirthdayNotification.objects, 'bulk_update') as bulk_mock:
+			sent, failed, released = service._send_groups(groups, template=template, story_config=story_config)
+
+		self.assertEqual(
+			mobile.push_calls,
+			[['77070000001'], ['77070000003', '77070000004'], ['77070000003'], ['77070000004'], ['77070000005']],
+		)
+		self.assertEqual((sent, failed, released), (4, 1, 0))
+		self.assertEqual(bulk_mock.call_count, 4)
+		self.assertTrue(all(row.sent for row in groups[0].rows))
+		self.assertEqual(groups[0].rows[1].external_story_id, 42)
+		self.assertEqual(groups[3].rows[0].last_error, 'push rejected')
+		self.assertFalse(groups[3].rows[0].sent)
+		self.assertTrue(groups[2].rows[0].sent)
+		self.assertEqual(groups[2].rows[0].last_error, '')
+		self.assertEqual(len(mobile.story_calls), 4)
+
+	def test_transient_push_errors_release_the_claim_instead_of_failing_rows(self):
+		mobile = _FakeBirthdayMobileClient(failing_phone='77070000002', error=MobileAPIError('bad gateway', 502))
+		service = KidBirthdayFlowService(
+			avatariya_client=object(),
+			mobile_client=mobile,
+			guest_cache=_FakeGuestCache(),
+			push_chunk_size=2,
+		)
+		groups = [self._group(1, '77070000001'), self._group(2, '77070000002'), self._group(3, '77070000003')]
+
+		with patch.object(KidBirthdayNotification.objects, 'bulk_update'), patch.object(
+			KidBirthdayNotification.objects, 'filter'
+		) as filter_mock:
+			sent, failed, released = service._send_groups(
+				groups,
+				template=NotificationTemplate(title='Title', body='Body'),
+				story_config=None,
+			)
+
+		self.assertEqual(mobile.push_calls, [['77070000001', '77070000002'], ['77070000003']])
+		self.assertEqual((sent, failed, released), (1, 0, 2))
+		filter_mock.assert_called_once_with(id__in=[10, 20], sent=False)
+		filter_mock.return_value.update.assert_called_once()
+		self.assertEqual(filter_mock.return_value.update.call_args.kwargs['processing_started_at'], None)
+		self.assertEqual([group.rows[0].last_error for group in groups], ['', '', ''])
+
+	def test_chunks_are_claimed_one_at_a_time_and_unpushed_claims_are_released_on_error(self):
+		mobile = _FakeBirthdayMobileClient()
+		service = KidBirthdayFlowService(
+			avatariya_client=object(),
+			mobile_client=mobile,
+			guest_cache=_FakeGuestCache(),
+			push_chunk_size=2,
+		)
+		groups = [self._group(index, f'7707000000{index}') for index in range(1, 5)]
+		candidates = MagicMock()
+		candidates.order_by.return_value.only.return_value = [group.rows[0] for group in groups]
+		claims = iter([(groups[:2], 0), (groups[2:], 0)])
+
+		def resolve_phones(pending):
+			if groups[2] in pending:
+				raise RuntimeError('db down')
+			return pending
+
+		with patch.object(NotificationTemplate.objects, 'filter') as template_mock, patch.object(
+			NotificationSchedule.objects, 'filter'
+		), patch.object(KidBirthdayNotification.objects, 'filter', return_value=candidates), patch.object(
+			KidBirthdayNotification.objects, 'bulk_update'
+		), patch.object(service, '_load_story_config', return_value=(None, None)), patch.object(
+			service, '_load_sent_today', return_value={}
+		), patch.object(service, '_claim_groups', side_effect=lambda ids: next(claims)) as claim_mock, patch.object(
+			service, '_resolve_phones', side_effect=resolve_phones
+		), patch.object(service, '_release_claims') as release_mock:
+			template_mock.return_value.first.return_value = NotificationTemplate(title='Title', body='Body')
+			with self.assertRaises(RuntimeError):
+				service.dispatch_due_notifications(limit=10)
+
+		self.assertEqual([call.args[0] for call in claim_mock.call_args_list], [[[10], [20]], [[30], [40]]])
+		self.assertEqual(mobile.push_calls, [['77070000001', '77070000002']])
+		self.assertTrue(all(group.rows[0].sent for group in groups[:2]))
+		release_mock.assert_called_once_with(groups[2:])
+
+	def test_pending_rows_are_grouped_per_recipient_up_to_limit(self):
+		service = KidBirthdayFlowService(avatariya_client=object(), mobile_client=object(), guest_cache=_FakeGuestCache())
+		rows = [
+			KidBirthdayNotification(id=1, guest_id=10),
+			KidBirthdayNotification(id=2, guest_id=0, guest_phone='+7 707 000 00 01'),
+			KidBirthdayNotification(id=3, guest_id=10),
+			KidBirthdayNotification(id=4, guest_id=30),
+			KidBirthdayNotification(id=5, guest_id=0, guest_phone='77070000001'),
+		]
+
+		self.assertEqual(service._group_pending_rows(rows, limit=2), [[1, 3], [2, 5]])
+
+	def test_claim_groups_keeps_only_rows_claimed_by_this_run(self):
+		service = KidBirthdayFlowService(avatariya_client=object(), mobile_client=object(), guest_cache=_FakeGuestCache())
+		claimed_rows = {
+			1: KidBirthdayNotification(id=1, guest_id=10),
+			2: KidBirthdayNotification(id=2, guest_id=10, guest_phone='77070000010'),
+		}
+
+		with patch.object(KidBirthdayNotification.objects, 'in_bulk', return_value=claimed_rows) as in_bulk_mock, patch.object(
+			service, '_claim_rows', return_value={1, 2}
+		) as claim_mock:
+			groups, skipped = service._claim_groups([[1, 2], [3]])
+
+		claim_mock.assert_called_once_with([1, 2, 3])
+		in_bulk_mock.assert_called_once_with({1, 2})
+		self.assertEqual(len(groups), 1)
+		self.assertEqual([row.id for row in groups[0].rows], [1, 2])
+		self.assertEqual(groups[0].item.id, 2)
+		self.assertEqual(skipped, 1)
+
+	def test_sent_today_is_loaded_once_and_keyed_by_guest_and_phone(self):
+		service = KidBirthdayFlowService(avatariya_client=object(), mobile_client=object(), guest_cache=_FakeGuestCache())
+		groups = [
+			self._group(10, '77070000010'),
+			RecipientGroup(rows=[], item=KidBirthdayNotification(id=2, guest_id=0, guest_phone='77070000020')),
+		]
+		sent_rows = [
+			KidBirthdayNotification(id=7, guest_id=10, guest_phone='77070000010'),
+			KidBirthdayNotification(id=8, guest_id=10, guest_phone='77070000010'),
+			KidBirthdayNotification(id=9, guest_id=20, guest_phone='77070000020'),
+		]
+		queryset = MagicMock()
+		queryset.filter.return_value.order_by.return_value.only.return_value = sent_rows
+
+		with patch.object(KidBirthdayNotification.objects, 'filter', return_value=queryset) as filter_mock:
+			sent_by_key = service._load_sent_today(groups, notification_type='hb_kids', schedule_date=date(2026, 5, 1))
+
+		filter_mock.assert_called_once()
+		self.assertEqual(sent_by_key['guest:10'].id, 7)
+		self.assertEqual(sent_by_key[service._recipient_key(groups[1].item)].id, 9)
+
+
+class StoryConfigCacheTests(SimpleTestCase):
+	def setUp(self):
+		story_config_cache.clear_local()
+		cache.clear()
+
+	def _service(self):
+		return KidBirthdayFlowService(avatariya_client=object(), mobile_client=object(), guest_cache=_FakeGuestCache())
+
+	def _patch_lookup(self, config):
+		queryset = MagicMock()
+		queryset.only.return_value.first.return_value = config
+		return patch.object(StoryRecipientConfig.objects, 'filter', return_value=queryset)
+
+	def test_config_is_loaded_once_until_saved(self):
+		stored = StoryRecipientConfig(id=3, notification_type='hb_kids', story_id=42, story_date=date(2026, 5, 1))
+		with self._patch_lookup(stored) as filter_mock:
+			first, first_date = self._service()._load_story_config('hb_kids')
+			second, second_date = self._service()._load_story_config('hb_kids')
+
+			self.assertEqual(filter_mock.call_count, 1)
+			self.assertEqual((first.story_id, second.story_id), (42, 42))
+			self.assertEqual(second_date, date(2026, 5, 1))
+
+			post_save.send(sender=StoryRecipientConfig, instance=stored, created=False)
+			self._service()._load_story_config('hb_kids')
+
+		self.assertEqual(filter_mock.call_count, 2)
+
+	def test_missing_config_is_cached_but_lookup_errors_are_not(self):
+		with self._patch_lookup(None) as filter_mock:
+			self.assertEqual(self._service()._load_story_config('hb_kids'), (None, None))
+			self.assertEqual(self._service()._load_story_config('hb_kids'), (None, None))
+		self.assertEqual(filter_mock.call_count, 1)
+
+		story_config_cache.clear_local()
+		cache.clear()
+		with patch.object(StoryRecipientConfig.objects, 'filter', side_effect=RuntimeError('db down')) as failing_mock:
+			self._service()._load_story_config('hb_kids')
+			self._service()._load_story_config('hb_kids')
+		self.assertEqual(failing_mock.call_count, 2)
+
@@ -7,9 +7,22 @@ import requests
 from requests import HTTPError
 from django.conf import settings
 
+from utils.http_transport import DEFAULT_ENDPOINT, HttpTransport, get_transport
+
 logger = logging.getLogger(__name__)
 
 
+class AvatariyaAPIError(ValueError):
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def is_rejection(self) -> bool:
+        """The upstream refused the request content (4xx validation error), so resending it as is fails again."""
+        return 400 <= self.status_code < 500 and self.status_code not in {401, 403, 404, 405, 429}
+
+
 class AvatariyaClient:
     def __init__(
         self,
@@ -17,11 +30,13 @@ class AvatariyaClient:
         bearer_token: Optional[str] = None,
         timeout_seconds: Optional[int] = None,
         phones_batch_size: Optional[int] = None,
+        transport: Optional[HttpTransport] = None,
     ) -> None:
         self.base_url = (base_url or settings.AVATARIYA_BASE_URL).rstrip('/')
         self.bearer_token = bearer_token or settings.AVATARIYA_BEARER_TOKEN
         self.timeout_seconds = timeout_seconds or settings.AVATARIYA_TIMEOUT_SECONDS
         self.phones_batch_size = phones_batch_size or settings.AVATARIYA_PHONES_BATCH_SIZE
+        self.transport = transport or get_transport('avatariya')
 
     def visit_search_by_date_phones(self, start_date: str, end_date: str, phones: List[str]) -> Dict:
         if not self.bearer_token:
@@ -33,8 +48,10 @@ class AvatariyaClient:
             'phones': phones,
         }
 
-        response = requests.post(
+        response = self.transport.post(
             f'{self.base_url}/visit-search-by-date-phones/',
+            endpoint='visit_search',
+            idempotent=True,
             json=payload,
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -62,20 +79,22 @@ class AvatariyaClient:
     def get_kids_by_dob_day(self, dob_day: str) -> List[Dict]:
         """Return all kids with the given birthday day (format: 'DD-MM', e.g. '16-02')."""
         params = {'dob_day': dob_day}
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/kid/',
+            endpoint='kid',
             params=params,
             headers=self._headers(),
             timeout=self.timeout_seconds,
         )
         self._raise_for_status(response)
         first_page = response.json()
-        return self._collect_get_results_with_pagination(first_page, params=params)
+        return self._collect_get_results_with_pagination(first_page, params=params, endpoint='kid')
 
     def get_guest(self, guest_id: int) -> Dict:
         """Return a single guest by ID."""
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/guest/{guest_id}/',
+            endpoint='guest',
             headers=self._headers(),
             timeout=self.timeout_seconds,
         )
@@ -104,11 +123,12 @@ class AvatariyaClient:
         if page_size is not None:
             params['page_size'] = str(max(1, int(page_size)))
 
-        return self._get_paginated('/order/read/', params=params)
+        return self._get_paginated('/order/read/', params=params, endpoint='order_read')
 
     def get_cashback_summary_current(self, guest_id: int) -> Dict:
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/cashback/summary/current/',
+            endpoint='cashback_summary',
             params={'guest': str(guest_id)},
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -151,11 +171,12 @@ class AvatariyaClient:
         if page_size is not None:
             params['page_size'] = str(max(1, int(page_size)))
 
-        return self._get_paginated('/cashback/', params=params)
+        return self._get_paginated('/cashback/', params=params, endpoint='cashback')
 
     def get_crystal_summary(self, guest_id: int) -> Dict:
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/crystal/summary/',
+            endpoint='crystal_summary',
             params={'guest': str(guest_id)},
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -191,7 +212,7 @@ class AvatariyaClient:
         if page_size is not None:
             params['page_size'] = str(max(1, int(page_size)))
 
-        return self._get_paginated('/crystal/', params=params)
+        return self._get_paginated('/crystal/', params=params, endpoint='crystal')
 
     def get_employee_by_iin(self, iin: str) -> Dict:
         """Return employee payload by IIN."""
@@ -199,8 +220,9 @@ class AvatariyaClient:
         if not normalized:
             raise ValueError('IIN is required')
 
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/employees/{normalized}/',
+            endpoint='employee',
             headers=self._headers(),
             timeout=self.timeout_seconds,
         )
@@ -213,8 +235,9 @@ class AvatariyaClient:
         if not normalized:
             raise ValueError('Position GUID is required')
 
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/position/{normalized}/',
+            endpoint='position',
             headers=self._headers(),
             timeout=self.timeout_seconds,
         )
@@ -226,29 +249,32 @@ class AvatariyaClient:
         if search.strip():
             params['search'] = search.strip()
 
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/marketing_sale/',
+            endpoint='marketing_sale',
             params=params,
             headers=self._headers(),
             timeout=self.timeout_seconds,
         )
         self._raise_for_status(response)
         first_page = response.json()
-        return self._collect_get_results_with_pagination(first_page, params=params)
+        return self._collect_get_results_with_pagination(first_page, params=params, endpoint='marketing_sale')
 
     def list_cities(self) -> List[Dict]:
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/city/',
+            endpoint='city',
             headers=self._headers(),
             timeout=self.timeout_seconds,
         )
         self._raise_for_status(response)
         first_page = response.json()
-        return self._collect_get_results_with_pagination(first_page, params={})
+        return self._collect_get_results_with_pagination(first_page, params={}, endpoint='city')
 
     def list_coupon_assign_marketing_sales(self) -> List[Dict]:
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/admin/coupon-assign/marketing-sales/',
+            endpoint='coupon_assign_marketing_sales',
             headers=self._headers(),
             timeout=self.timeout_seconds,
         )
@@ -277,8 +303,9 @@ class AvatariyaClient:
             'amount': str(amount or '').strip(),
             'valid_until': str(valid_until or '').strip(),
         }
-        response = requests.post(
+        response = self.transport.post(
             f'{self.base_url}/admin/coupon-assign/assign/',
+            endpoint='coupon_assign',
             json=payload,
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -304,15 +331,16 @@ class AvatariyaClient:
         if guest_is_null:
             params['guest__isnull'] = 'true'
 
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/coupon/',
+            endpoint='coupon',
             params=params,
             headers=self._headers(),
             timeout=self.timeout_seconds,
         )
         self._raise_for_status(response)
         first_page = response.json()
-        return self._collect_get_results_with_pagination(first_page, params=params)
+        return self._collect_get_results_with_pagination(first_page, params=params, endpoint='coupon')
 
     def list_coupons_parallel(
         self,
@@ -332,8 +360,9 @@ class AvatariyaClient:
         if guest_is_null:
             params['guest__isnull'] = 'true'
 
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/coupon/',
+            endpoint='coupon',
             params=params,
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -370,8 +399,9 @@ class AvatariyaClient:
         def fetch_page(page_number: int) -> List[Dict]:
             page_params = dict(params)
             page_params['page'] = str(page_number)
-            page_response = requests.get(
+            page_response = self.transport.get(
                 f'{self.base_url}/coupon/',
+                endpoint='coupon',
                 params=page_params,
                 headers=self._headers(),
                 timeout=self.timeout_seconds,
@@ -416,8 +446,9 @@ class AvatariyaClient:
         if guest_is_null:
             params['guest__isnull'] = 'true'
 
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/coupon/',
+            endpoint='coupon',
             params=params,
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -438,8 +469,9 @@ class AvatariyaClient:
 
         next_url = payload.get('next')
         while next_url:
-            page_response = requests.get(
+            page_response = self.transport.get(
                 next_url,
+                endpoint='coupon',
                 headers=self._headers(),
                 timeout=self.timeout_seconds,
             )
@@ -479,8 +511,9 @@ class AvatariyaClient:
             for key, value in extra_params.items():
                 params[str(key)] = str(value)
 
-        response = requests.get(
+        response = self.transport.get(
             f'{self.base_url}/coupon/',
+            endpoint='coupon',
             params=params,
             headers=self._headers(),
             timeout=timeout_seconds or self.timeout_seconds,
@@ -517,8 +550,9 @@ class AvatariyaClient:
 
         for variant in search_variants:
             for params in ({'phone': variant, 'deleted': 'false'}, {'search': variant, 'deleted': 'false'}):
-                response = requests.get(
+                response = self.transport.get(
                     f'{self.base_url}/guest/',
+                    endpoint='guest_search',
                     params=params,
                     headers=self._headers(),
                     timeout=self.timeout_seconds,
@@ -534,8 +568,9 @@ class AvatariyaClient:
         return None
 
     def create_cashback(self, payload: Dict) -> Dict:
-        response = requests.post(
+        response = self.transport.post(
             f'{self.base_url}/cashback/',
+            endpoint='cashback_create',
             json=payload,
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -553,8 +588,10 @@ class AvatariyaClient:
 
     def assign_coupon_to_guest(self, coupon_id: int, guest_id: int) -> Dict:
         payload = {'guest': guest_id}
-        response = requests.patch(
+        response = self.transport.patch(
             f'{self.base_url}/coupon/{coupon_id}/',
+            endpoint='coupon_update',
+            idempotent=True,
             json=payload,
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -569,7 +606,12 @@ class AvatariyaClient:
         except ValueError:
             return {}
 
-    def _collect_get_results_with_pagination(self, first_page: Dict, params: Dict) -> List[Dict]:
+    def _collect_get_results_with_pagination(
+        self,
+        first_page: Dict,
+        params: Dict,
+        endpoint: str = DEFAULT_ENDPOINT,
+    ) -> List[Dict]:
         if isinstance(first_page, list):
             return first_page
 
@@ -580,8 +622,9 @@ class AvatariyaClient:
         next_url = first_page.get('next')
 
         while next_url:
-            response = requests.get(
+            response = self.transport.get(
                 next_url,
+                endpoint=endpoint,
                 headers=self._headers(),
                 timeout=self.timeout_seconds,
             )
@@ -597,8 +640,10 @@ class AvatariyaClient:
         next_url = first_page.get('next')
 
         while next_url:
-            response = requests.post(
+            response = self.transport.post(
                 next_url,
+                endpoint='visit_search',
+                idempotent=True,
                 json=payload,
                 headers=self._headers(),
                 timeout=self.timeout_seconds,
@@ -610,9 +655,15 @@ class AvatariyaClient:
 
         return results
 
-    def _get_paginated(self, path: str, params: Optional[Dict[str, str]] = None) -> Dict:
-        response = requests.get(
+    def _get_paginated(
+        self,
+        path: str,
+        params: Optional[Dict[str, str]] = None,
+        endpoint: str = DEFAULT_ENDPOINT,
+    ) -> Dict:
+        response = self.transport.get(
             f'{self.base_url}{path}',
+            endpoint=endpoint,
             params=params or {},
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -661,8 +712,8 @@ class AvatariyaClient:
                 extra={'status_code': response.status_code, 'url': response.url, 'detail': detail[:500]},
             )
             if detail:
-                raise ValueError(f'Avatariya API error: {detail}') from exc
-            raise ValueError('Avatariya API request failed') from exc
+                raise AvatariyaAPIError(f'Avatariya API error: {detail}', response.status_code) from exc
+            raise AvatariyaAPIError('Avatariya API request failed', response.status_code) from exc
 
     def _headers(self) -> Dict[str, str]:
         return {
@@ -0,0 +1,169 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from django.core.cache import cache as shared_cache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LocalTTLCache:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, *, maxsize: int) -> None:
+        self.maxsize = max(1, int(maxsize))
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        if ttl_seconds <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class LayeredCache:
+    """In-process LRU in front of the shared Django cache (Redis in production).
+
+    The local layer keeps entries for at most ``local_ttl_seconds`` so that invalidations made in
+    another process become visible within that window. Shared cache failures are logged and treated
+    as misses, so an unavailable Redis only costs the underlying lookup.
+    """
+
+    def __init__(self, *, namespace: str, local_maxsize: int, local_ttl_seconds: float) -> None:
+        self.namespace = namespace
+        self.local_ttl_seconds = local_ttl_seconds
+        self.local = LocalTTLCache(maxsize=local_maxsize)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        full_key = self._key(key)
+        value = self.local.get(full_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        try:
+            value = shared_cache.get(full_key, _MISSING)
+        except Exception:
+            logger.warning('layered_cache_get_failed', extra={'cache_key': full_key}, exc_info=True)
+            return default
+
+        if value is _MISSING:
+            return default
+
+        self.local.set(full_key, value, self.local_ttl_seconds)
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        full_key = self._key(key)
+        self.local.set(full_key, value, min(ttl_seconds, self.local_ttl_seconds))
+        try:
+            shared_cache.set(full_key, value, timeout=ttl_seconds)
+        except Exception:
+            logger.warning('layered_cache_set_failed', extra={'cache_key': full_key}, exc_info=True)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the cached subset of ``keys``; shared cache misses are fetched in one round trip."""
+        found: Dict[str, Any] = {}
+        remote_keys: Dict[str, str] = {}
+        for key in keys:
+            full_key = self._key(key)
+            value = self.local.get(full_key, _MISSING)
+            if value is _MISSING:
+                remote_keys[full_key] = key
+            else:
+                found[key] = value
+
+        if not remote_keys:
+            return found
+
+        try:
+            remote = shared_cache.get_many(list(remote_keys))
+        except Exception:
+            logger.warning('layered_cache_get_many_failed', extra={'keys_count': len(remote_keys)}, exc_info=True)
+            return found
+
+        for full_key, value in remote.items():
+            self.local.set(full_key, value, self.local_ttl_seconds)
+            found[remote_keys[full_key]] = value
+        return found
+
+    def set_many(self, values: Dict[str, Any], ttl_seconds: float) -> None:
+        if not values:
+            return
+
+        full_values = {self._key(key): value for key, value in values.items()}
+        for full_key, value in full_values.items():
+            self.local.set(full_key, value, min(ttl_seconds, self.local_ttl_seconds))
+        try:
+            shared_cache.set_many(full_values, timeout=ttl_seconds)
+        except Exception:
+            logger.warning('layered_cache_set_many_failed', extra={'keys_count': len(full_values)}, exc_info=True)
+
+    def get_or_set(self, key: str, loader: Callable[[], Any], ttl_seconds: float) -> Any:
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        value = loader()
+        self.set(key, value, ttl_seconds)
+        return value
+
+    def decr(self, key: str, delta: int = 1) -> Any:
+        """Atomically decrement an existing shared entry; returns the new value, or ``None`` on a miss.
+
+        The value is not clamped, so readers of counters must treat negatives as zero. Other processes
+        may keep serving their local copy for up to ``local_ttl_seconds``.
+        """
+        full_key = self._key(key)
+        self.local.delete(full_key)
+        try:
+            return shared_cache.decr(full_key, delta)
+        except ValueError:
+            return None
+        except Exception:
+            logger.warning('layered_cache_decr_failed', extra={'cache_key': full_key}, exc_info=True)
+            return None
+
+    def delete(self, key: str) -> None:
+        full_key = self._key(key)
+        self.local.delete(full_key)
+        try:
+            shared_cache.delete(full_key)
+        except Exception:
+            logger.warning('layered_cache_delete_failed', extra={'cache_key': full_key}, exc_info=True)
+
+    def clear_local(self) -> None:
+        self.local.clear()
+
+    def _key(self, key: str) -> str:
+        return f'{self.namespace}:{key}'
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamCircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, upstream: str, retry_in_seconds: float) -> None:
+        super().__init__(f'{upstream} upstream is unavailable, retry in {retry_in_seconds:.0f}s')
+        self.upstream = upstream
+        self.retry_in_seconds = retry_in_seconds
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one upstream.
+
+    closed -> open after ``failure_threshold`` consecutive failures; open -> half_open once
+    ``reset_timeout_seconds`` elapse; half_open lets ``half_open_max_calls`` probes through and
+    closes on the first success or re-opens on a failure. State is kept per process.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        reset_timeout_seconds: Optional[float] = None,
+        half_open_max_calls: Optional[int] = None,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold or settings.UPSTREAM_CIRCUIT_FAILURE_THRESHOLD)
+        self.reset_timeout_seconds = (
+            settings.UPSTREAM_CIRCUIT_RESET_SECONDS if reset_timeout_seconds is None else reset_timeout_seconds
+        )
+        self.half_open_max_calls = max(1, half_open_max_calls or settings.UPSTREAM_CIRCUIT_HALF_OPEN_MAX_CALLS)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._half_open_calls = 0
+        self._total_failures = 0
+        self._total_rejections = 0
+        self._last_failure_reason = ''
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def before_call(self) -> None:
+        """Reserve a call slot or raise ``UpstreamCircuitOpenError`` when the upstream must not be called."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+
+            if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return
+
+            self._total_rejections += 1
+            retry_in = self._retry_in_seconds()
+
+        raise UpstreamCircuitOpenError(self.name, retry_in)
+
+    def record_success(self) -> None:
+        with self._lock:
+            previous = self._state
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._half_open_calls = 0
+
+        if previous != self.CLOSED:
+            self._log_transition(previous, self.CLOSED)
+
+    def record_failure(self, reason: str = '') -> None:
+        with self._lock:
+            previous = self._current_state()
+            self._consecutive_failures += 1
+            self._total_failures += 1
+            self._last_failure_reason = reason[:200]
+
+            should_open = previous == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold
+            if not should_open:
+                return
+
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._half_open_calls = 0
+
+        if previous != self.OPEN:
+            self._log_transition(previous, self.OPEN)
+
+    def release(self) -> None:
+        """Give back a call slot without an outcome, e.g. when the caller's own deadline ran out."""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def reset(self) -> None:
+        self.record_success()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            return {
+                'name': self.name,
+                'state': state,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'retry_in_seconds': round(self._retry_in_seconds(), 3) if state == self.OPEN else 0,
+                'total_failures': self._total_failures,
+                'total_rejections': self._total_rejections,
+                'last_failure_reason': self._last_failure_reason,
+            }
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and self._opened_at is not None:
+            if time.monotonic() - self._opened_at >= self.reset_timeout_seconds:
+                self._state = self.HALF_OPEN
+                self._half_open_calls = 0
+        return self._state
+
+    def _retry_in_seconds(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout_seconds - (time.monotonic() - self._opened_at))
+
+    def _log_transition(self, previous: str, current: str) -> None:
+        log = logger.warning if current == self.OPEN else logger.info
+        log(
+            'circuit_breaker_state_changed',
+            extra={
+                'upstream': self.name,
+                'previous_state': previous,
+                'state': current,
+                'consecutive_failures': self._consecutive_failures,
+                'last_failure_reason': self._last_failure_reason,
+            },
+        )
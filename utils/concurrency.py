@@ -0,0 +1,106 @@
+import contextvars
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from django.db import connections
+
+
+@dataclass(frozen=True)
+class TaskOutcome:
+    index: int
+    item: Any
+    value: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def run_bounded(
+    func: Callable[[Any], Any],
+    items: Sequence[Any],
+    *,
+    max_workers: int,
+    max_in_flight: Optional[int] = None,
+    on_complete: Optional[Callable[[TaskOutcome], None]] = None,
+) -> List[TaskOutcome]:
+    """Apply ``func`` to every item on a bounded thread pool and return outcomes in input order.
+
+    Exceptions are captured per item instead of aborting the batch. At most ``max_in_flight``
+    items (2x workers by default) are submitted at once, so huge inputs do not queue up as futures.
+    ``on_complete`` runs in the calling thread, in completion order, and is the place for DB writes.
+    Workers run inside a copy of the caller's context, so request deadlines still apply. A pool
+    thread keeps its Django DB connection for all of its items; the connections are closed once,
+    after the pool has shut down, so ORM calls in ``func`` never leave a connection per thread behind.
+    """
+    outcomes: List[Optional[TaskOutcome]] = [None] * len(items)
+    if not items:
+        return []
+
+    workers = min(max(1, int(max_workers)), len(items))
+    if workers == 1:
+        for index, item in enumerate(items):
+            outcome = _call(func, index, item)
+            outcomes[index] = outcome
+            if on_complete is not None:
+                on_complete(outcome)
+        return outcomes  # type: ignore[return-value]
+
+    window = max(workers, int(max_in_flight or workers * 2))
+    pending: Dict[Future, int] = {}
+    iterator: Iterable = iter(enumerate(items))
+    worker_connections: List[Any] = []
+    lock = threading.Lock()
+
+    def register_worker_connections() -> None:
+        with lock:
+            worker_connections.extend(connections.all())
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, initializer=register_worker_connections) as executor:
+
+            def submit_next() -> bool:
+                try:
+                    index, item = next(iterator)
+                except StopIteration:
+                    return False
+                context = contextvars.copy_context()
+                pending[executor.submit(context.run, _call, func, index, item)] = index
+                return True
+
+            while len(pending) < window and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future)
+                    outcome = future.result()
+                    outcomes[outcome.index] = outcome
+                    if on_complete is not None:
+                        on_complete(outcome)
+                    submit_next()
+    finally:
+        _close_connections(worker_connections)
+
+    return outcomes  # type: ignore[return-value]
+
+
+def _call(func: Callable[[Any], Any], index: int, item: Any) -> TaskOutcome:
+    try:
+        return TaskOutcome(index=index, item=item, value=func(item))
+    except Exception as exc:
+        return TaskOutcome(index=index, item=item, error=exc)
+
+
+def _close_connections(worker_connections: List[Any]) -> None:
+    """Close DB connections that pool threads opened; the threads have exited, so sharing is safe."""
+    for connection in worker_connections:
+        connection.inc_thread_sharing()
+        try:
+            connection.close()
+        finally:
+            connection.dec_thread_sharing()
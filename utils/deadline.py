@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+import requests
+
+_deadline_at: ContextVar[Optional[float]] = ContextVar('upstream_deadline_at', default=None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised before an upstream call when the request-scoped time budget is already spent."""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Bound every upstream call made inside the block by a shared time budget.
+
+    Nested deadlines can only shrink the budget inherited from the outer block. ``None`` or a
+    non-positive value leaves the current budget untouched. Worker threads inherit the budget only
+    when they run inside a copied context (``contextvars.copy_context().run``).
+    """
+    if seconds is None or seconds <= 0:
+        yield
+        return
+
+    expires_at = time.monotonic() + float(seconds)
+    outer = _deadline_at.get()
+    if outer is not None:
+        expires_at = min(outer, expires_at)
+
+    token = _deadline_at.set(expires_at)
+    try:
+        yield
+    finally:
+        _deadline_at.reset(token)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Seconds left in the current budget, or ``None`` when no deadline is active."""
+    expires_at = _deadline_at.get()
+    if expires_at is None:
+        return None
+    return max(0.0, expires_at - time.monotonic())
@@ -0,0 +1,24 @@
+from typing import Any, BinaryIO, Iterator, Optional, Tuple
+
+from openpyxl import load_workbook
+
+
+def iter_sheet_rows(
+    source: BinaryIO,
+    *,
+    max_col: Optional[int] = None,
+    all_sheets: bool = False,
+) -> Iterator[Tuple[int, Tuple[Any, ...]]]:
+    """Yield ``(row_number, values)`` from an uploaded workbook without loading it into memory.
+
+    The workbook is opened in read-only mode straight from the stored file, so rows are parsed from
+    the sheet XML as they are consumed. ``row_number`` restarts at 1 on every sheet.
+    """
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheets = workbook.worksheets if all_sheets else [workbook.active]
+        for sheet in sheets:
+            for row_number, values in enumerate(sheet.iter_rows(max_col=max_col, values_only=True), start=1):
+                yield row_number, values
+    finally:
+        workbook.close()
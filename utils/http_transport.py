@@ -0,0 +1,428 @@
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from utils.circuit_breaker import CircuitBreaker
+from utils.deadline import DeadlineExceeded, remaining_seconds
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+DEFAULT_ENDPOINT = 'default'
+UPSTREAM_NAMES = ('avatariya', 'mobile')
+
+TimeoutValue = Union[None, float, Tuple[Optional[float], Optional[float]]]
+
+
+class RetryPolicy:
+    """Decides whether a failed upstream call is retried and how long to wait before the next attempt.
+
+    429 is retried for every method because the upstream explicitly did not process the request.
+    5xx gateway errors, read timeouts and connection resets are retried only for idempotent calls.
+    """
+
+    always_retry_statuses = frozenset({429})
+    idempotent_retry_statuses = frozenset({500, 502, 503, 504})
+
+    def __init__(
+        self,
+        *,
+        max_retries: Optional[int] = None,
+        backoff_base_seconds: Optional[float] = None,
+        backoff_max_seconds: Optional[float] = None,
+        retry_after_max_seconds: Optional[float] = None,
+    ) -> None:
+        self.max_retries = settings.UPSTREAM_HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base_seconds = (
+            settings.UPSTREAM_HTTP_BACKOFF_BASE_SECONDS if backoff_base_seconds is None else backoff_base_seconds
+        )
+        self.backoff_max_seconds = (
+            settings.UPSTREAM_HTTP_BACKOFF_MAX_SECONDS if backoff_max_seconds is None else backoff_max_seconds
+        )
+        self.retry_after_max_seconds = (
+            settings.UPSTREAM_HTTP_RETRY_AFTER_MAX_SECONDS
+            if retry_after_max_seconds is None
+            else retry_after_max_seconds
+        )
+
+    def should_retry_status(self, status_code: int, *, idempotent: bool) -> bool:
+        if status_code in self.always_retry_statuses:
+            return True
+        return idempotent and status_code in self.idempotent_retry_statuses
+
+    def should_retry_exception(self, exc: Exception, *, idempotent: bool) -> bool:
+        # A connect timeout means the request never reached the upstream, so it is safe for any method.
+        if isinstance(exc, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return idempotent
+        if isinstance(exc, requests.exceptions.ChunkedEncodingError):
+            return idempotent
+        return False
+
+    def backoff_seconds(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given zero-based retry attempt."""
+        ceiling = min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** attempt))
+        return random.uniform(0, max(0.0, ceiling))
+
+    def retry_after_seconds(self, response: requests.Response) -> Optional[float]:
+        raw = str(response.headers.get('Retry-After') or '').strip()
+        if not raw:
+            return None
+
+        try:
+            return max(0.0, float(raw))
+        except ValueError:
+            pass
+
+        try:
+            retry_at = parsedate_to_datetime(raw)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire`` blocks until a token is available or ``max_wait`` runs out."""
+
+    def __init__(self, *, rate_per_second: float, capacity: Optional[float] = None) -> None:
+        self.rate_per_second = float(rate_per_second)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate_per_second))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait: Optional[float] = None) -> float:
+        """Take one token and return how many seconds the caller waited for it.
+
+        Raises ``DeadlineExceeded`` without taking a token when none frees up within ``max_wait`` seconds.
+        """
+        waited = 0.0
+        give_up_at = None if max_wait is None else time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait_seconds = (1 - self._tokens) / self.rate_per_second
+            if give_up_at is not None and now + wait_seconds > give_up_at:
+                raise DeadlineExceeded(f'no rate limit slot within {max_wait:.3f}s: request deadline exceeded')
+            time.sleep(wait_seconds)
+            waited += wait_seconds
+
+
+def parse_rate_limits(raw: str) -> Dict[str, TokenBucket]:
+    """Parse ``endpoint=rate[/burst]`` CSV into token buckets, e.g. ``default=20,coupon_assign=5/10``."""
+    buckets: Dict[str, TokenBucket] = {}
+    for item in str(raw or '').split(','):
+        endpoint, separator, spec = item.strip().partition('=')
+        endpoint = endpoint.strip()
+        if not separator or not endpoint:
+            continue
+
+        rate_raw, _, burst_raw = spec.strip().partition('/')
+        try:
+            rate = float(rate_raw)
+            burst = float(burst_raw) if burst_raw.strip() else None
+        except ValueError:
+            logger.warning('http_transport_invalid_rate_limit', extra={'value': item.strip()})
+            continue
+        if rate <= 0:
+            continue
+        buckets[endpoint] = TokenBucket(rate_per_second=rate, capacity=burst)
+    return buckets
+
+
+def parse_endpoint_timeouts(raw: str) -> Dict[str, Tuple[Optional[float], float]]:
+    """Parse ``endpoint=[connect:]read`` CSV into timeouts, e.g. ``employee=3:5,visit_search=60``."""
+    timeouts: Dict[str, Tuple[Optional[float], float]] = {}
+    for item in str(raw or '').split(','):
+        endpoint, separator, spec = item.strip().partition('=')
+        endpoint = endpoint.strip()
+        if not separator or not endpoint:
+            continue
+
+        connect_raw, _, read_raw = spec.strip().rpartition(':')
+        try:
+            read_timeout = float(read_raw)
+            connect_timeout = float(connect_raw) if connect_raw.strip() else None
+        except ValueError:
+            logger.warning('http_transport_invalid_endpoint_timeout', extra={'value': item.strip()})
+            continue
+        if read_timeout <= 0:
+            continue
+        timeouts[endpoint] = (connect_timeout, read_timeout)
+    return timeouts
+
+
+class HttpTransport:
+    """Pooled keep-alive HTTP transport shared by every client of one upstream.
+
+    The underlying ``requests.Session`` is created lazily and re-created after a fork,
+    so Celery prefork and gunicorn workers never share sockets with their parent.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        pool_block: Optional[bool] = None,
+        keep_alive: Optional[bool] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        rate_limits: Optional[Dict[str, TokenBucket]] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        connect_timeout_seconds: Optional[float] = None,
+        endpoint_timeouts: Optional[Dict[str, Tuple[Optional[float], float]]] = None,
+    ) -> None:
+        self.name = name
+        self.pool_connections = pool_connections or settings.UPSTREAM_HTTP_POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize or settings.UPSTREAM_HTTP_POOL_MAXSIZE
+        self.pool_block = settings.UPSTREAM_HTTP_POOL_BLOCK if pool_block is None else pool_block
+        self.keep_alive = settings.UPSTREAM_HTTP_KEEP_ALIVE if keep_alive is None else keep_alive
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limits = (
+            rate_limits if rate_limits is not None else parse_rate_limits(settings.UPSTREAM_RATE_LIMITS.get(name, ''))
+        )
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(name=name)
+        self.connect_timeout_seconds = connect_timeout_seconds or settings.UPSTREAM_HTTP_CONNECT_TIMEOUT_SECONDS
+        self.endpoint_timeouts = (
+            endpoint_timeouts
+            if endpoint_timeouts is not None
+            else parse_endpoint_timeouts(settings.UPSTREAM_ENDPOINT_TIMEOUTS.get(name, ''))
+        )
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._session_pid: Optional[int] = None
+
+    @property
+    def session(self) -> requests.Session:
+        pid = os.getpid()
+        session = self._session
+        if session is not None and self._session_pid == pid:
+            return session
+
+        with self._lock:
+            if self._session is None or self._session_pid != pid:
+                self._session = self._build_session()
+                self._session_pid = pid
+            return self._session
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        endpoint: str = DEFAULT_ENDPOINT,
+        idempotent: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """Send a request through the circuit breaker, per-endpoint rate limiting and retries.
+
+        ``idempotent`` defaults to the HTTP method semantics; read-only POST searches pass ``True``.
+        Multipart uploads are never retried because their file streams are consumed on the first attempt.
+        Raises ``UpstreamCircuitOpenError`` without touching the network while the circuit is open.
+
+        The caller's ``timeout`` is the read timeout fallback; a per-endpoint ``[connect:]read``
+        override wins over it, and both are capped by the remaining request-scoped deadline.
+        """
+        self._ensure_budget(endpoint)
+        self.circuit_breaker.before_call()
+        try:
+            response = self._send_with_retries(method, url, endpoint=endpoint, idempotent=idempotent, **kwargs)
+        except Exception as exc:
+            # Running out of our own budget says nothing about upstream health.
+            if isinstance(exc, DeadlineExceeded) or (
+                isinstance(exc, requests.exceptions.Timeout) and remaining_seconds() == 0
+            ):
+                self.circuit_breaker.release()
+            else:
+                self.circuit_breaker.record_failure(type(exc).__name__)
+            raise
+
+        # Only server-side failures count against the upstream; 4xx are caller errors.
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure(f'HTTP {response.status_code}')
+        else:
+            self.circuit_breaker.record_success()
+        return response
+
+    def _send_with_retries(
+        self,
+        method: str,
+        url: str,
+        *,
+        endpoint: str,
+        idempotent: Optional[bool],
+        **kwargs: Any,
+    ) -> requests.Response:
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        max_retries = 0 if kwargs.get('files') else self.retry_policy.max_retries
+        bucket = self.rate_limits.get(endpoint) or self.rate_limits.get(DEFAULT_ENDPOINT)
+        requested_timeout = kwargs.pop('timeout', None)
+
+        attempt = 0
+        while True:
+            if bucket is not None:
+                # Waiting for a slot counts against the request deadline like the call itself.
+                bucket.acquire(max_wait=remaining_seconds())
+
+            try:
+                timeout = self._resolve_timeout(endpoint, requested_timeout)
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as exc:
+                if attempt >= max_retries or not self.retry_policy.should_retry_exception(exc, idempotent=idempotent):
+                    raise
+                delay = self.retry_policy.backoff_seconds(attempt)
+                if not self._fits_budget(delay):
+                    raise
+                self._log_retry(endpoint=endpoint, method=method, attempt=attempt, delay=delay, reason=type(exc).__name__)
+            else:
+                if attempt >= max_retries or not self.retry_policy.should_retry_status(
+                    response.status_code,
+                    idempotent=idempotent,
+                ):
+                    return response
+
+                retry_after = self.retry_policy.retry_after_seconds(response)
+                if retry_after is not None and retry_after > self.retry_policy.retry_after_max_seconds:
+                    return response
+                delay = retry_after if retry_after is not None else self.retry_policy.backoff_seconds(attempt)
+                if not self._fits_budget(delay):
+                    return response
+                self._log_retry(
+                    endpoint=endpoint,
+                    method=method,
+                    attempt=attempt,
+                    delay=delay,
+                    reason=str(response.status_code),
+                )
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request('PATCH', url, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._session_pid = None
+
+    def _resolve_timeout(self, endpoint: str, requested: TimeoutValue) -> Tuple[Optional[float], Optional[float]]:
+        if isinstance(requested, tuple):
+            connect_timeout, read_timeout = requested
+        else:
+            connect_timeout, read_timeout = self.connect_timeout_seconds, requested
+
+        override = self.endpoint_timeouts.get(endpoint)
+        if override is not None:
+            connect_timeout = override[0] or connect_timeout
+            read_timeout = override[1]
+
+        remaining = self._ensure_budget(endpoint)
+        if remaining is not None:
+            connect_timeout = remaining if connect_timeout is None else min(connect_timeout, remaining)
+            read_timeout = remaining if read_timeout is None else min(read_timeout, remaining)
+        return connect_timeout, read_timeout
+
+    def _ensure_budget(self, endpoint: str) -> Optional[float]:
+        remaining = remaining_seconds()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f'{self.name} {endpoint} call skipped: request deadline exceeded')
+        return remaining
+
+    def _fits_budget(self, delay: float) -> bool:
+        remaining = remaining_seconds()
+        return remaining is None or delay < remaining
+
+    def _log_retry(self, *, endpoint: str, method: str, attempt: int, delay: float, reason: str) -> None:
+        logger.warning(
+            'http_transport_retry',
+            extra={
+                'transport': self.name,
+                'endpoint': endpoint,
+                'method': method,
+                'attempt': attempt + 1,
+                'delay_seconds': round(delay, 3),
+                'reason': reason,
+            },
+        )
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        # pool_maxsize is the per-host connection limit; pool_block makes it a hard cap.
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+
+        logger.debug(
+            'http_transport_session_created',
+            extra={
+                'transport': self.name,
+                'pool_connections': self.pool_connections,
+                'pool_maxsize': self.pool_maxsize,
+                'pool_block': self.pool_block,
+                'keep_alive': self.keep_alive,
+            },
+        )
+        return session
+
+
+_transports: Dict[str, HttpTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(name: str) -> HttpTransport:
+    """Return the process-wide transport registered under ``name``, creating it on first use."""
+    transport = _transports.get(name)
+    if transport is not None:
+        return transport
+
+    with _transports_lock:
+        transport = _transports.get(name)
+        if transport is None:
+            transport = HttpTransport(name=name)
+            _transports[name] = transport
+        return transport
+
+
+def circuit_breaker_states() -> List[Dict[str, Any]]:
+    """Snapshot of every upstream circuit breaker in this process, including not yet used upstreams."""
+    for name in UPSTREAM_NAMES:
+        get_transport(name)
+    with _transports_lock:
+        transports = list(_transports.values())
+    return [transport.circuit_breaker.snapshot() for transport in transports]
@@ -0,0 +1,139 @@
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import requests
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from utils.avatariya_client import AvatariyaAPIError
+from utils.mobile_client import MobileAPIError
+
+logger = logging.getLogger(__name__)
+
+INTERRUPTED_ERROR = 'interrupted_outcome_unknown'
+UPSTREAM_UNAVAILABLE_ERROR = 'upstream_unavailable'
+SEED_BATCH_SIZE = 500
+
+
+@dataclass
+class SeedStats:
+    """Input counters filled in while seed rows are streamed into ``ResultCheckpoint.seed``."""
+
+    total_phones: int = 0
+    unique_phones: int = 0
+    rejected: int = 0
+
+
+class UpstreamUnavailable(Exception):
+    """A batch hit transient upstream errors; its unsent rows were released for ``resume``."""
+
+    def __init__(self, rows: int) -> None:
+        super().__init__(f'{rows} rows released after transient upstream errors')
+        self.rows = rows
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Outages, timeouts, open circuits and non-rejection HTTP errors; a 4xx rejection is final for the row."""
+    if isinstance(exc, (AvatariyaAPIError, MobileAPIError)):
+        return not exc.is_rejection
+    return isinstance(exc, requests.exceptions.RequestException)
+
+
+def resumable_job_filter(*, failed_status: str, processing_status: str, stale_after_seconds: Optional[int] = None) -> Q:
+    """Jobs with checkpointed results that either failed or stopped heartbeating while processing."""
+    stale_seconds = settings.JOB_RESUME_STALE_SECONDS if stale_after_seconds is None else stale_after_seconds
+    stale_before = timezone.now() - timedelta(seconds=stale_seconds)
+    return Q(results_seeded_at__isnull=False) & (
+        Q(status=failed_status) | Q(status=processing_status, updated_at__lt=stale_before)
+    )
+
+
+class ResultCheckpoint:
+    """Batch-persisted per-row progress of a coupon or bonus job.
+
+    All result rows are created up front with ``processed=False``. A batch is stamped with
+    ``attempted_at`` before any upstream call and saved as processed right after, so a crashed run
+    leaves at most one batch whose outcome is unknown. Those rows are closed as
+    ``interrupted_outcome_unknown`` on resume instead of being sent twice. Rows that only met
+    transient upstream errors are released instead of committed, and the next resume sends them again.
+    """
+
+    def __init__(self, *, model, job: models.Model, batch_size: Optional[int] = None) -> None:
+        self.model = model
+        self.job = job
+        self.batch_size = max(1, batch_size or settings.JOB_CHECKPOINT_BATCH_SIZE)
+
+    @property
+    def is_seeded(self) -> bool:
+        return self.job.results_seeded_at is not None
+
+    def seed(self, rows: Iterable[models.Model]) -> None:
+        """Replace the job's result rows; ``rows`` may be a lazy iterator and is inserted in batches."""
+        now = timezone.now()
+        rows = iter(rows)
+        with transaction.atomic():
+            self.model.objects.filter(job=self.job).delete()
+            while True:
+                batch = list(islice(rows, SEED_BATCH_SIZE))
+                if not batch:
+                    break
+                self.model.objects.bulk_create(batch)
+            type(self.job).objects.filter(pk=self.job.pk).update(results_seeded_at=now, updated_at=now)
+        self.job.results_seeded_at = now
+
+    def close_interrupted(self) -> int:
+        now = timezone.now()
+        closed = self.model.objects.filter(job=self.job, processed=False, attempted_at__isnull=False).update(
+            processed=True,
+            processed_at=now,
+            success=False,
+            error_message=INTERRUPTED_ERROR,
+            updated_at=now,
+        )
+        if closed:
+            logger.warning('job_rows_interrupted', extra={'job_id': self.job.pk, 'rows': closed})
+        return closed
+
+    def pending_batches(self) -> Iterator[List[models.Model]]:
+        last_id = 0
+        while True:
+            batch = list(
+                self.model.objects.filter(job=self.job, processed=False, id__gt=last_id).order_by('id')[: self.batch_size]
+            )
+            if not batch:
+                return
+            last_id = batch[-1].id
+            yield batch
+
+    def mark_attempted(self, rows: Iterable[models.Model]) -> None:
+        rows = list(rows)
+        now = timezone.now()
+        self.model.objects.filter(id__in=[row.id for row in rows]).update(attempted_at=now, updated_at=now)
+        for row in rows:
+            row.attempted_at = now
+
+    def release(self, rows: Iterable[models.Model]) -> None:
+        rows = list(rows)
+        now = timezone.now()
+        self.model.objects.filter(id__in=[row.id for row in rows]).update(attempted_at=None, updated_at=now)
+        for row in rows:
+            row.attempted_at = None
+
+    def commit(self, rows: Iterable[models.Model], fields: Sequence[str]) -> None:
+        rows = list(rows)
+        now = timezone.now()
+        for row in rows:
+            row.processed = True
+            row.processed_at = now
+            row.updated_at = now
+
+        update_fields = [*fields, 'processed', 'processed_at', 'updated_at']
+        with transaction.atomic():
+            self.model.objects.bulk_update(rows, update_fields, batch_size=500)
+            # Heartbeat: a processing job whose updated_at stops moving is treated as stalled.
+            type(self.job).objects.filter(pk=self.job.pk).update(updated_at=now)
@@ -0,0 +1,94 @@
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Count, Q
+from django.utils import timezone
+
+
+def estimate_eta_seconds(*, total: int, processed: int, rows_per_second: float) -> Optional[int]:
+    remaining = max(0, int(total or 0) - int(processed or 0))
+    if remaining == 0:
+        return 0
+    if not rows_per_second or rows_per_second <= 0:
+        return None
+    return int(round(remaining / rows_per_second))
+
+
+class JobProgress:
+    """Throttled live counters of a running job, written to the job row every ``every_rows`` rows.
+
+    ``processed`` counts rows that reached the upstream, ``failed`` also includes rows rejected during
+    parsing. The rate is measured over the current run only, so a resumed job is not skewed by the
+    time it spent failed.
+    """
+
+    def __init__(
+        self,
+        *,
+        job: models.Model,
+        succeeded_field: str,
+        every_rows: Optional[int] = None,
+        processed: int = 0,
+        succeeded: int = 0,
+        failed: int = 0,
+    ) -> None:
+        self.job = job
+        self.succeeded_field = succeeded_field
+        self.every_rows = max(1, every_rows or settings.JOB_PROGRESS_EVERY_ROWS)
+        self.processed = processed
+        self.succeeded = succeeded
+        self.failed = failed
+        self._run_processed = 0
+        self._flushed_at_processed = processed
+        self._started_at = time.monotonic()
+
+    @classmethod
+    def from_results(
+        cls,
+        *,
+        job: models.Model,
+        results: models.QuerySet,
+        succeeded_field: str,
+        every_rows: Optional[int] = None,
+    ) -> 'JobProgress':
+        counters = results.aggregate(
+            processed=Count('id', filter=Q(processed=True, attempted_at__isnull=False)),
+            succeeded=Count('id', filter=Q(success=True)),
+            failed=Count('id', filter=Q(processed=True, success=False)),
+        )
+        return cls(job=job, succeeded_field=succeeded_field, every_rows=every_rows, **counters)
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = time.monotonic() - self._started_at
+        if elapsed <= 0 or self._run_processed == 0:
+            return 0.0
+        return round(self._run_processed / elapsed, 3)
+
+    def record(self, ok: bool) -> None:
+        self.advance(succeeded=1 if ok else 0, failed=0 if ok else 1)
+
+    def advance(self, *, succeeded: int = 0, failed: int = 0) -> None:
+        rows = succeeded + failed
+        self.processed += rows
+        self._run_processed += rows
+        self.succeeded += succeeded
+        self.failed += failed
+        if self.processed - self._flushed_at_processed >= self.every_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        now = timezone.now()
+        values = {
+            'processed_rows': self.processed,
+            self.succeeded_field: self.succeeded,
+            'errors_count': self.failed,
+            'rows_per_second': self.rows_per_second,
+            'progress_updated_at': now,
+        }
+        type(self.job).objects.filter(pk=self.job.pk).update(updated_at=now, **values)
+        for field, value in values.items():
+            setattr(self.job, field, value)
+        self._flushed_at_processed = self.processed
@@ -0,0 +1,118 @@
+import csv
+import tempfile
+from datetime import datetime
+from typing import Any, Iterable, Iterator, Mapping, Sequence
+
+from django.db import models
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+EXPORT_ITERATOR_CHUNK_SIZE = 2000
+
+_TRUE_VALUES = {'1', 'true', 'yes'}
+_FALSE_VALUES = {'0', 'false', 'no'}
+
+
+class JobResultCursorPagination(CursorPagination):
+    """Keyset pagination over result rows; pages stay cheap however deep the client scrolls."""
+
+    ordering = 'id'
+    page_size = 200
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+def parse_bool_param(params: Mapping[str, Any], name: str, default=None):
+    raw = str(params.get(name, '')).strip().lower()
+    if not raw:
+        return default
+    if raw in _TRUE_VALUES:
+        return True
+    if raw in _FALSE_VALUES:
+        return False
+    raise ValidationError({name: f'{name} must be true or false'})
+
+
+def filter_job_results(queryset: models.QuerySet, params: Mapping[str, Any]) -> models.QuerySet:
+    """Apply ``success`` and ``error_message`` query filters to a result queryset."""
+    success = parse_bool_param(params, 'success')
+    if success is not None:
+        queryset = queryset.filter(success=success)
+
+    error_message = str(params.get('error_message', '')).strip()
+    if error_message:
+        queryset = queryset.filter(error_message=error_message)
+
+    return queryset
+
+
+def export_job_results(
+    queryset: models.QuerySet,
+    *,
+    fields: Sequence[str],
+    filename: str,
+    file_format: str,
+) -> StreamingHttpResponse:
+    """Stream result rows as CSV or XLSX without materializing the queryset.
+
+    Rows are read through ``QuerySet.iterator`` (a server-side cursor on PostgreSQL). CSV is
+    written to the socket row by row; XLSX is built by the write-only workbook in a temporary file
+    and streamed from disk, because the zip container cannot be emitted incrementally.
+    """
+    normalized_format = str(file_format or 'csv').strip().lower()
+    if normalized_format not in EXPORT_FORMATS:
+        raise ValidationError({'file_format': 'file_format must be csv or xlsx'})
+
+    header = [str(queryset.model._meta.get_field(field).verbose_name) for field in fields]
+    rows = queryset.order_by('id').values_list(*fields).iterator(chunk_size=EXPORT_ITERATOR_CHUNK_SIZE)
+
+    if normalized_format == 'csv':
+        response = StreamingHttpResponse(iter_csv_lines(header, rows), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+
+    output = tempfile.TemporaryFile()
+    write_xlsx(header, rows, output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+class _Echo:
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv_lines(header: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    # BOM so that Excel opens the UTF-8 file with Cyrillic headers correctly.
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_export_value(value) for value in row])
+
+
+def write_xlsx(header: Sequence[str], rows: Iterable[Sequence[Any]], output) -> None:
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('results')
+    sheet.append(list(header))
+    for row in rows:
+        sheet.append([_export_value(value) for value in row])
+    workbook.save(output)
+
+
+def _export_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if value is None:
+        return ''
+    return value
@@ -5,23 +5,44 @@ import requests
 from requests import HTTPError
 from django.conf import settings
 
+from utils.http_transport import DEFAULT_ENDPOINT, HttpTransport, get_transport
+
 logger = logging.getLogger(__name__)
 
 
+class MobileAPIError(ValueError):
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def is_rejection(self) -> bool:
+        """The upstream refused the request content (4xx validation error), so resending it as is fails again."""
+        return 400 <= self.status_code < 500 and self.status_code not in {401, 403, 404, 405, 429}
+
+
 class MobileClient:
     def __init__(
         self,
         base_url: Optional[str] = None,
         token: Optional[str] = None,
         timeout_seconds: Optional[int] = None,
+        transport: Optional[HttpTransport] = None,
     ) -> None:
         self.base_url = (base_url or settings.MOBILE_CLIENT_BASE_URL).rstrip('/')
         self.token = token or settings.MOBILE_CLIENT_TOKEN
         self.timeout_seconds = timeout_seconds or settings.MOBILE_CLIENT_TIMEOUT_SECONDS
+        self.transport = transport or get_transport('mobile')
 
-    def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
-        response = requests.get(
+    def get(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        endpoint: str = DEFAULT_ENDPOINT,
+    ) -> Any:
+        response = self.transport.get(
             self._url(path),
+            endpoint=endpoint,
             params=params,
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -29,11 +50,16 @@ class MobileClient:
         self._raise_for_status(response)
         return response.json()
 
-    def post(self, path: str, payload: Optional[Dict[str, Any]] = None) -> Any:
+    def post(
+        self,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        endpoint: str = DEFAULT_ENDPOINT,
+    ) -> Any:
         last_response: Optional[requests.Response] = None
 
         for candidate in self._build_post_candidates(path):
-            response = self._post_json(self._url(candidate), payload)
+            response = self._post_json(self._url(candidate), payload, endpoint=endpoint)
             last_response = response
 
             if response.status_code < 400:
@@ -63,7 +89,7 @@ class MobileClient:
             'start_date': str(start_date or '').strip(),
             'end_date': str(end_date or '').strip(),
         }
-        parsed = self.get('/api/users/stats/new/', params=params)
+        parsed = self.get('/api/users/stats/new/', params=params, endpoint='users_stats')
         return parsed if isinstance(parsed, dict) else {'raw': parsed}
 
     def send_mass_push(
@@ -106,7 +132,7 @@ class MobileClient:
         if review_id is not None:
             payload['review_id'] = review_id
 
-        parsed = self.post('/api/notifications/send-mass-push/', payload)
+        parsed = self.post('/api/notifications/send-mass-push/', payload, endpoint='mass_push')
         return self._extract_notification_id(parsed)
 
     def create_order_coupon_info_bulk_item(
@@ -120,18 +146,23 @@ class MobileClient:
     ) -> Dict[str, Any]:
         payload: Dict[str, Any] = {
             'coupons': [
-                {
-                    'coupon': str(coupon or '').strip(),
-                    'phone_number': str(phone_number or '').strip(),
-                    'amount': str(amount or '').strip(),
-                    'valid_until': str(valid_until or '').strip(),
-                    'is_mobile': bool(is_mobile),
-                }
+                self._order_coupon_item(
+                    coupon=coupon,
+                    phone_number=phone_number,
+                    amount=amount,
+                    valid_until=valid_until,
+                    is_mobile=is_mobile,
+                )
             ]
         }
-        parsed = self.post('/api/prizes/order-coupon-info/bulk-create/', payload)
+        parsed = self.post('/api/prizes/order-coupon-info/bulk-create/', payload, endpoint='order_coupon_bulk')
         return parsed if isinstance(parsed, dict) else {'raw': parsed}
 
+    def create_order_coupon_info_bulk(self, items: List[Dict[str, Any]]) -> Any:
+        """Create many order coupon infos in one request; items take the same keys as the single-item call."""
+        payload: Dict[str, Any] = {'coupons': [self._order_coupon_item(**item) for item in items]}
+        return self.post('/api/prizes/order-coupon-info/bulk-create/', payload, endpoint='order_coupon_bulk')
+
     def create_story(
         self,
         logo: IO[bytes],
@@ -156,8 +187,9 @@ class MobileClient:
         if user_id is not None:
             data['user_id'] = user_id
 
-        response = requests.post(
+        response = self.transport.post(
             f'{self.base_url}/api/stories/',
+            endpoint='stories',
             data=data,
             files={'logo': logo},
             headers=self._auth_headers(),
@@ -203,8 +235,9 @@ class MobileClient:
         if video is not None:
             files['video'] = video
 
-        response = requests.post(
+        response = self.transport.post(
             f'{self.base_url}/api/stories/displays/',
+            endpoint='story_displays',
             data=data,
             files=files if files else None,
             headers=self._auth_headers(),
@@ -225,8 +258,9 @@ class MobileClient:
             'notification_id': notification_id,
         }
 
-        response = requests.post(
+        response = self.transport.post(
             f'{self.base_url}/api/stories/recipients/',
+            endpoint='story_recipients',
             json=payload,
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -234,6 +268,23 @@ class MobileClient:
         self._raise_for_status(response)
         return response.json()
 
+    def _order_coupon_item(
+        self,
+        *,
+        coupon: str,
+        phone_number: str,
+        amount: str,
+        valid_until: str,
+        is_mobile: bool = False,
+    ) -> Dict[str, Any]:
+        return {
+            'coupon': str(coupon or '').strip(),
+            'phone_number': str(phone_number or '').strip(),
+            'amount': str(amount or '').strip(),
+            'valid_until': str(valid_until or '').strip(),
+            'is_mobile': bool(is_mobile),
+        }
+
     def _auth_headers(self) -> Dict[str, str]:
         """Auth-only headers for multipart requests (no Content-Type — requests sets it automatically)."""
         return {'Authorization': f'Token {self.token}'}
@@ -241,9 +292,15 @@ class MobileClient:
     def _url(self, path: str) -> str:
         return f'{self.base_url}/{path.lstrip("/")}'
 
-    def _post_json(self, url: str, payload: Optional[Dict[str, Any]]) -> requests.Response:
-        return requests.post(
+    def _post_json(
+        self,
+        url: str,
+        payload: Optional[Dict[str, Any]],
+        endpoint: str = DEFAULT_ENDPOINT,
+    ) -> requests.Response:
+        return self.transport.post(
             url,
+            endpoint=endpoint,
             json=payload,
             headers=self._headers(),
             timeout=self.timeout_seconds,
@@ -330,5 +387,5 @@ class MobileClient:
                 extra={'status_code': response.status_code, 'url': response.url, 'detail': detail[:500]},
             )
             if detail:
-                raise ValueError(f'Mobile API error: {detail}') from exc
-            raise ValueError('Mobile API request failed') from exc
+                raise MobileAPIError(f'Mobile API error: {detail}', response.status_code) from exc
+            raise MobileAPIError('Mobile API request failed', response.status_code) from exc
@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+
+from utils.cache import LayeredCache
+
+logger = logging.getLogger(__name__)
+
+REFRESH_LOCK_SECONDS = 60
+
+
+def _start_daemon_thread(func: Callable[[], None]) -> None:
+    threading.Thread(target=func, name='reference-data-refresh', daemon=True).start()
+
+
+class ReferenceDataCache:
+    """Stale-while-revalidate cache for small upstream reference lists such as cities and marketing sales.
+
+    A value younger than ``fresh_seconds`` is served as is. An older one is still served, and a single
+    background refresh is started for it (one per key across processes, guarded by a shared cache
+    lock). Only a missing value, or one older than ``REFERENCE_DATA_STALE_SECONDS``, is loaded inline.
+    Failed refreshes are logged and the stale value stays in place.
+    """
+
+    def __init__(
+        self,
+        *,
+        namespace: str,
+        stale_seconds: Optional[int] = None,
+        local_ttl_seconds: Optional[float] = None,
+        run_in_background: Callable[[Callable[[], None]], None] = _start_daemon_thread,
+    ) -> None:
+        self.namespace = namespace
+        self.stale_seconds = stale_seconds or settings.REFERENCE_DATA_STALE_SECONDS
+        self.cache = LayeredCache(
+            namespace=namespace,
+            local_maxsize=64,
+            local_ttl_seconds=local_ttl_seconds or settings.REFERENCE_DATA_LOCAL_CACHE_SECONDS,
+        )
+        self.run_in_background = run_in_background
+        self._refreshing: set[str] = set()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, loader: Callable[[], Any], *, fresh_seconds: float) -> Any:
+        entry = self.cache.get(key)
+        if entry is None:
+            return self.load(key, loader)
+
+        if time.time() - entry['fetched_at'] >= fresh_seconds:
+            self._refresh_in_background(key, loader)
+        return entry['value']
+
+    def load(self, key: str, loader: Callable[[], Any]) -> Any:
+        value = loader()
+        self.cache.set(key, {'value': value, 'fetched_at': time.time()}, self.stale_seconds)
+        return value
+
+    def invalidate(self, key: str) -> None:
+        self.cache.delete(key)
+
+    def clear_local(self) -> None:
+        self.cache.clear_local()
+
+    def _refresh_in_background(self, key: str, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        lock_key = f'reference_data_refresh:{self.namespace}:{key}'
+        try:
+            claimed = shared_cache.add(lock_key, 1, timeout=REFRESH_LOCK_SECONDS)
+        except Exception:
+            logger.warning('reference_data_lock_failed', extra={'cache_key': key}, exc_info=True)
+            claimed = True
+        if not claimed:
+            self._release(key)
+            return
+
+        def refresh() -> None:
+            try:
+                self.load(key, loader)
+            except Exception:
+                logger.warning('reference_data_refresh_failed', extra={'cache_key': key}, exc_info=True)
+            finally:
+                self._release(key)
+                try:
+                    shared_cache.delete(lock_key)
+                except Exception:
+                    logger.warning('reference_data_unlock_failed', extra={'cache_key': key}, exc_info=True)
+
+        self.run_in_background(refresh)
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            self._refreshing.discard(key)